@@ -1,6 +1,7 @@
 import os
+import sys
 from celery import Celery
-from celery.signals import setup_logging
+from celery.signals import setup_logging, worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CareerShip.settings')
 
@@ -14,5 +15,24 @@ def config_loggers(*args, **kwargs):
     from django.conf import settings
     dictConfig(settings.LOGGING)
 
+# Green-thread workers (-P gevent) must let psycopg2 yield to other greenlets while waiting on Postgres
+def _uses_gevent_pool(argv):
+    for i, arg in enumerate(argv):
+        if arg in ('-P', '--pool') and argv[i + 1:i + 2] == ['gevent']:
+            return True
+        if arg in ('-Pgevent', '--pool=gevent'):
+            return True
+    return False
+
+if _uses_gevent_pool(sys.argv):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+# Each prefork child must open its own connections to student deployments
+@worker_process_init.connect
+def reset_grading_http_sessions(*args, **kwargs):
+    from projects.services.grading_http_client import reset_session_pool_after_fork
+    reset_session_pool_after_fork()
+
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks(['projects'])
@@ -0,0 +1,12 @@
+# Gunicorn settings of the API (see entrypoint.sh).
+# Event streams and long-polls of running submissions (submissions/<id>/events/) hold their
+# request open while waiting on Redis, so the API runs on gevent workers: a waiting request
+# only parks its greenlet instead of blocking a whole sync worker.
+worker_class = 'gevent'
+worker_connections = 1000
+
+
+def post_fork(server, worker):
+    # psycopg2 must yield to other greenlets while waiting on Postgres.
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -26,8 +26,37 @@ APPEND_SLASH=True
 
 # CELERY SETTINGS
 CELERY_BROKER_URL = 'redis://redis:6379/0'
+# Redis used directly by the application (grading event streams, shared grading state).
+REDIS_URL = config('REDIS_URL', default='redis://redis:6379/2')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+# Each kind of work has its own queue and worker (see the compose files), so a slow draft
+# generation never holds up grading. Tasks without a route go to the maintenance queue.
+# The asyncio grading engines run their own event loop and thread pools, so they go to a
+# prefork worker ('grading-async') rather than the gevent worker of the 'grading' queue.
+CELERY_TASK_DEFAULT_QUEUE = 'maintenance'
+CELERY_TASK_ROUTES = {
+    'projects.tasks.run_submission_tests': {'queue': 'grading'},
+    'projects.tasks.run_submission_tests_async': {'queue': 'grading-async'},
+    'projects.tasks.run_pending_submissions_batch': {'queue': 'grading-async'},
+    'projects.tasks.generate_project_draft_task': {'queue': 'ai-drafts'},
+    'projects.tasks.requeue_stuck_submissions': {'queue': 'maintenance'},
+    'projects.tasks.regrade_submissions_chunk': {'queue': 'regrade'},
+    'projects.tasks.dispatch_fair_share_queue': {'queue': 'maintenance'},
+    'projects.tasks.reprioritize_grading_runs': {'queue': 'maintenance'},
+}
+# Workers reserve one task per execution slot; each worker raises it on its command line if needed.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Late-acknowledged tasks (grading, drafts) are redelivered when unacknowledged for this long,
+# so it must exceed the longest draft generation. Messages are kept in one Redis list per priority
+# step (0 is served first), which the grading priority lanes rely on.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': 60 * 60,
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
 CELERY_BEAT_SCHEDULE = {
     'requeue-stuck-submissions': {
         'task': 'projects.tasks.requeue_stuck_submissions',
@@ -35,6 +64,122 @@ CELERY_BEAT_SCHEDULE = {
     },
 }
 
+# GRADING SETTINGS
+# 'single' enqueues one run_submission_tests per submission; 'batch' lets run_pending_submissions_batch
+# claim and grade pending submissions together on the async engine.
+GRADING_DISPATCH_MODE = config('GRADING_DISPATCH_MODE', default='single')
+# Maximum number of pending submissions one batch claims.
+GRADING_BATCH_SIZE = config('GRADING_BATCH_SIZE', default=100, cast=int)
+# How long a queued batch keeps new submissions from queueing another one, should it never start.
+GRADING_BATCH_SCHEDULE_TTL_SECONDS = config('GRADING_BATCH_SCHEDULE_TTL_SECONDS', default=60, cast=int)
+if GRADING_DISPATCH_MODE == 'batch':
+    CELERY_BEAT_SCHEDULE['grade-pending-submissions'] = {
+        'task': 'projects.tasks.run_pending_submissions_batch',
+        'schedule': timedelta(seconds=config('GRADING_BATCH_INTERVAL_SECONDS', default=10, cast=int)),
+    }
+
+# Fair share: submissions wait in per-team queues and are released to the grading queue best aged
+# priority first, with at most GRADING_FAIR_SHARE_MAX_RUNNING_PER_TEAM per team and
+# GRADING_FAIR_SHARE_MAX_IN_FLIGHT overall queued or running; slots not released within
+# GRADING_FAIR_SHARE_STALE_SECONDS are reclaimed.
+GRADING_FAIR_SHARE_ENABLED = config('GRADING_FAIR_SHARE_ENABLED', default=True, cast=bool)
+GRADING_FAIR_SHARE_MAX_RUNNING_PER_TEAM = config('GRADING_FAIR_SHARE_MAX_RUNNING_PER_TEAM', default=2, cast=int)
+GRADING_FAIR_SHARE_MAX_IN_FLIGHT = config('GRADING_FAIR_SHARE_MAX_IN_FLIGHT', default=100, cast=int)
+GRADING_FAIR_SHARE_STALE_SECONDS = config('GRADING_FAIR_SHARE_STALE_SECONDS', default=15 * 60, cast=int)
+if GRADING_DISPATCH_MODE == 'single' and GRADING_FAIR_SHARE_ENABLED:
+    CELERY_BEAT_SCHEDULE['dispatch-fair-share-queue'] = {
+        'task': 'projects.tasks.dispatch_fair_share_queue',
+        'schedule': timedelta(seconds=10),
+    }
+
+# Priority lanes: grading runs of premium users start at GRADING_PRIORITY_PREMIUM and the others at
+# GRADING_PRIORITY_STANDARD (0 is served first); later tasks gain one step per task order, up to
+# GRADING_PRIORITY_MAX_TASK_BOOST, and every GRADING_PRIORITY_AGING_SECONDS of waiting gains another.
+# Every GRADING_PRIORITY_AGING_SECONDS, queued standard runs that aged into the premium lane are queued once more.
+GRADING_PRIORITY_ENABLED = config('GRADING_PRIORITY_ENABLED', default=True, cast=bool)
+GRADING_PRIORITY_PREMIUM = config('GRADING_PRIORITY_PREMIUM', default=1, cast=int)
+GRADING_PRIORITY_STANDARD = config('GRADING_PRIORITY_STANDARD', default=6, cast=int)
+GRADING_PRIORITY_MAX_TASK_BOOST = config('GRADING_PRIORITY_MAX_TASK_BOOST', default=2, cast=int)
+GRADING_PRIORITY_AGING_SECONDS = config('GRADING_PRIORITY_AGING_SECONDS', default=60, cast=int)
+if GRADING_DISPATCH_MODE == 'single' and GRADING_PRIORITY_ENABLED:
+    CELERY_BEAT_SCHEDULE['reprioritize-grading-runs'] = {
+        'task': 'projects.tasks.reprioritize_grading_runs',
+        'schedule': timedelta(seconds=GRADING_PRIORITY_AGING_SECONDS),
+    }
+
+# Maximum number of submission suites the async grading engine runs at once in one worker.
+GRADING_ASYNC_MAX_CONCURRENCY = config('GRADING_ASYNC_MAX_CONCURRENCY', default=200, cast=int)
+# Run independent test cases of a submission concurrently along their context/resource dependencies.
+GRADING_DEPENDENCY_SCHEDULING = config('GRADING_DEPENDENCY_SCHEDULING', default=True, cast=bool)
+# Maximum number of requests a single submission sends to its deployment at the same time.
+GRADING_MAX_PARALLEL_TESTS_PER_SUBMISSION = config('GRADING_MAX_PARALLEL_TESTS_PER_SUBMISSION', default=8, cast=int)
+
+# Compiled test plans: entries kept in each worker's in-process LRU, and lifetime in the shared cache.
+GRADING_PLAN_CACHE_SIZE = config('GRADING_PLAN_CACHE_SIZE', default=128, cast=int)
+GRADING_PLAN_CACHE_TIMEOUT = config('GRADING_PLAN_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# Compiled response-schema validators kept per worker; simple schemas use fastjsonschema's generated code.
+GRADING_SCHEMA_VALIDATOR_CACHE_SIZE = config('GRADING_SCHEMA_VALIDATOR_CACHE_SIZE', default=2048, cast=int)
+GRADING_FAST_SCHEMA_VALIDATION = config('GRADING_FAST_SCHEMA_VALIDATION', default=True, cast=bool)
+# Keep-alive HTTP connections to student deployments, pooled per host in each worker.
+GRADING_HTTP_POOL_SIZE_PER_HOST = config('GRADING_HTTP_POOL_SIZE_PER_HOST', default=4, cast=int)
+GRADING_HTTP_IDLE_TIMEOUT = config('GRADING_HTTP_IDLE_TIMEOUT', default=30, cast=int)
+GRADING_HTTP_MAX_HOSTS = config('GRADING_HTTP_MAX_HOSTS', default=256, cast=int)
+# Incremental grading: how old a passing submission may be for its results to be reused.
+GRADING_INCREMENTAL_TTL_MINUTES = config('GRADING_INCREMENTAL_TTL_MINUTES', default=60, cast=int)
+# Live submission progress: lifetime of a submission's event stream, longest wait of one poll and
+# longest server-sent event connection. Both stay well below gunicorn's --timeout (entrypoint.sh);
+# SSE clients reconnect with Last-Event-ID to resume.
+GRADING_EVENTS_TTL_SECONDS = config('GRADING_EVENTS_TTL_SECONDS', default=60 * 60, cast=int)
+GRADING_EVENTS_MAX_WAIT_SECONDS = config('GRADING_EVENTS_MAX_WAIT_SECONDS', default=25, cast=int)
+GRADING_EVENTS_STREAM_SECONDS = config('GRADING_EVENTS_STREAM_SECONDS', default=60, cast=int)
+# Delay before an SSE client reconnects after the server closed the stream.
+GRADING_EVENTS_RETRY_MILLISECONDS = config('GRADING_EVENTS_RETRY_MILLISECONDS', default=1000, cast=int)
+# Response bodies: bytes read per test case and per submission, and characters quoted in feedback.
+GRADING_MAX_RESPONSE_BYTES = config('GRADING_MAX_RESPONSE_BYTES', default=1024 * 1024, cast=int)
+GRADING_MAX_SUBMISSION_RESPONSE_BYTES = config('GRADING_MAX_SUBMISSION_RESPONSE_BYTES', default=16 * 1024 * 1024, cast=int)
+GRADING_FEEDBACK_SNIPPET_CHARS = config('GRADING_FEEDBACK_SNIPPET_CHARS', default=500, cast=int)
+# Circuit breaker: consecutive connection failures before a host is treated as down, and for how long.
+GRADING_BREAKER_FAILURE_THRESHOLD = config('GRADING_BREAKER_FAILURE_THRESHOLD', default=3, cast=int)
+GRADING_BREAKER_OPEN_SECONDS = config('GRADING_BREAKER_OPEN_SECONDS', default=60, cast=int)
+# Time budget: default wall-clock seconds for a whole submission (projects may override it), the
+# shortest timeout worth sending a request with, and how many times the host's slowest response
+# a request may still take when the budget is too short to give every remaining test 10 seconds.
+GRADING_SUBMISSION_TIME_BUDGET_SECONDS = config('GRADING_SUBMISSION_TIME_BUDGET_SECONDS', default=120, cast=int)
+GRADING_MIN_REQUEST_TIMEOUT_SECONDS = config('GRADING_MIN_REQUEST_TIMEOUT_SECONDS', default=2, cast=float)
+GRADING_TIMEOUT_LATENCY_MULTIPLIER = config('GRADING_TIMEOUT_LATENCY_MULTIPLIER', default=4, cast=float)
+# Leases: a running submission without a heartbeat for GRADING_LEASE_SECONDS is re-queued by the
+# sweeper; workers refresh their leases every GRADING_HEARTBEAT_SECONDS.
+GRADING_LEASE_SECONDS = config('GRADING_LEASE_SECONDS', default=120, cast=int)
+GRADING_HEARTBEAT_SECONDS = config('GRADING_HEARTBEAT_SECONDS', default=20, cast=int)
+# Pending submissions older than this are dispatched again by the sweeper, unless the fair-share
+# queue still holds them: their queue message was lost.
+GRADING_PENDING_REQUEUE_SECONDS = config('GRADING_PENDING_REQUEUE_SECONDS', default=15 * 60, cast=int)
+# Warm-up: before the first graded request, probe the deployment (waking sleeping free-tier hosts)
+# with exponential backoff from GRADING_WARMUP_INITIAL_BACKOFF_SECONDS, for at most
+# GRADING_WARMUP_MAX_WAIT_SECONDS of the submission's time budget.
+GRADING_WARMUP_ENABLED = config('GRADING_WARMUP_ENABLED', default=True, cast=bool)
+GRADING_WARMUP_MAX_WAIT_SECONDS = config('GRADING_WARMUP_MAX_WAIT_SECONDS', default=30, cast=float)
+GRADING_WARMUP_INITIAL_BACKOFF_SECONDS = config('GRADING_WARMUP_INITIAL_BACKOFF_SECONDS', default=1, cast=float)
+# Store each run's responses on the submission so it can be regraded offline after test case fixes.
+GRADING_RECORD_EXCHANGES = config('GRADING_RECORD_EXCHANGES', default=True, cast=bool)
+# Regrades replay recorded runs on their own 'regrade' queue, in chunks released one interval apart
+# so a large regrade never floods the workers or the database, nor delays the maintenance beat tasks.
+GRADING_REGRADE_CHUNK_SIZE = config('GRADING_REGRADE_CHUNK_SIZE', default=200, cast=int)
+GRADING_REGRADE_CHUNK_INTERVAL_SECONDS = config('GRADING_REGRADE_CHUNK_INTERVAL_SECONDS', default=5, cast=int)
+# Sequential runs checkpoint their progress in Redis after every test so a retry resumes where it stopped.
+GRADING_CHECKPOINT_TTL_SECONDS = config('GRADING_CHECKPOINT_TTL_SECONDS', default=60 * 60, cast=int)
+# Debug traces: kept in memory per run and stored only for failed runs or projects with debug_grading.
+GRADING_TRACE_MAX_ENTRIES = config('GRADING_TRACE_MAX_ENTRIES', default=2000, cast=int)
+GRADING_TRACE_BODY_BYTES = config('GRADING_TRACE_BODY_BYTES', default=4096, cast=int)
+
+# CACHE SETTINGS
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_CACHE_URL', default='redis://redis:6379/1'),
+    }
+}
+
 GEMINI_API_KEY = config('GEMINI_API_KEY')
 
 # Email settings
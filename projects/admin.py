@@ -5,7 +5,8 @@ from django.forms import Textarea
 from projects.models.categories_difficulties import DifficultyLevel, Category
 from projects.models.prerequisites import Prerequisite, TaskPrerequisite
 from projects.models.projects import Project, TeamProject
-from projects.models.submission import Submission
+from projects.models.regrades import Regrade
+from projects.models.submission import Submission, SubmissionTestResult
 from projects.models.tasks_endpoints import Endpoint, Task
 from projects.models.testcases import TestCase, ApiTestCase # Import both new models
 
@@ -54,7 +55,7 @@ class ApiTestCaseInline(admin.StackedInline):
     # Use the JSON widget override
     formfield_overrides = JSON_TEXTAREA_OVERRIDE
     # You can specify the field order if you like
-    fields = ('endpoint', 'expected_status_code', 'request_payload', 'request_headers', 'expected_response_schema')
+    fields = ('endpoint', 'expected_status_code', 'query_params', 'request_payload', 'request_headers', 'expected_response_schema')
 
 
 @admin.register(TestCase)
@@ -65,6 +66,17 @@ class TestCaseAdmin(admin.ModelAdmin):
     inlines = [ApiTestCaseInline]
     # Specify the field order for the main TestCase form
     fields = ('task', 'name', 'description', 'test_type', 'points', 'stop_on_failure')
+    actions = ['regrade_affected_submissions']
+
+    @admin.action(description="Regrade the submissions affected by the selected test cases")
+    def regrade_affected_submissions(self, request, queryset):
+        from projects.services.regrade_service import RegradeService
+
+        regrades = RegradeService.start_for_test_cases(
+            queryset.select_related('task'), reason=f"Admin action by {request.user}"
+        )
+        total = sum(regrade.total for regrade in regrades)
+        self.message_user(request, f"Queued {len(regrades)} regrade(s) covering {total} submissions.")
 
 
 # --- Inlines for Project and Task Admins ---
@@ -115,10 +127,32 @@ class TaskAdmin(admin.ModelAdmin):
 
 # --- Submission Admin (Updated for better JSON editing) ---
 
+class SubmissionTestResultInline(admin.TabularInline):
+    model = SubmissionTestResult
+    extra = 0
+    can_delete = False
+    fields = ('order', 'task_name', 'name', 'passed', 'points_earned', 'status_code', 'duration_ms', 'feedback')
+    readonly_fields = fields
+
+
 @admin.register(Submission)
 class SubmissionAdmin(admin.ModelAdmin):
     list_display = ("task", "user", "status", "passed_percentage", "completed_at", "created_at")
-    list_filter = ("status", "created_at", "task__project__name")
+    list_filter = ("status", "priority_lane", "created_at", "task__project__name")
     search_fields = ("user__username", "task__name")
-    readonly_fields = ('created_at', 'completed_at')
+    readonly_fields = ('created_at', 'completed_at', 'trace_artifact', 'priority_lane')
     formfield_overrides = JSON_TEXTAREA_OVERRIDE
+    inlines = [SubmissionTestResultInline]
+
+
+@admin.register(Regrade)
+class RegradeAdmin(admin.ModelAdmin):
+    list_display = (
+        "project", "min_task_order", "total", "regraded", "skipped", "needs_live_regrade", "failed",
+        "created_at", "finished_at",
+    )
+    list_filter = ("project__name",)
+    readonly_fields = [field.name for field in Regrade._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,207 @@
+"""
+A local stand-in for student deployments: reference implementations of the APIs of the
+bundled seeds (TaskMaster and the URL shortener), served from a separate process with
+configurable latency, error rate and payload size.
+
+Every deployment lives under its own prefix, `/<app>/<instance>/...`, with its own
+in-memory state, so many submissions can be graded against one server at once. Each
+instance is also served on its own port: the grader pools connections and trips its
+circuit breaker per host, so instances sharing one host would share those limits.
+"""
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+TASKMASTER = 'taskmaster'
+URL_SHORTENER = 'url-shortener'
+
+
+class StubApiConfig:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, payload_bytes: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_bytes = payload_bytes
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_PUT(self):
+        self._dispatch()
+
+    def do_PATCH(self):
+        self._dispatch()
+
+    def do_DELETE(self):
+        self._dispatch()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        config = self.server.config
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+
+        delay_ms = config.latency_ms + random.uniform(0, config.jitter_ms)
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        if config.error_rate and random.random() < config.error_rate:
+            return self._send(500, {'error': 'Injected failure.'})
+
+        segments = [segment for segment in urlsplit(self.path).path.split('/') if segment]
+        if len(segments) < 2:
+            return self._send(404, {'error': 'Unknown deployment.'})
+        app, instance, segments = segments[0], segments[1], segments[2:]
+
+        try:
+            body = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            return self._send(400, {'error': 'Invalid JSON.'})
+
+        state = self.server.state_for(app, instance)
+        if app == TASKMASTER:
+            return self._send(*taskmaster(self.command, segments, body, state))
+        if app == URL_SHORTENER:
+            return self._send(*url_shortener(self.command, segments, body, state))
+        return self._send(404, {'error': 'Unknown application.'})
+
+    def _send(self, status: int, payload=None, headers: dict = None):
+        padding = self.server.config.payload_bytes
+        if isinstance(payload, dict) and padding:
+            payload = {**payload, 'padding': 'x' * padding}
+        content = json.dumps(payload).encode() if payload is not None else b''
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def taskmaster(method: str, segments: list, body, state: dict):
+    tasks = state.setdefault('tasks', {})
+    if segments == ['tasks']:
+        if method == 'GET':
+            return 200, list(tasks.values())
+        if method == 'POST':
+            if not isinstance(body, dict) or not body.get('title'):
+                return 400, {'error': 'title is required.'}
+            state['next_id'] = state.get('next_id', 0) + 1
+            task = {
+                'id': state['next_id'],
+                'title': body['title'],
+                'description': body.get('description', ''),
+                'is_completed': bool(body.get('is_completed', False)),
+            }
+            tasks[str(task['id'])] = task
+            return 201, task
+        return 405, {'error': 'Method not allowed.'}
+
+    if len(segments) == 2 and segments[0] == 'tasks':
+        task = tasks.get(segments[1])
+        if task is None:
+            return 404, {'error': 'Task not found.'}
+        if method == 'GET':
+            return 200, task
+        if method in ('PUT', 'PATCH'):
+            for field in ('title', 'description', 'is_completed'):
+                if isinstance(body, dict) and field in body:
+                    task[field] = body[field]
+            return 200, task
+        if method == 'DELETE':
+            del tasks[segments[1]]
+            return 204, None
+        return 405, {'error': 'Method not allowed.'}
+
+    return 404, {'error': 'Not found.'}
+
+
+def url_shortener(method: str, segments: list, body, state: dict):
+    links = state.setdefault('links', {})
+    if segments == ['shorten'] and method == 'POST':
+        url = body.get('url') if isinstance(body, dict) else None
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            return 400, {'error': 'A valid http(s) URL is required.'}
+        state['next_id'] = state.get('next_id', 0) + 1
+        link = {'id': state['next_id'], 'original_url': url, 'zip_code': f"zip{state['next_id']:05d}", 'clicks': 0}
+        links[link['zip_code']] = link
+        return 201, link
+
+    if len(segments) == 2 and segments[0] == 'stats' and method == 'GET':
+        link = links.get(segments[1])
+        if link is None:
+            return 404, {'error': 'Link not found.'}
+        return 200, {'clicks': link['clicks']}
+
+    if len(segments) == 1 and method == 'GET':
+        link = links.get(segments[0])
+        if link is None:
+            return 404, {'error': 'Link not found.'}
+        link['clicks'] += 1
+        return 302, None, {'Location': link['original_url']}
+
+    return 404, {'error': 'Not found.'}
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: StubApiConfig, states: dict):
+        super().__init__(address, StubApiHandler)
+        self.config = config
+        self._states = states
+
+    def state_for(self, app: str, instance: str) -> dict:
+        return self._states.setdefault((app, instance), {})
+
+
+def _serve(config: StubApiConfig, port_count: int, ports: multiprocessing.Queue):
+    states = {}
+    servers = [StubHTTPServer(('127.0.0.1', 0), config, states) for _ in range(port_count)]
+    ports.put([server.server_address[1] for server in servers])
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers[0].serve_forever()
+
+
+class StubApiServer:
+    """
+    Runs the stub server in a child process for the duration of a `with` block, listening
+    on `port_count` ports; instances are spread over them.
+    """
+
+    def __init__(self, config: StubApiConfig, port_count: int = 1):
+        self.config = config
+        self.port_count = port_count
+        self.ports = []
+        self._process = None
+
+    def deployment_url(self, app: str, instance: int) -> str:
+        return f"http://127.0.0.1:{self.ports[instance % len(self.ports)]}/{app}/{instance}"
+
+    def __enter__(self):
+        context = multiprocessing.get_context('fork')
+        ports = context.Queue()
+        self._process = context.Process(target=_serve, args=(self.config, self.port_count, ports), daemon=True)
+        self._process.start()
+        self.ports = ports.get(timeout=10)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,180 @@
+import json
+import resource
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from projects.management.commands._stub_api_server import StubApiConfig, StubApiServer, TASKMASTER, URL_SHORTENER
+from projects.models import Category, DifficultyLevel, Project, Submission, SubmissionTestResult, TeamProject, PENDING
+from projects.serializers import ProjectSeedSerializer
+from projects.services.grading_lane_metrics import percentile
+from projects.services.project_seed_service import ProjectSeederService
+from teams.models import Team
+from users.models import User
+
+SEEDS = {
+    TASKMASTER: 'taskmaster_project_seed.json',
+    URL_SHORTENER: 'URL_Shortener_API_Project_Seed.json',
+}
+
+
+class QueryCounter:
+    """Counts the queries of every database connection, including the ones opened by worker threads."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        for connection in connections.all():
+            self.install(connection)
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class Command(BaseCommand):
+    help = (
+        "Grades N submissions of a bundled seed against a local stub student API and reports "
+        "throughput, per-test latency, queries per submission and peak RSS. Every submission "
+        "gets its own stub host (port), so per-host connection pools and circuit breakers apply "
+        "as they would to real deployments. Uses the configured database and Redis; run it "
+        "against a development stack, never production. "
+        "The batch engine claims every pending submission in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', choices=sorted(SEEDS), default=TASKMASTER)
+        parser.add_argument('--submissions', type=int, default=50)
+        parser.add_argument('--engine', choices=['sync', 'async', 'batch'], default='sync')
+        parser.add_argument('--latency-ms', type=float, default=0, help="Added to every stub response.")
+        parser.add_argument('--jitter-ms', type=float, default=0, help="Random extra latency of up to this much.")
+        parser.add_argument('--error-rate', type=float, default=0, help="Share of stub responses that are a 500.")
+        parser.add_argument('--payload-bytes', type=int, default=0, help="Padding added to every JSON object response.")
+        parser.add_argument('--keep-data', action='store_true', help="Keep the seeded project and submissions.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['submissions'] < 1:
+            raise CommandError("--submissions must be at least 1.")
+
+        config = StubApiConfig(
+            latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'], payload_bytes=options['payload_bytes'],
+        )
+        run_id = uuid.uuid4().hex[:8]
+        fixtures = None
+        with StubApiServer(config, port_count=options['submissions']) as server:
+            try:
+                fixtures = self._seed(options['seed'], run_id)
+                submission_ids = self._create_submissions(fixtures, server, options['seed'], options['submissions'])
+                report = self._run(options['engine'], submission_ids)
+            finally:
+                if fixtures and not options['keep_data']:
+                    self._cleanup(fixtures)
+
+        report.update(seed=options['seed'], engine=options['engine'], deployment_hosts=len(server.ports))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for key, value in report.items():
+                self.stdout.write(f"{key:>28}: {value}")
+
+    def _seed(self, seed: str, run_id: str) -> dict:
+        with open(settings.BASE_DIR / SEEDS[seed]) as seed_file:
+            data = json.load(seed_file)
+
+        # Slugs are unique across projects and tasks, so every run gets its own.
+        data['slug'] = f"{data['slug']}-bench-{run_id}"
+        for task in data['tasks']:
+            task['slug'] = f"{task['slug']}-bench-{run_id}"
+        Category.objects.get_or_create(name=data['category'])
+        DifficultyLevel.objects.get_or_create(name=data['difficulty_level'])
+
+        serializer = ProjectSeedSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        project = ProjectSeederService(serializer.validated_data, is_public=False).create_project()
+
+        user = User.objects.create_user(
+            email=f"benchmark-{run_id}@example.com", first_name='Benchmark', last_name=run_id, password=uuid.uuid4().hex,
+        )
+        team = Team.objects.create(name=f"Benchmark {run_id}", owner=user)
+        team.members.add(user)
+        TeamProject.objects.create(team=team, project=project)
+        return {'project': project, 'user': user, 'team': team}
+
+    @staticmethod
+    def _create_submissions(fixtures: dict, server: StubApiServer, seed: str, count: int):
+        project = fixtures['project']
+        last_task = project.tasks.order_by('-order').first()
+        submissions = Submission.objects.bulk_create([
+            Submission(
+                project=project, task=last_task, user=fixtures['user'], team=fixtures['team'],
+                deployment_url=server.deployment_url(seed, instance), status=PENDING,
+            )
+            for instance in range(count)
+        ])
+        return [submission.id for submission in submissions]
+
+    def _run(self, engine: str, submission_ids: list) -> dict:
+        with QueryCounter() as queries:
+            started = time.perf_counter()
+            if engine == 'sync':
+                from projects.services.submissions_services import SubmissionTestRunnerService
+                for submission_id in submission_ids:
+                    SubmissionTestRunnerService(submission_id).run()
+            elif engine == 'async':
+                from projects.services.async_submission_runner import AsyncGradingEngine
+                AsyncGradingEngine().run(submission_ids)
+            else:
+                from projects.services.batch_grading_service import BatchGradingService
+                BatchGradingService(batch_size=len(submission_ids)).run()
+            elapsed = time.perf_counter() - started
+
+        durations = sorted(
+            SubmissionTestResult.objects.filter(submission_id__in=submission_ids, duration_ms__isnull=False)
+            .values_list('duration_ms', flat=True)
+        )
+        statuses = {}
+        for submission_status in Submission.objects.filter(id__in=submission_ids).values_list('status', flat=True):
+            statuses[submission_status] = statuses.get(submission_status, 0) + 1
+
+        return {
+            'submissions': len(submission_ids),
+            'statuses': statuses,
+            'elapsed_seconds': round(elapsed, 3),
+            'submissions_per_second': round(len(submission_ids) / elapsed, 2) if elapsed else None,
+            'tests_timed': len(durations),
+            'test_latency_p50_ms': percentile(durations, 0.5),
+            'test_latency_p95_ms': percentile(durations, 0.95),
+            'test_latency_p99_ms': percentile(durations, 0.99),
+            'queries_per_submission': round(queries.count / len(submission_ids), 1),
+            # ru_maxrss is in kilobytes on Linux.
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    @staticmethod
+    def _cleanup(fixtures: dict):
+        Project.objects.filter(pk=fixtures['project'].pk).delete()
+        fixtures['team'].delete()
+        fixtures['user'].delete()
+
@@ -0,0 +1,31 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.services.grading_lane_metrics import GradingLaneMetricsService
+
+
+class Command(BaseCommand):
+    help = "Prints the p50/p95 queue wait and turnaround, in seconds, of each grading priority lane."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="Only submissions created in the last N hours.")
+        parser.add_argument('--json', action='store_true', help="Print the summary as JSON.")
+
+    def handle(self, *args, **options):
+        summary = GradingLaneMetricsService.summarize(timezone.now() - timedelta(hours=options['hours']))
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        def seconds(value):
+            return '-' if value is None else f"{value:.1f}s"
+
+        for lane, metrics in summary.items():
+            self.stdout.write(
+                f"{lane}: {metrics['count']} runs, queue wait p50 {seconds(metrics['queue_wait_p50'])} "
+                f"p95 {seconds(metrics['queue_wait_p95'])}, turnaround p50 {seconds(metrics['turnaround_p50'])} "
+                f"p95 {seconds(metrics['turnaround_p95'])}"
+            )
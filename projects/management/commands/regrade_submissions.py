@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects.models import Project, TestCase
+from projects.services.regrade_service import RegradeService
+
+
+class Command(BaseCommand):
+    help = (
+        "Regrades the completed submissions affected by edited test cases by replaying their "
+        "recorded exchanges on the regrade queue. Progress is tracked on Regrade rows."
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--test-case', type=int, nargs='+', dest='test_case_ids', help="Ids of the edited test cases.")
+        target.add_argument('--project', type=int, dest='project_id', help="Regrade every completed submission of a project.")
+        parser.add_argument('--from-task-order', type=int, default=0, help="With --project, only tasks from this order on.")
+        parser.add_argument('--reason', default='', help="Stored on the Regrade for reference.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['project_id'] is not None:
+                if not Project.objects.filter(pk=options['project_id']).exists():
+                    raise CommandError(f"Project {options['project_id']} does not exist.")
+                regrades = [RegradeService.start(options['project_id'], options['from_task_order'], options['reason'])]
+            else:
+                test_cases = list(TestCase.objects.filter(pk__in=options['test_case_ids']).select_related('task'))
+                if not test_cases:
+                    raise CommandError("None of the given test cases exist.")
+                regrades = RegradeService.start_for_test_cases(test_cases, options['reason'])
+
+        for regrade in regrades:
+            self.stdout.write(
+                f"Regrade {regrade.id}: {regrade.total} submissions of project {regrade.project_id} "
+                f"from task order {regrade.min_task_order}."
+            )
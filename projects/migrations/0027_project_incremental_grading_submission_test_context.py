@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0026_alter_project_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='incremental_grading',
+            field=models.BooleanField(default=False, help_text="If true, a submission reuses the passing results of earlier tasks from the team's latest passing submission to the same deployment URL instead of re-running them."),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='test_context',
+            field=models.JSONField(blank=True, help_text='The context values collected from the responses during the run.', null=True),
+        ),
+    ]
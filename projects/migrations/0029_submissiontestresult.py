@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-17 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0028_alter_submission_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionTestResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(help_text="Position of the result in the submission's run.")),
+                ('task_name', models.CharField(max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('passed', models.BooleanField()),
+                ('points_earned', models.PositiveSmallIntegerField(default=0)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('feedback', models.TextField(blank=True)),
+                ('reused_from_submission', models.PositiveIntegerField(blank=True, help_text='The submission this result was copied from by incremental grading.', null=True)),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_results', to='projects.submission')),
+                ('task', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='projects.task')),
+                ('test_case', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='projects.testcase')),
+            ],
+            options={
+                'ordering': ['submission', 'order'],
+                'indexes': [models.Index(fields=['test_case', 'passed'], name='test_result_case_passed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('submission', 'order'), name='unique_result_order_per_submission')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.0 on 2026-10-17 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Task = apps.get_model('projects', 'Task')
+
+    for project_id in Project.objects.values_list('id', flat=True):
+        tasks = list(
+            Task.objects.filter(project_id=project_id).order_by('order').annotate(
+                points_sum=Coalesce(Sum('test_cases__points'), 0),
+                cases_count=Count('test_cases'),
+            )
+        )
+        cumulative_points = cumulative_count = 0
+        for task in tasks:
+            cumulative_points += task.points_sum
+            cumulative_count += task.cases_count
+            task.total_points = task.points_sum
+            task.test_case_count = task.cases_count
+            task.cumulative_points = cumulative_points
+            task.cumulative_test_case_count = cumulative_count
+        Task.objects.bulk_update(
+            tasks, ['total_points', 'test_case_count', 'cumulative_points', 'cumulative_test_case_count']
+        )
+        Project.objects.filter(pk=project_id).update(total_points=cumulative_points, test_case_count=cumulative_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0029_submissiontestresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='test_case_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='test_case_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='cumulative_points',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='cumulative_test_case_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
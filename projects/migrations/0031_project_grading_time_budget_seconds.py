@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0030_project_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='grading_time_budget_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Wall-clock seconds a submission may spend running tests. Defaults to GRADING_SUBMISSION_TIME_BUDGET_SECONDS.', null=True),
+        ),
+    ]
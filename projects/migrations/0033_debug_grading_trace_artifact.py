@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0032_submission_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='debug_grading',
+            field=models.BooleanField(default=False, help_text='If true, the debug trace of every submission is stored, not only of failed ones.'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='trace_artifact',
+            field=models.FileField(blank=True, help_text="Gzip-compressed JSON lines trace of the run's requests and responses.", null=True, upload_to='grading-traces/%Y/%m/'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-17 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0033_debug_grading_trace_artifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apitestcase',
+            name='query_params',
+            field=models.JSONField(blank=True, help_text="Query string parameters to send, e.g., {'page': 2} or {'owner': '{{context.id}}'}", null=True),
+        ),
+        migrations.AlterField(
+            model_name='apitestcase',
+            name='request_payload',
+            field=models.JSONField(blank=True, help_text="JSON body to send with the request (for POST, PUT); strings may reference '{{context.x}}'.", null=True),
+        ),
+    ]
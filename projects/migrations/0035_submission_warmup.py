@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-17 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0034_apitestcase_query_params'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='warmup_succeeded',
+            field=models.BooleanField(blank=True, help_text='Whether the deployment answered the warm-up probe; empty if no probe was sent.', null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='warmup_seconds',
+            field=models.FloatField(blank=True, help_text='Time spent waking the deployment up.', null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='warmup_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0035_submission_warmup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='recording',
+            field=models.FileField(blank=True, help_text='Gzip-compressed responses of the run, used to regrade the submission without its deployment.', null=True, upload_to='grading-recordings/%Y/%m/'),
+        ),
+    ]
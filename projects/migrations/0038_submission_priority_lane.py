@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0037_regrade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='priority_lane',
+            field=models.CharField(blank=True, default='', help_text='The grading lane the run was queued in, see GradingPriority.', max_length=16),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0038_submission_priority_lane'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='fail_message',
+            field=models.CharField(blank=True, default='', help_text='Why grading failed when no test result explains it.', max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0039_submission_fail_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regrade',
+            name='needs_live_regrade',
+            field=models.PositiveIntegerField(default=0, help_text='Submissions left unchanged because they reached test cases without a recorded response.'),
+        ),
+    ]
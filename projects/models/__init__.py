@@ -3,5 +3,6 @@ from .projects import Project, TeamProject
 from .categories_difficulties import Category, DifficultyLevel
 from .tasks_endpoints import Task, Endpoint, MethodType
 from .testcases import TestCase, ApiTestCase, TestType, Task, Endpoint
-from .submission import Submission, status_choices, FAILED, PASSED, PENDING
+from .submission import Submission, SubmissionTestResult, status_choices, FAILED, PASSED, PENDING, RUNNING
 from .prerequisites import Prerequisite, TaskPrerequisite
+from .regrades import Regrade
@@ -30,6 +30,23 @@ class Project(models.Model):
     is_premium = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     max_team_size = models.PositiveSmallIntegerField(default=1)
+    incremental_grading = models.BooleanField(
+        default=False,
+        help_text="If true, a submission reuses the passing results of earlier tasks from the team's "
+                  "latest passing submission to the same deployment URL instead of re-running them."
+    )
+    debug_grading = models.BooleanField(
+        default=False,
+        help_text="If true, the debug trace of every submission is stored, not only of failed ones."
+    )
+    grading_time_budget_seconds = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Wall-clock seconds a submission may spend running tests. "
+                  "Defaults to GRADING_SUBMISSION_TIME_BUDGET_SECONDS."
+    )
+    # Denormalized from the test cases of all tasks by ProjectTotalsService.
+    total_points = models.PositiveIntegerField(default=0, editable=False)
+    test_case_count = models.PositiveIntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.slug:
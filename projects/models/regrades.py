@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class Regrade(models.Model):
+    """
+    A bulk re-evaluation of a project's completed submissions after its test cases changed.
+    The counters are advanced by each chunk as it is written back, see RegradeService.
+    """
+    project = models.ForeignKey('Project', on_delete=models.CASCADE, related_name='regrades')
+    min_task_order = models.PositiveIntegerField(
+        help_text="Submissions of tasks from this order on are affected, since their runs include the changed task."
+    )
+    reason = models.CharField(max_length=255, blank=True)
+
+    total = models.PositiveIntegerField(default=0)
+    regraded = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0, help_text="Submissions without recorded exchanges to replay.")
+    needs_live_regrade = models.PositiveIntegerField(
+        default=0, help_text="Submissions left unchanged because they reached test cases without a recorded response."
+    )
+    failed = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Regrade of {self.project_id} from task {self.min_task_order}: {self.processed}/{self.total}"
+
+    @property
+    def processed(self) -> int:
+        return self.regraded + self.skipped + self.needs_live_regrade + self.failed
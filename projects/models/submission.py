@@ -2,10 +2,12 @@ from django.db import models
 from django.utils import timezone
 
 PENDING = 'pending'
+RUNNING = 'running'
 PASSED  = 'passed'
 FAILED  = 'failed'
 status_choices = (
     (PENDING, 'Pending'),
+    (RUNNING, 'Running'),
     (PASSED, 'Passed'),
     (FAILED, 'Failed'),
 )
@@ -23,27 +25,150 @@ class Submission(models.Model):
     passed_tests = models.PositiveSmallIntegerField(default=0)
     failed_test_index = models.PositiveSmallIntegerField(default=0,null=True)
     passed_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    fail_message = models.CharField(
+        max_length=255, blank=True, default='', help_text="Why grading failed when no test result explains it."
+    )
 
+    # Legacy per-test log; results are stored as SubmissionTestResult rows, see get_results_log.
     execution_logs = models.JSONField(blank=True, null=True)
     feedback = models.JSONField(blank=True, null=True)
+    test_context = models.JSONField(
+        blank=True, null=True, help_text="The context values collected from the responses during the run."
+    )
 
     deployment_url = models.URLField(null=True, blank=True)
     github_url = models.URLField(null=True, blank=True)
+    recording = models.FileField(
+        upload_to='grading-recordings/%Y/%m/', null=True, blank=True,
+        help_text="Gzip-compressed responses of the run, used to regrade the submission without its deployment."
+    )
+    warmup_succeeded = models.BooleanField(
+        null=True, blank=True, help_text="Whether the deployment answered the warm-up probe; empty if no probe was sent."
+    )
+    warmup_seconds = models.FloatField(null=True, blank=True, help_text="Time spent waking the deployment up.")
+    warmup_attempts = models.PositiveSmallIntegerField(default=0)
+    trace_artifact = models.FileField(
+        upload_to='grading-traces/%Y/%m/', null=True, blank=True,
+        help_text="Gzip-compressed JSON lines trace of the run's requests and responses."
+    )
+
+    priority_lane = models.CharField(
+        max_length=16, blank=True, default='', help_text="The grading lane the run was queued in, see GradingPriority."
+    )
 
     completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    # Lease of the worker grading the submission, see SubmissionLeaseService.
+    claimed_by = models.CharField(max_length=255, blank=True, default='')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Selects the completed submissions of a project to regrade.
+            models.Index(fields=['project', 'status', 'task'], name='submission_project_status_idx'),
+        ]
 
     def __str__(self ):
         fields = [self.status, self.deployment_url, self.completed_at]
         return " - ".join([str(field) for field in fields if field is not None])
 
     @classmethod
-    def get_stuck_submissions(cls, timeout_minutes=5):
+    def get_stale_pending(cls, pending_seconds):
+        """Pending submissions created more than `pending_seconds` ago."""
+        created_before = timezone.now() - timezone.timedelta(seconds=pending_seconds)
+        return cls.objects.filter(status=PENDING, created_at__lt=created_before)
+
+    @staticmethod
+    def expired_lease_filter(lease_seconds):
+        """
+        Matches running submissions whose worker has not sent a heartbeat for `lease_seconds`
+        (or, for runs claimed before leases existed, that were created that long ago).
+        """
+        expired_before = timezone.now() - timezone.timedelta(seconds=lease_seconds)
+        return models.Q(status=RUNNING) & (
+            models.Q(heartbeat_at__lt=expired_before)
+            | models.Q(heartbeat_at__isnull=True, created_at__lt=expired_before)
+        )
+
+    @classmethod
+    def get_expired_leases(cls, lease_seconds):
+        return cls.objects.filter(cls.expired_lease_filter(lease_seconds))
+
+    def get_results_log(self):
         """
-        Returns submissions that have been in the pending state for more than `timeout_minutes`.
+        The per-test results in run order, in the shape of the legacy `execution_logs`.
+        Submissions graded before the results table existed fall back to the stored blob.
         """
-        stuck_time = timezone.now() - timezone.timedelta(minutes=timeout_minutes)
-        return cls.objects.filter(status=PENDING, created_at__lte=stuck_time)
+        results = list(self.test_results.all())
+        if results:
+            return [result.as_log_entry() for result in results]
+        return self.execution_logs or []
+
+
+class SubmissionTestResult(models.Model):
+    FEEDBACK_MAX_LENGTH = 2000
+
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='test_results')
+    task = models.ForeignKey('Task', on_delete=models.SET_NULL, null=True, related_name='+')
+    test_case = models.ForeignKey('TestCase', on_delete=models.SET_NULL, null=True, related_name='results')
+    order = models.PositiveIntegerField(help_text="Position of the result in the submission's run.")
+
+    # Names are kept so results stay readable after the task or test case is edited or deleted.
+    task_name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255)
+
+    passed = models.BooleanField()
+    points_earned = models.PositiveSmallIntegerField(default=0)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    feedback = models.TextField(blank=True)
+    reused_from_submission = models.PositiveIntegerField(
+        null=True, blank=True, help_text="The submission this result was copied from by incremental grading."
+    )
+
+    class Meta:
+        ordering = ['submission', 'order']
+        indexes = [
+            models.Index(fields=['test_case', 'passed'], name='test_result_case_passed_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['submission', 'order'], name='unique_result_order_per_submission')
+        ]
+
+    def __str__(self):
+        return f"{self.submission_id} - {self.name} - {'passed' if self.passed else 'failed'}"
+
+    @classmethod
+    def from_log_entry(cls, submission: Submission, order: int, entry: dict) -> 'SubmissionTestResult':
+        feedback = entry['feedback'] or ''
+        if len(feedback) > cls.FEEDBACK_MAX_LENGTH:
+            feedback = feedback[:cls.FEEDBACK_MAX_LENGTH - 3] + '...'
+        return cls(
+            submission=submission,
+            task_id=entry['task_id'],
+            test_case_id=entry['test_case_id'],
+            order=order,
+            task_name=entry['task_name'][:255],
+            name=entry['name'][:255],
+            passed=entry['passed'],
+            points_earned=entry['points_earned'],
+            duration_ms=entry.get('duration_ms'),
+            status_code=entry.get('status_code'),
+            feedback=feedback,
+            reused_from_submission=entry.get('reused_from_submission'),
+        )
+
+    def as_log_entry(self) -> dict:
+        entry = {
+            "task_id": self.task_id, "task_name": self.task_name,
+            "test_case_id": self.test_case_id, "name": self.name,
+            "passed": self.passed, "points_earned": self.points_earned,
+            "feedback": self.feedback,
+            "duration_ms": self.duration_ms, "status_code": self.status_code,
+        }
+        if self.reused_from_submission is not None:
+            entry["reused_from_submission"] = self.reused_from_submission
+        return entry
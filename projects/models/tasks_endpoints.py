@@ -20,6 +20,12 @@ class Task(models.Model):
         help_text="Execution order of the task within a project (0, 1, 2...).")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized from the test cases by ProjectTotalsService; cumulative values cover every task up to this one.
+    total_points = models.PositiveIntegerField(default=0, editable=False)
+    test_case_count = models.PositiveIntegerField(default=0, editable=False)
+    cumulative_points = models.PositiveIntegerField(default=0, editable=False)
+    cumulative_test_case_count = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['project', 'order'] # Default ordering
         constraints = [
@@ -1,3 +1,5 @@
+import jsonschema
+from django.core.exceptions import ValidationError
 from django.db import models
 
 from projects.models.tasks_endpoints import Task, Endpoint
@@ -55,9 +57,15 @@ class ApiTestCase(models.Model):
         help_text="Parameters to substitute into the endpoint path, e.g., {'id': 99999} or {'id': '{{context.id}}'}"
     )
 
+    query_params = models.JSONField(
+        blank=True, null=True,
+        help_text="Query string parameters to send, e.g., {'page': 2} or {'owner': '{{context.id}}'}"
+    )
+
     # Define the request to be sent
     request_payload = models.JSONField(
-        blank=True, null=True, help_text="JSON body to send with the request (for POST, PUT)."
+        blank=True, null=True,
+        help_text="JSON body to send with the request (for POST, PUT); strings may reference '{{context.x}}'."
     )
     request_headers = models.JSONField(
         blank=True, null=True, help_text="JSON object of headers to send."
@@ -70,6 +78,13 @@ class ApiTestCase(models.Model):
         blank=True, null=True, help_text="Optional: A JSON schema to validate the response structure against."
     )
 
+    def clean(self):
+        schema = self.expected_response_schema
+        if schema:
+            try:
+                jsonschema.validators.validator_for(schema).check_schema(schema)
+            except jsonschema.exceptions.SchemaError as e:
+                raise ValidationError({'expected_response_schema': f"Invalid JSON schema: {e.message}"})
 
     def __str__(self):
         return f"API Test for: {self.test_case.name}"
@@ -1,14 +1,19 @@
+import jsonschema
+from django.conf import settings
 from rest_framework import serializers
 
 from projects.models.categories_difficulties import Category, DifficultyLevel
 from projects.models.projects import Project, TeamProject
-from projects.models.submission import Submission, PASSED
+from projects.models.submission import Submission, PASSED, PENDING
 from projects.models.tasks_endpoints import Task, MethodType, Endpoint
 from teams.models import Team
 from teams.serializers import TeamSerializer
 from .models import ProjectDraft, DraftStatus
 from .services.submissions_services import SubmissionService
 from .services.draft_service import DraftService
+from .services.fair_share_dispatcher import FairShareDispatcher
+from .services.schema_validator_registry import check_schema
+from .services.test_dependency_planner import CONTEXT_REFERENCE_PATTERN
 
 def validate_team(user, value):
     try:
@@ -173,7 +178,7 @@ class TaskSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Task
-        fields = ["id", "name", "slug", "is_passed","difficulty_level", "created_at"]
+        fields = ["id", "name", "slug", "is_passed","difficulty_level", "created_at", "total_points", "test_case_count"]
 
     def get_difficulty_level(self, obj):
         return obj.difficulty_level.name if obj.difficulty_level else None
@@ -215,6 +220,8 @@ class ProjectSerializer(serializers.ModelSerializer):
             "category",
             "is_registered",
             "created_by_name",
+            "total_points",
+            "test_case_count",
         ]
 
     def get_is_registered(self, obj):
@@ -261,6 +268,9 @@ class TaskDetailsSerializer(serializers.ModelSerializer):
             "duration_in_days",
             "difficulty_level",
             "created_at",
+            "total_points",
+            "test_case_count",
+            "cumulative_points",
             "endpoints"
         ]
 
@@ -302,6 +312,8 @@ class ProjectDetailsSerializer(serializers.ModelSerializer):
             "max_team_size",
             "difficulty_level",
             "category",
+            "total_points",
+            "test_case_count",
             "tasks",
         ]
 
@@ -373,10 +385,27 @@ class DifficultyLevelSerializer(serializers.ModelSerializer):
 
 
 class SubmissionDetailsSerializer(serializers.ModelSerializer):
+    execution_logs = serializers.SerializerMethodField()
+    queue_position = serializers.SerializerMethodField()
 
     class Meta:
         model = Submission
-        fields = "__all__"
+        # Grading internals (worker leases, stored artifacts, the raw test context) stay private.
+        fields = [
+            'id', 'project', 'task', 'user', 'team', 'status', 'passed_tests', 'failed_test_index',
+            'passed_percentage', 'fail_message', 'execution_logs', 'feedback', 'deployment_url', 'github_url',
+            'warmup_succeeded', 'warmup_seconds', 'warmup_attempts', 'completed_at', 'created_at',
+            'queue_position',
+        ]
+
+    def get_execution_logs(self, obj):
+        return obj.get_results_log()
+
+    def get_queue_position(self, obj):
+        """Estimated number of submissions graded before this one while it waits for its team's turn."""
+        if obj.status != PENDING or not settings.GRADING_FAIR_SHARE_ENABLED:
+            return None
+        return FairShareDispatcher().position(obj.team_id, obj.id)
 
 class CreateSubmissionSerializer(serializers.ModelSerializer):
     team = serializers.UUIDField()
@@ -495,7 +524,10 @@ class ListProjectSubmissionsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Submission
-        exclude = ["execution_logs", "feedback","project"]
+        exclude = [
+            "execution_logs", "feedback", "project", "test_context", "recording", "trace_artifact",
+            "claimed_by", "claimed_at", "heartbeat_at", "priority_lane",
+        ]
 
     def get_task(self, obj):
         """Return task id, order, name  and slug for the submission."""
@@ -504,6 +536,7 @@ class ListProjectSubmissionsSerializer(serializers.ModelSerializer):
                 "id": obj.task.id,
                 "name": obj.task.name,
                 "order": obj.task.order,
+                "total_points": obj.task.cumulative_points,
             }
         return None
 
@@ -513,11 +546,26 @@ class ListProjectSubmissionsSerializer(serializers.ModelSerializer):
 class ApiTestCaseSeedSerializer(serializers.Serializer):
     endpoint_id = serializers.CharField(max_length=255)
     path_params = serializers.JSONField(required=False, allow_null=True)
+    query_params = serializers.JSONField(required=False, allow_null=True)
     request_payload = serializers.JSONField(required=False, allow_null=True)
     request_headers = serializers.JSONField(required=False, allow_null=True)
     expected_status_code = serializers.IntegerField(min_value=100, max_value=599)
     expected_response_schema = serializers.JSONField(required=False, allow_null=True)
 
+    def validate_path_params(self, value):
+        for param_value in (value or {}).values():
+            if isinstance(param_value, str) and '{{' in param_value and not CONTEXT_REFERENCE_PATTERN.search(param_value):
+                raise serializers.ValidationError(f"Invalid context variable format '{param_value}'.")
+        return value
+
+    def validate_expected_response_schema(self, value):
+        if value:
+            try:
+                check_schema(value)
+            except jsonschema.exceptions.SchemaError as e:
+                raise serializers.ValidationError(f"Invalid JSON schema: {e.message}")
+        return value
+
 
 class TestCaseSeedSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=255)
@@ -0,0 +1,241 @@
+import asyncio
+import time
+from typing import List
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from projects.models import Submission, TestCase, TestType, FAILED
+from projects.services.grading_http_client import AsyncHostClientPool
+from projects.services import submission_events
+from projects.services.grading_response import GradingResponse
+from projects.services.submissions_services import SubmissionTestRunnerService
+from projects.services.test_dependency_planner import PlannedTestCase
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncSubmissionTestRunnerService(SubmissionTestRunnerService):
+    """
+    Runs the test suite of a submission on an event loop.
+    Keeps the result semantics of SubmissionTestRunnerService (context propagation,
+    stop_on_failure, points and the execution_logs shape) while the HTTP calls are
+    awaited, so many submissions can share one worker process. Redis calls (circuit
+    breaker, event stream) run in the thread pool, so a slow Redis does not stall the
+    other suites on the loop. Runs are not checkpointed: the async engine does not retry them.
+    """
+
+    CHECKPOINTS = False
+
+    def __init__(self, submission_id: int, client_pool: AsyncHostClientPool, persist: bool = True):
+        super().__init__(submission_id, persist=persist)
+        self.client_pool = client_pool
+        # Results logged on the loop, published to the event stream from a worker thread.
+        self._unpublished_results = []
+
+    async def run_async(self) -> str:
+        """Async counterpart of `run`. Database access is delegated to a worker thread."""
+        await sync_to_async(self._setup)()
+        await self._warm_up_async()
+        await self._execute_test_suite_async()
+        await self._publish_results_async()
+        await sync_to_async(self._finalize_submission)()
+        await sync_to_async(self._mark_project_as_finished)()
+        return self._get_status_message()
+
+    async def _warm_up_async(self):
+        """Async counterpart of `_warm_up`."""
+        window_end = await sync_to_async(self._warmup_window_end)()
+        if window_end is None:
+            return
+        started = time.monotonic()
+        delay = settings.GRADING_WARMUP_INITIAL_BACKOFF_SECONDS
+        attempts, succeeded = 0, False
+        while time.monotonic() < window_end:
+            attempts += 1
+            try:
+                client = await self.client_pool.client_for(self.base_url)
+                async with client.stream('GET', f"{self.base_url}/", timeout=window_end - time.monotonic()) as response:
+                    succeeded = response.status_code not in self.WARMUP_RETRY_STATUS_CODES
+            except httpx.TimeoutException:
+                succeeded = False
+            except httpx.HTTPError:
+                break
+            if succeeded or time.monotonic() + delay >= window_end:
+                break
+            await asyncio.sleep(delay)
+            delay *= 2
+        self._record_warmup(started, attempts, succeeded)
+
+    @staticmethod
+    async def _off_loop(func, *args):
+        """Runs a blocking Redis call in the thread pool instead of on the event loop."""
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+
+    def _append_result(self, entry: dict):
+        self.full_results_log.append(entry)
+        self._unpublished_results.append(entry)
+
+    async def _publish_results_async(self):
+        """Streams the results logged since the last call to clients watching the run."""
+        entries, self._unpublished_results = self._unpublished_results, []
+        if entries:
+            await self._off_loop(self._publish_results, entries)
+
+    def _publish_results(self, entries: List[dict]):
+        for entry in entries:
+            self.events.publish(submission_events.RESULT, entry)
+
+    async def _execute_test_suite_async(self):
+        """Iterates through tasks and their test cases."""
+        self._log_reused_results()
+        if self._uses_dependency_scheduling():
+            await self._execute_planned_suite_async()
+            return
+
+        for task, test_cases in self.task_test_cases:
+            await self._run_tests_for_task_async(task, test_cases)
+            if self.is_submission_failed:
+                self.failed_task_name = task.name
+                break
+
+    async def _run_tests_for_task_async(self, task, test_cases: List[TestCase]):
+        """Runs all test cases for a single task."""
+        for i, test_case in enumerate(test_cases):
+            passed, feedback = await self._run_single_test_case_async(test_case, self.test_context, self.test_context)
+            proceed = self._record_test_outcome(task, test_cases, i, passed, feedback)
+            await self._publish_results_async()
+            if not proceed:
+                break
+
+    async def _execute_planned_suite_async(self):
+        """
+        Runs the test cases along their dependency graph, so independent branches
+        overlap, then reports the results in canonical order.
+        """
+        planned = self._plan_suite()
+        semaphore = asyncio.Semaphore(settings.GRADING_MAX_PARALLEL_TESTS_PER_SUBMISSION)
+        runs, outcomes = {}, {}
+        for node in planned:
+            runs[node.index] = asyncio.create_task(self._run_planned_test_case(node, runs, outcomes, semaphore))
+        await asyncio.gather(*runs.values())
+
+        self._report_planned_outcomes(planned, outcomes)
+
+    async def _run_planned_test_case(self, node: PlannedTestCase, runs: dict, outcomes: dict, semaphore: asyncio.Semaphore):
+        await asyncio.gather(*(runs[index] for index in node.dependencies))
+        # A failure upstream already decided that this result would never be reported.
+        if node.index >= self._cutoff:
+            return
+
+        context = self._planned_context(node, outcomes)
+        produced = {}
+        async with semaphore:
+            passed, feedback = await self._run_single_test_case_async(node.test_case, context, produced)
+        self._record_planned_outcome(node, outcomes, passed, feedback, produced)
+
+    async def _run_single_test_case_async(self, test_case: TestCase, context: dict, produced: dict) -> (bool, str):
+        """
+        Executes one test case and returns the result.
+        The request is resolved against `context`; values saved from the response go to `produced`.
+        """
+        try:
+            if test_case.test_type == TestType.API_REQUEST:
+                return await self._run_api_test_async(test_case, self.base_url, context, produced)
+            return False, f"Test type '{test_case.test_type}' is not supported."
+        except Exception as e:
+            logger.error(f"Critical error on test case {test_case.id} for submission {self.submission_id}: {e}", exc_info=True)
+            return False, f"A critical error occurred: {str(e)}"
+
+    async def _run_api_test_async(self, test_case: TestCase, base_url: str, context: dict, produced: dict) -> (bool, str):
+        """Builds the request for an API test case, awaits it and evaluates the response."""
+        timeout = self._request_timeout()
+        if timeout is None:
+            return False, self._budget_exhausted_feedback()
+        diagnosis = await self._off_loop(self.breaker.open_diagnosis)
+        if diagnosis:
+            return False, self._not_run_feedback(diagnosis)
+
+        request_kwargs, error = self._build_request(test_case, base_url, context)
+        if error:
+            return False, error
+
+        started = time.monotonic()
+        try:
+            client = await self.client_pool.client_for(request_kwargs['url'])
+            async with client.stream(**request_kwargs, timeout=timeout) as streamed:
+                response = await GradingResponse.read_async(
+                    streamed, settings.GRADING_MAX_RESPONSE_BYTES, started + timeout, self.response_budget,
+                )
+        except httpx.HTTPError as e:
+            self._record_exchange(test_case, started, error=e)
+            if self._is_host_failure(isinstance(e, httpx.NetworkError), isinstance(e, httpx.TimeoutException), timeout):
+                await self._off_loop(self.breaker.record_failure, str(e) or type(e).__name__)
+            return False, f"Failed to connect to API at {request_kwargs['url']}. Error: {e}"
+        self._record_exchange(test_case, started, response)
+        await self._off_loop(self.breaker.record_success)
+
+        return self._evaluate_response(test_case, response, produced)
+
+
+class AsyncGradingEngine:
+    """
+    Drives many submissions concurrently on a single event loop.
+    The number of suites in flight is bounded by GRADING_ASYNC_MAX_CONCURRENCY.
+    """
+
+    def __init__(self, max_concurrency: int = None, persist: bool = True, lease=None):
+        self.max_concurrency = max_concurrency or settings.GRADING_ASYNC_MAX_CONCURRENCY
+        # When False, results are left on the runners' submissions for the caller to bulk-write.
+        self.persist = persist
+        # The SubmissionLeaseService holding the claims on the submissions; kept alive while they run.
+        self.lease = lease
+        self.completed_runners = []
+
+    def run(self, submission_ids: List[int]) -> List[str]:
+        """Grades the given submissions and returns one status message per submission."""
+        return asyncio.run(self._run_all(submission_ids))
+
+    async def _run_all(self, submission_ids: List[int]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        heartbeats = asyncio.create_task(self._send_heartbeats(submission_ids)) if self.lease else None
+        try:
+            async with AsyncHostClientPool() as client_pool:
+                return await asyncio.gather(
+                    *(self._run_one(submission_id, client_pool, semaphore) for submission_id in submission_ids)
+                )
+        finally:
+            if heartbeats:
+                heartbeats.cancel()
+            await sync_to_async(close_old_connections)()
+
+    async def _send_heartbeats(self, submission_ids: List[int]):
+        """Extends the leases of the submissions until the run is over; finished ones are no longer running."""
+        while True:
+            await asyncio.sleep(settings.GRADING_HEARTBEAT_SECONDS)
+            try:
+                await sync_to_async(self.lease.heartbeat)(submission_ids)
+            except Exception as e:
+                logger.warning(f"Could not send grading heartbeats: {e}")
+
+    async def _run_one(self, submission_id: int, client_pool: AsyncHostClientPool, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            try:
+                runner = AsyncSubmissionTestRunnerService(submission_id, client_pool, persist=self.persist)
+                message = await runner.run_async()
+                self.completed_runners.append(runner)
+                return message
+            except Submission.DoesNotExist:
+                logger.warning(f"Submission with id {submission_id} does not exist.")
+                return f"Submission {submission_id} does not exist."
+            except Exception as e:
+                logger.error(f"An unexpected error occurred for submission_id {submission_id}: {e}", exc_info=True)
+                await sync_to_async(self._mark_as_failed)(submission_id)
+                return f"Submission {submission_id} failed with an internal error."
+
+    @staticmethod
+    def _mark_as_failed(submission_id: int):
+        Submission.objects.filter(id=submission_id).update(status=FAILED)
@@ -0,0 +1,96 @@
+from typing import List
+
+from django.conf import settings
+from django.db import transaction
+
+from projects.models import Submission
+from projects.services.async_submission_runner import AsyncGradingEngine
+from projects.services.submission_lease_service import SubmissionLeaseService
+from projects.services.submissions_services import SubmissionTestRunnerService
+from projects.services.test_plan_service import TestPlanService
+from projects.tasks import run_pending_submissions_batch
+from utils.logging_utils import get_logger
+from utils.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+# Set while a batch is queued and has not started yet.
+SCHEDULED_KEY = 'grading:batch-scheduled'
+
+
+class BatchGradingService:
+    """
+    Grades many pending submissions in one worker: claims up to `batch_size` of them,
+    groups them by project so each compiled plan is loaded once, runs them concurrently
+    on the async engine and writes all results back with a single bulk update.
+    """
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.GRADING_BATCH_SIZE
+        self.lease = SubmissionLeaseService()
+
+    @staticmethod
+    def schedule():
+        """
+        Queues a batch for newly pending submissions unless one is already queued and has not
+        started, so a burst of submissions queues a single batch that claims them together;
+        the periodic batch picks up any beyond GRADING_BATCH_SIZE. The flag expires after
+        GRADING_BATCH_SCHEDULE_TTL_SECONDS in case that batch is lost. Without Redis, every
+        call queues a batch.
+        """
+        try:
+            if not get_redis().set(SCHEDULED_KEY, 1, nx=True, ex=settings.GRADING_BATCH_SCHEDULE_TTL_SECONDS):
+                return
+        except Exception as e:
+            logger.warning(f"Could not check for an already queued grading batch: {e}")
+        run_pending_submissions_batch.delay()
+
+    @staticmethod
+    def _clear_schedule():
+        """Lets the next submission queue a batch; this one claims only what is pending now."""
+        try:
+            get_redis().delete(SCHEDULED_KEY)
+        except Exception as e:
+            logger.warning(f"Could not clear the queued grading batch flag: {e}")
+
+    def run(self) -> str:
+        self._clear_schedule()
+        submission_ids = self.claim_pending_submissions()
+        if not submission_ids:
+            return "No pending submissions."
+
+        ordered_ids = self._group_by_project(submission_ids)
+        engine = AsyncGradingEngine(persist=False, lease=self.lease)
+        engine.run(ordered_ids)
+        self.write_results(engine.completed_runners)
+
+        logger.info(f"Batch graded {len(engine.completed_runners)} of {len(submission_ids)} claimed submissions.")
+        return f"Graded {len(engine.completed_runners)} submissions."
+
+    def claim_pending_submissions(self) -> List[int]:
+        """
+        Claims up to `batch_size` of the oldest pending submissions for this worker.
+        Rows locked by a concurrent batch are skipped rather than waited for.
+        """
+        return self.lease.claim_pending(self.batch_size)
+
+    @staticmethod
+    def _group_by_project(submission_ids: List[int]) -> List[int]:
+        """Orders the submissions by project and loads each needed plan once before the run starts."""
+        rows = sorted(
+            Submission.objects.filter(id__in=submission_ids).values_list('id', 'project_id', 'task__order'),
+            key=lambda row: (row[1], row[0]),
+        )
+        for project_id, task_order in {(row[1], row[2]) for row in rows}:
+            TestPlanService.get_plan(project_id, task_order)
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def write_results(runners: List[SubmissionTestRunnerService]):
+        runners = [runner for runner in runners if runner.submission is not None]
+        if runners:
+            with transaction.atomic():
+                Submission.objects.bulk_update([runner.submission for runner in runners], SubmissionTestRunnerService.RESULT_FIELDS)
+                SubmissionTestRunnerService.store_test_results(runners)
+        for runner in runners:
+            runner.publish_finished()
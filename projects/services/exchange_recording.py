@@ -0,0 +1,82 @@
+import base64
+import gzip
+import json
+from typing import Dict, List, Optional
+
+from projects.services.grading_response import GradingResponse
+
+
+class RecordedExchange:
+    """The outcome of one test case's HTTP request: the response as the grader read it, or the transport error."""
+
+    def __init__(self, test_case_id: int, duration_ms: int, status_code: int = None, content: bytes = b'',
+                 truncated: bool = False, limit: int = 0, encoding: str = None, error: str = None):
+        self.test_case_id = test_case_id
+        self.duration_ms = duration_ms
+        self.status_code = status_code
+        self.content = content
+        self.truncated = truncated
+        self.limit = limit
+        self.encoding = encoding
+        self.error = error
+
+    def response(self) -> GradingResponse:
+        return GradingResponse(self.status_code, self.content, self.truncated, self.limit, self.encoding)
+
+    def as_dict(self) -> dict:
+        if self.error is not None:
+            return {"test_case_id": self.test_case_id, "duration_ms": self.duration_ms, "error": self.error}
+        return {
+            "test_case_id": self.test_case_id, "duration_ms": self.duration_ms, "status_code": self.status_code,
+            "body": base64.b64encode(self.content).decode('ascii'), "truncated": self.truncated,
+            "limit": self.limit, "encoding": self.encoding,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RecordedExchange':
+        if 'error' in data:
+            return cls(data['test_case_id'], data['duration_ms'], error=data['error'])
+        return cls(
+            data['test_case_id'], data['duration_ms'], data['status_code'], base64.b64decode(data['body']),
+            data['truncated'], data['limit'], data['encoding'],
+        )
+
+
+class ExchangeRecording:
+    """
+    The HTTP exchanges of a submission run by test case id, stored as gzip-compressed JSON
+    so the run's assertions can later be re-evaluated without contacting the deployment.
+    """
+
+    def __init__(self, exchanges: Dict[int, RecordedExchange] = None):
+        self.exchanges = exchanges or {}
+
+    def record(self, test_case_id: int, duration_ms: int, response: GradingResponse = None, error: Exception = None):
+        if response is not None:
+            self.exchanges[test_case_id] = RecordedExchange(
+                test_case_id, duration_ms, response.status_code, response.content,
+                response.truncated, response.limit, response.encoding,
+            )
+        else:
+            self.exchanges[test_case_id] = RecordedExchange(test_case_id, duration_ms, error=str(error))
+
+    def get(self, test_case_id: int) -> Optional[RecordedExchange]:
+        return self.exchanges.get(test_case_id)
+
+    def __bool__(self):
+        return bool(self.exchanges)
+
+    def as_dicts(self) -> List[dict]:
+        return [exchange.as_dict() for exchange in self.exchanges.values()]
+
+    @classmethod
+    def from_dicts(cls, items: List[dict]) -> 'ExchangeRecording':
+        exchanges = [RecordedExchange.from_dict(item) for item in items]
+        return cls({exchange.test_case_id: exchange for exchange in exchanges})
+
+    def to_gzip(self) -> bytes:
+        return gzip.compress(json.dumps(self.as_dicts(), separators=(',', ':')).encode(), compresslevel=6)
+
+    @classmethod
+    def from_gzip(cls, data: bytes) -> 'ExchangeRecording':
+        return cls.from_dicts(json.loads(gzip.decompress(data)))
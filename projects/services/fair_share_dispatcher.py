@@ -0,0 +1,184 @@
+import time
+from typing import List, Optional
+
+from django.conf import settings
+
+from utils.logging_utils import get_logger
+from utils.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = 'grading:fair:'
+
+# KEYS: team heads. ARGV: prefix, team id, submission id, score.
+ENQUEUE_SCRIPT = """
+local queue_key = ARGV[1] .. 'waiting:' .. ARGV[2]
+redis.call('ZADD', queue_key, ARGV[4], ARGV[3])
+local head = redis.call('ZRANGE', queue_key, 0, 0, 'WITHSCORES')
+redis.call('ZADD', KEYS[1], head[2], ARGV[2])
+return 1
+"""
+
+# KEYS: team heads, in-flight set, owner hash.
+# ARGV: prefix, now, stale before, max in flight, max running per team.
+DISPATCH_SCRIPT = """
+local prefix, now, stale_before = ARGV[1], ARGV[2], ARGV[3]
+local max_in_flight, max_per_team = tonumber(ARGV[4]), tonumber(ARGV[5])
+for _, stale_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', stale_before)) do
+    local owner = redis.call('HGET', KEYS[3], stale_id)
+    if owner then
+        redis.call('ZREM', prefix .. 'running:' .. owner, stale_id)
+    end
+    redis.call('HDEL', KEYS[3], stale_id)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', stale_before)
+local in_flight = redis.call('ZCARD', KEYS[2])
+local rank = 0
+local dispatched = {}
+while in_flight < max_in_flight do
+    local head = redis.call('ZRANGE', KEYS[1], rank, rank)
+    if #head == 0 then
+        break
+    end
+    local team = head[1]
+    local queue_key = prefix .. 'waiting:' .. team
+    local running_key = prefix .. 'running:' .. team
+    redis.call('ZREMRANGEBYSCORE', running_key, '-inf', stale_before)
+    if redis.call('ZCARD', running_key) >= max_per_team then
+        rank = rank + 1
+    else
+        local popped = redis.call('ZPOPMIN', queue_key)
+        if #popped > 0 then
+            local submission_id = popped[1]
+            redis.call('ZADD', running_key, now, submission_id)
+            redis.call('ZADD', KEYS[2], now, submission_id)
+            redis.call('HSET', KEYS[3], submission_id, team)
+            table.insert(dispatched, submission_id)
+            in_flight = in_flight + 1
+        end
+        local next_head = redis.call('ZRANGE', queue_key, 0, 0, 'WITHSCORES')
+        if #next_head == 0 then
+            redis.call('ZREM', KEYS[1], team)
+        else
+            redis.call('ZADD', KEYS[1], next_head[2], team)
+        end
+    end
+end
+return dispatched
+"""
+
+# KEYS: in-flight set, owner hash. ARGV: prefix, submission id.
+RELEASE_SCRIPT = """
+local team = redis.call('HGET', KEYS[2], ARGV[2])
+if team then
+    redis.call('ZREM', ARGV[1] .. 'running:' .. team, ARGV[2])
+    redis.call('HDEL', KEYS[2], ARGV[2])
+end
+return redis.call('ZREM', KEYS[1], ARGV[2])
+"""
+
+
+class FairShareDispatcher:
+    """
+    Releases submissions to the grading queue fairly across teams. Each team has its own
+    virtual queue in Redis, ordered by GradingPriority.fair_share_scores: the priority a
+    submission has aged to, so premium and long-waiting submissions come first. Dispatching
+    takes the best head among the teams' queues, one at a time, skips teams that already
+    have GRADING_FAIR_SHARE_MAX_RUNNING_PER_TEAM submissions in flight and stops once
+    GRADING_FAIR_SHARE_MAX_IN_FLIGHT are queued or running overall, so a team's burst
+    never crowds out the others. Finished runs release their slot; slots held longer than
+    GRADING_FAIR_SHARE_STALE_SECONDS (a lost worker) are reclaimed. Scripts run atomically
+    in Redis, so any number of web and worker nodes may enqueue and dispatch at once.
+    """
+
+    def __init__(self):
+        self.heads_key = f"{KEY_PREFIX}heads"
+        self.in_flight_key = f"{KEY_PREFIX}in-flight"
+        self.owners_key = f"{KEY_PREFIX}owners"
+
+    def submit(self, team_id: int, submission_id: int) -> bool:
+        """
+        Adds a submission to its team's queue and dispatches what the limits allow.
+        Returns False when Redis is unavailable; the caller then queues the run directly.
+        """
+        from projects.services.grading_priority import GradingPriority
+
+        score = GradingPriority.fair_share_scores([submission_id]).get(submission_id, time.time())
+        try:
+            get_redis().eval(ENQUEUE_SCRIPT, 1, self.heads_key, KEY_PREFIX, team_id, submission_id, score)
+        except Exception as e:
+            logger.warning(f"Could not add submission {submission_id} to the fair-share queue: {e}")
+            return False
+        self.dispatch()
+        return True
+
+    def release(self, submission_id: int):
+        """Frees the slot of a finished run and dispatches the next submissions."""
+        try:
+            get_redis().eval(RELEASE_SCRIPT, 2, self.in_flight_key, self.owners_key, KEY_PREFIX, submission_id)
+        except Exception as e:
+            logger.warning(f"Could not release the fair-share slot of submission {submission_id}: {e}")
+            return
+        self.dispatch()
+
+    def dispatch(self) -> List[int]:
+        """Queues the submissions that may run now and returns their ids."""
+        from projects.services.grading_priority import GradingPriority
+        from projects.tasks import run_submission_tests
+
+        now = time.time()
+        try:
+            submission_ids = get_redis().eval(
+                DISPATCH_SCRIPT, 3, self.heads_key, self.in_flight_key, self.owners_key,
+                KEY_PREFIX, now, now - settings.GRADING_FAIR_SHARE_STALE_SECONDS,
+                settings.GRADING_FAIR_SHARE_MAX_IN_FLIGHT, settings.GRADING_FAIR_SHARE_MAX_RUNNING_PER_TEAM,
+            )
+        except Exception as e:
+            logger.warning(f"Could not dispatch the fair-share queue: {e}")
+            return []
+        submission_ids = [int(submission_id) for submission_id in submission_ids]
+        for submission_id, options in GradingPriority.queue_options(submission_ids).items():
+            run_submission_tests.apply_async((submission_id,), **options)
+        return submission_ids
+
+    def holds(self, team_id: int, submission_id: int) -> bool:
+        """
+        Whether the submission is waiting in its team's queue or was dispatched and has not
+        released its slot yet. False when Redis is unavailable.
+        """
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            pipeline.zscore(f"{KEY_PREFIX}waiting:{team_id}", submission_id)
+            pipeline.zscore(self.in_flight_key, submission_id)
+            score, dispatched_at = pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not look up submission {submission_id} in the fair-share queue: {e}")
+            return False
+        return score is not None or dispatched_at is not None
+
+    def position(self, team_id: int, submission_id: int) -> Optional[int]:
+        """
+        How many waiting submissions come before this one, or None if it is not waiting in
+        the fair-share queue (already dispatched, or never queued): those ahead of it in its
+        team's queue and those of the other teams with a better score. Per-team limits may
+        let it pass some of them.
+        """
+        queue_key = f"{KEY_PREFIX}waiting:{team_id}"
+        try:
+            redis = get_redis()
+            pipeline = redis.pipeline(transaction=False)
+            pipeline.zscore(queue_key, submission_id)
+            pipeline.zrank(queue_key, submission_id)
+            pipeline.zrange(self.heads_key, 0, -1)
+            score, index, teams = pipeline.execute()
+            if score is None:
+                return None
+            pipeline = redis.pipeline(transaction=False)
+            for team in teams:
+                if team != str(team_id):
+                    pipeline.zcount(f"{KEY_PREFIX}waiting:{team}", '-inf', f"({score}")
+            ahead = pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not read the fair-share queue position of submission {submission_id}: {e}")
+            return None
+        return index + sum(ahead)
@@ -0,0 +1,90 @@
+import json
+from typing import Optional
+
+from django.conf import settings
+
+from utils.logging_utils import get_logger
+from utils.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+
+class GradingCheckpoint:
+    """
+    The progress of a sequential submission run, saved in Redis after every test case so a
+    retried run resumes after the last completed test instead of starting over. Checkpoints
+    expire after GRADING_CHECKPOINT_TTL_SECONDS. Redis errors are logged and ignored: a run
+    without a checkpoint simply starts from the first test.
+
+    Recorded exchanges are appended to a list next to the state, so each save only sends
+    the newest response instead of every body recorded so far. The grading time the
+    attempts spent is added up next to them, so retries share the submission's time budget
+    without counting the time the run waited between attempts.
+    """
+
+    def __init__(self, submission_id: int):
+        self.submission_id = submission_id
+        self.key = f"grading:checkpoint:{submission_id}"
+        self.exchanges_key = f"grading:checkpoint-exchanges:{submission_id}"
+        self.spent_key = f"grading:checkpoint-spent:{submission_id}"
+
+    def spent_seconds(self) -> float:
+        """The grading time earlier attempts at the run spent, 0 for the first attempt."""
+        try:
+            return float(get_redis().get(self.spent_key) or 0)
+        except Exception as e:
+            logger.warning(f"Could not read the time spent on submission {self.submission_id}'s run: {e}")
+            return 0
+
+    def save(self, state: dict, exchange: dict = None, spent_seconds: float = 0):
+        """Saves the state, appends `exchange` and adds `spent_seconds` to the time spent on the run."""
+        try:
+            pipeline = get_redis().pipeline(transaction=True)
+            pipeline.set(self.key, json.dumps(state, default=str), ex=settings.GRADING_CHECKPOINT_TTL_SECONDS)
+            if exchange is not None:
+                pipeline.rpush(self.exchanges_key, json.dumps(exchange))
+            pipeline.expire(self.exchanges_key, settings.GRADING_CHECKPOINT_TTL_SECONDS)
+            pipeline.incrbyfloat(self.spent_key, spent_seconds)
+            pipeline.expire(self.spent_key, settings.GRADING_CHECKPOINT_TTL_SECONDS)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not save the checkpoint of submission {self.submission_id}: {e}")
+
+    def add_spent(self, spent_seconds: float):
+        """Adds `spent_seconds` to the time spent on the run without saving any progress."""
+        try:
+            pipeline = get_redis().pipeline(transaction=True)
+            pipeline.incrbyfloat(self.spent_key, spent_seconds)
+            pipeline.expire(self.spent_key, settings.GRADING_CHECKPOINT_TTL_SECONDS)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not record the time spent on submission {self.submission_id}'s run: {e}")
+
+    def load(self) -> Optional[dict]:
+        """The saved state with its exchanges under 'recording', or None when there is no checkpoint."""
+        try:
+            pipeline = get_redis().pipeline(transaction=True)
+            pipeline.get(self.key)
+            pipeline.lrange(self.exchanges_key, 0, -1)
+            data, exchanges = pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not load the checkpoint of submission {self.submission_id}: {e}")
+            return None
+        if not data:
+            return None
+        state = json.loads(data)
+        state['recording'] = [json.loads(exchange) for exchange in exchanges]
+        return state
+
+    def discard_progress(self):
+        """Drops the completed tests but keeps the time spent on them."""
+        try:
+            get_redis().delete(self.key, self.exchanges_key)
+        except Exception as e:
+            logger.warning(f"Could not clear the checkpoint of submission {self.submission_id}: {e}")
+
+    def clear(self):
+        try:
+            get_redis().delete(self.key, self.exchanges_key, self.spent_key)
+        except Exception as e:
+            logger.warning(f"Could not clear the checkpoint of submission {self.submission_id}: {e}")
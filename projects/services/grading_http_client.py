@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+def host_key(url: str) -> str:
+    """The scheme and network location a connection pool is keyed by, e.g. 'https://team.example.com'."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class HostSessionPool:
+    """
+    Keep-alive `requests` sessions keyed by deployment host, so consecutive test cases
+    against the same student API reuse their TCP/TLS connections and DNS lookups.
+
+    Each host keeps at most `pool_size_per_host` idle connections. Sessions unused for
+    `idle_timeout` seconds are closed, and the least recently used host is dropped once
+    `max_hosts` is reached. Connections are never shared across a fork: the pool resets
+    itself in the child process.
+    """
+
+    def __init__(self, pool_size_per_host: int = None, idle_timeout: float = None, max_hosts: int = None):
+        self.pool_size_per_host = pool_size_per_host or settings.GRADING_HTTP_POOL_SIZE_PER_HOST
+        self.idle_timeout = idle_timeout or settings.GRADING_HTTP_IDLE_TIMEOUT
+        self.max_hosts = max_hosts or settings.GRADING_HTTP_MAX_HOSTS
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._pid = os.getpid()
+
+    def session_for(self, url: str) -> requests.Session:
+        key = host_key(url)
+        now = time.monotonic()
+        with self._lock:
+            if self._pid != os.getpid():
+                self._forget_all()
+
+            entry = self._sessions.pop(key, None)
+            self._evict_idle(now)
+            session = entry[0] if entry else self._new_session()
+            self._sessions[key] = (session, now)
+
+            while len(self._sessions) > self.max_hosts:
+                _, (oldest, _) = self._sessions.popitem(last=False)
+                oldest.close()
+            return session
+
+    def close(self):
+        """Closes every pooled connection."""
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions = OrderedDict()
+
+    def reset_after_fork(self):
+        """
+        Drops the sessions inherited from the parent process without closing them,
+        so the parent's connections are left untouched.
+        """
+        self._lock = threading.Lock()
+        self._forget_all()
+
+    def _forget_all(self):
+        self._sessions = OrderedDict()
+        self._pid = os.getpid()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size_per_host, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _evict_idle(self, now: float):
+        expired = [key for key, (_, last_used) in self._sessions.items() if now - last_used > self.idle_timeout]
+        for key in expired:
+            session, _ = self._sessions.pop(key)
+            session.close()
+
+
+class AsyncHostClientPool:
+    """
+    The event-loop counterpart of HostSessionPool: one `httpx.AsyncClient` per deployment
+    host, each limited to `pool_size_per_host` connections with keep-alive expiry after
+    `idle_timeout` seconds. A pool belongs to the event loop it was created on.
+    """
+
+    def __init__(self, pool_size_per_host: int = None, idle_timeout: float = None, max_hosts: int = None,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.pool_size_per_host = pool_size_per_host or settings.GRADING_HTTP_POOL_SIZE_PER_HOST
+        self.idle_timeout = idle_timeout or settings.GRADING_HTTP_IDLE_TIMEOUT
+        self.max_hosts = max_hosts or settings.GRADING_HTTP_MAX_HOSTS
+        self.transport = transport
+        self._clients = OrderedDict()
+        # Clients pushed out by max_hosts may still have requests in flight; close them with the pool.
+        self._retired = []
+
+    async def client_for(self, url: str) -> httpx.AsyncClient:
+        """Returns the client of the URL's host, creating it on first use."""
+        key = host_key(url)
+        client = self._clients.pop(key, None)
+        if client is None:
+            client = httpx.AsyncClient(
+                follow_redirects=False,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size_per_host,
+                    max_keepalive_connections=self.pool_size_per_host,
+                    keepalive_expiry=self.idle_timeout,
+                ),
+            )
+        self._clients[key] = client
+
+        while len(self._clients) > self.max_hosts:
+            _, oldest = self._clients.popitem(last=False)
+            self._retired.append(oldest)
+        return client
+
+    async def aclose(self):
+        clients = list(self._clients.values()) + self._retired
+        self._clients, self._retired = OrderedDict(), []
+        for client in clients:
+            await client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_session_pool = None
+
+
+def get_session_pool() -> HostSessionPool:
+    """The session pool of the current worker process."""
+    global _session_pool
+    if _session_pool is None:
+        _session_pool = HostSessionPool()
+    return _session_pool
+
+
+def reset_session_pool_after_fork():
+    if _session_pool is not None:
+        _session_pool.reset_after_fork()
+
+
+# Celery's prefork pool forks after Django is loaded; never reuse the parent's sockets.
+os.register_at_fork(after_in_child=reset_session_pool_after_fork)
@@ -0,0 +1,54 @@
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from django.db.models import DurationField, ExpressionWrapper, F
+
+from projects.models import Submission, PASSED, FAILED
+from projects.services.grading_priority import LANES
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class GradingLaneMetricsService:
+    """
+    Queue wait (created until a worker claimed the run) and turnaround (created until the
+    result was written) per priority lane, to check the premium lane's latency target
+    and that the standard lane is not starved.
+    """
+
+    @staticmethod
+    def summarize(since: datetime) -> Dict[str, dict]:
+        rows = (
+            Submission.objects.filter(created_at__gte=since, status__in=[PASSED, FAILED], completed_at__isnull=False)
+            .exclude(priority_lane='')
+            .annotate(
+                queue_wait=ExpressionWrapper(F('claimed_at') - F('created_at'), output_field=DurationField()),
+                turnaround=ExpressionWrapper(F('completed_at') - F('created_at'), output_field=DurationField()),
+            )
+            .values_list('priority_lane', 'queue_wait', 'turnaround')
+        )
+        waits, turnarounds = {lane: [] for lane in LANES}, {lane: [] for lane in LANES}
+        for lane, queue_wait, turnaround in rows:
+            if lane not in waits:
+                continue
+            if queue_wait is not None:
+                waits[lane].append(queue_wait.total_seconds())
+            turnarounds[lane].append(turnaround.total_seconds())
+
+        summary = {}
+        for lane in LANES:
+            lane_waits, lane_turnarounds = sorted(waits[lane]), sorted(turnarounds[lane])
+            summary[lane] = {
+                "count": len(lane_turnarounds),
+                "queue_wait_p50": percentile(lane_waits, 0.5),
+                "queue_wait_p95": percentile(lane_waits, 0.95),
+                "turnaround_p50": percentile(lane_turnarounds, 0.5),
+                "turnaround_p95": percentile(lane_turnarounds, 0.95),
+            }
+        return summary
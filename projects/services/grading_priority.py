@@ -0,0 +1,151 @@
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from projects.models import Submission, PENDING
+from utils.logging_utils import get_logger
+from utils.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+PREMIUM = 'premium'
+STANDARD = 'standard'
+LANES = [PREMIUM, STANDARD]
+
+HIGHEST_PRIORITY = 0
+LOWEST_PRIORITY = 9
+
+# Hash of submission id -> priority its latest queued run was sent with, while it waits.
+WAITING_KEY = 'grading:priority:waiting'
+
+
+class GradingPriority:
+    """
+    Computes the broker priority of submission runs, 0 (first) to 9 (last), as the Redis
+    transport orders them. Premium submissions (the submitting user or the team owner is
+    premium) start in the premium lane at GRADING_PRIORITY_PREMIUM, others at
+    GRADING_PRIORITY_STANDARD. Later tasks move up one step per task order, up to
+    GRADING_PRIORITY_MAX_TASK_BOOST, and every GRADING_PRIORITY_AGING_SECONDS a submission
+    has waited moves it up one more step.
+
+    Submissions waiting in the fair-share queues are ordered by `fair_share_scores`, which
+    follow the aged priority, so aging applies where the backlog waits. A message already
+    in the broker keeps the priority it was sent with, so `reprioritize_waiting` queues a
+    standard run once more when it has aged into the premium lane; a standard run therefore
+    never starves however many premium runs arrive. Whichever copy a worker takes first
+    claims the submission and the other is skipped.
+    """
+
+    @staticmethod
+    def compute(is_premium: bool, task_order: int, age_seconds: float) -> int:
+        priority = settings.GRADING_PRIORITY_PREMIUM if is_premium else settings.GRADING_PRIORITY_STANDARD
+        priority -= min(task_order, settings.GRADING_PRIORITY_MAX_TASK_BOOST)
+        priority -= int(max(age_seconds, 0) // settings.GRADING_PRIORITY_AGING_SECONDS)
+        return max(HIGHEST_PRIORITY, min(LOWEST_PRIORITY, priority))
+
+    @staticmethod
+    def _rows(submissions):
+        """(id, is_premium, task order, created_at) of each submission of the queryset."""
+        rows = submissions.values_list(
+            'id', 'user__is_premium', 'team__owner__is_premium', 'task__order', 'created_at',
+        )
+        for submission_id, user_is_premium, owner_is_premium, task_order, created_at in rows:
+            yield submission_id, bool(user_is_premium or owner_is_premium), task_order, created_at
+
+    @classmethod
+    def _compute_for(cls, submissions) -> Tuple[Dict[int, int], Dict[str, List[int]]]:
+        """The current priority of each submission of the queryset and the ids in each lane."""
+        now = timezone.now()
+        priorities, ids_by_lane = {}, {lane: [] for lane in LANES}
+        for submission_id, is_premium, task_order, created_at in cls._rows(submissions):
+            ids_by_lane[PREMIUM if is_premium else STANDARD].append(submission_id)
+            priorities[submission_id] = cls.compute(is_premium, task_order, (now - created_at).total_seconds())
+        return priorities, ids_by_lane
+
+    @classmethod
+    def fair_share_scores(cls, submission_ids: List[int]) -> Dict[int, float]:
+        """
+        Scores that order waiting submissions by the priority they have aged to, lowest
+        first. A step of priority is worth GRADING_PRIORITY_AGING_SECONDS of waiting, so
+        `priority * aging + created` keeps the same order however long they wait. Without
+        priority lanes, submissions are ordered by age.
+        """
+        scores = {}
+        submissions = Submission.objects.filter(id__in=submission_ids)
+        for submission_id, is_premium, task_order, created_at in cls._rows(submissions):
+            scores[submission_id] = created_at.timestamp()
+            if settings.GRADING_PRIORITY_ENABLED:
+                scores[submission_id] += cls.compute(is_premium, task_order, 0) * settings.GRADING_PRIORITY_AGING_SECONDS
+        return scores
+
+    @classmethod
+    def assign(cls, submission_ids: List[int]) -> Dict[int, int]:
+        """
+        Stores the lane of each submission and returns the priority it should be queued
+        with now. Lanes are written with one update per lane.
+        """
+        priorities, ids_by_lane = cls._compute_for(Submission.objects.filter(id__in=submission_ids))
+        for lane, lane_ids in ids_by_lane.items():
+            if lane_ids:
+                Submission.objects.filter(id__in=lane_ids).update(priority_lane=lane)
+        return priorities
+
+    @classmethod
+    def queue_options(cls, submission_ids: List[int]) -> Dict[int, dict]:
+        """The apply_async options of each submission's run, in the order of `submission_ids`."""
+        if not settings.GRADING_PRIORITY_ENABLED:
+            return {submission_id: {} for submission_id in submission_ids}
+        priorities = cls.assign(submission_ids)
+        cls._remember_waiting(priorities)
+        return {
+            submission_id: {'priority': priorities[submission_id]}
+            for submission_id in submission_ids if submission_id in priorities
+        }
+
+    @classmethod
+    def reprioritize_waiting(cls) -> List[int]:
+        """
+        Queues again, once, the waiting runs queued below the premium lane that have aged
+        into it, and forgets the runs that are no longer pending. Runs already queued at
+        that priority are skipped, so each run has at most one extra message. Returns the
+        ids queued.
+        """
+        from projects.tasks import run_submission_tests
+
+        try:
+            waiting = {int(key): int(value) for key, value in get_redis().hgetall(WAITING_KEY).items()}
+        except Exception as e:
+            logger.warning(f"Could not read the waiting grading runs: {e}")
+            return []
+        if not waiting:
+            return []
+
+        priorities, _ = cls._compute_for(Submission.objects.filter(id__in=list(waiting), status=PENDING))
+        promoted = {
+            submission_id: priority for submission_id, priority in priorities.items()
+            if priority <= settings.GRADING_PRIORITY_PREMIUM < waiting[submission_id]
+        }
+        for submission_id, priority in promoted.items():
+            run_submission_tests.apply_async((submission_id,), priority=priority)
+
+        gone = [submission_id for submission_id in waiting if submission_id not in priorities]
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            if gone:
+                pipeline.hdel(WAITING_KEY, *gone)
+            if promoted:
+                pipeline.hset(WAITING_KEY, mapping=promoted)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not update the waiting grading runs: {e}")
+        return list(promoted)
+
+    @staticmethod
+    def _remember_waiting(priorities: Dict[int, int]):
+        if not priorities:
+            return
+        try:
+            get_redis().hset(WAITING_KEY, mapping=priorities)
+        except Exception as e:
+            logger.warning(f"Could not record the priority of queued grading runs: {e}")
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from typing import Any, Iterator
+
+import httpx
+import requests
+from django.conf import settings
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseByteBudget:
+    """
+    The bytes a submission may still read across all its response bodies. Reads draw
+    from it chunk by chunk as bodies arrive, so concurrent reads of one submission
+    together never go past it.
+    """
+
+    def __init__(self, remaining: int):
+        self.remaining = max(remaining, 0)
+        self._lock = threading.Lock()
+
+    def take(self, size: int) -> int:
+        """Takes up to `size` bytes and returns how many were granted."""
+        with self._lock:
+            granted = min(size, self.remaining)
+            self.remaining -= granted
+            return granted
+
+
+class GradingResponse:
+    """
+    A student API response with its body read up to a byte limit.
+    Bodies over the limit are cut off and flagged as truncated, so a runaway endpoint
+    can never make a worker hold more than the limit in memory. Reading stops with a
+    read timeout once `deadline` (a time.monotonic() value) has passed, so a body that
+    trickles in cannot outlive its request timeout by more than one network read.
+    With a `budget`, the body is also cut off where the submission's budget runs out.
+    """
+
+    def __init__(self, status_code: int, content: bytes, truncated: bool, limit: int, encoding: str = None):
+        self.status_code = status_code
+        self.content = content
+        self.truncated = truncated
+        self.limit = limit
+        self.encoding = encoding or 'utf-8'
+
+    @classmethod
+    def read(cls, response: requests.Response, limit: int, deadline: float = None,
+             budget: ResponseByteBudget = None) -> 'GradingResponse':
+        """Reads a `requests` response sent with `stream=True`, then releases its connection."""
+        try:
+            content, truncated = bytearray(), False
+            for chunk in cls._iter_available(response):
+                limit = cls._limit_within_budget(limit, len(content), len(chunk), budget)
+                content += chunk
+                if len(content) > limit:
+                    truncated = True
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    raise requests.exceptions.ReadTimeout("The response body was not received within the timeout.")
+        finally:
+            response.close()
+        return cls(response.status_code, bytes(content[:limit]), truncated, limit, response.encoding)
+
+    @staticmethod
+    def _iter_available(response: requests.Response) -> Iterator[bytes]:
+        """
+        Yields the body as it arrives. Unlike iter_content, which waits for whole chunks,
+        every read returns what the socket has, so the deadline is checked between reads
+        of a slow body. urllib3 errors are raised as the requests errors iter_content uses.
+        """
+        while True:
+            try:
+                chunk = response.raw.read1(CHUNK_SIZE, decode_content=True)
+            except ReadTimeoutError as e:
+                raise requests.exceptions.ReadTimeout(e)
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except DecodeError as e:
+                raise requests.exceptions.ContentDecodingError(e)
+            if not chunk:
+                return
+            yield chunk
+
+    @classmethod
+    async def read_async(cls, response: httpx.Response, limit: int, deadline: float = None,
+                         budget: ResponseByteBudget = None) -> 'GradingResponse':
+        """Reads a streamed `httpx` response; the caller's `stream()` block closes it."""
+        content, truncated = bytearray(), False
+        async for chunk in response.aiter_bytes():
+            limit = cls._limit_within_budget(limit, len(content), len(chunk), budget)
+            content += chunk
+            if len(content) > limit:
+                truncated = True
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                raise httpx.ReadTimeout("The response body was not received within the timeout.", request=response.request)
+        return cls(response.status_code, bytes(content[:limit]), truncated, limit, response.encoding)
+
+    @staticmethod
+    def _limit_within_budget(limit: int, read: int, chunk_size: int, budget: ResponseByteBudget = None) -> int:
+        """Takes the part of a new chunk that will be kept from the budget; the limit drops to what it granted."""
+        if budget is None:
+            return limit
+        wanted = max(min(chunk_size, limit - read), 0)
+        granted = budget.take(wanted)
+        return read + granted if granted < wanted else limit
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    @property
+    def truncation_message(self) -> str:
+        return f"Response truncated: the body is larger than the {self.limit} bytes the grader reads."
+
+    def snippet(self) -> str:
+        """The start of the body, short enough to be quoted in feedback."""
+        return truncate_text(self.text, suffix=' ... (truncated)' if self.truncated else '')
+
+
+def truncate_text(text: str, suffix: str = '') -> str:
+    limit = settings.GRADING_FEEDBACK_SNIPPET_CHARS
+    if len(text) > limit:
+        return text[:limit] + ' ... (truncated)'
+    return text + suffix
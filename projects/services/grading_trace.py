@@ -0,0 +1,42 @@
+import gzip
+import json
+import time
+from typing import Any
+
+from django.conf import settings
+
+
+class GradingTrace:
+    """
+    The debug trace of one submission run, kept in memory: resolved requests, responses
+    and outcomes, in the order they happened. Entries hold raw values and are only
+    formatted when the trace is persisted, so tracing costs next to nothing on runs whose
+    trace is thrown away. At most GRADING_TRACE_MAX_ENTRIES entries are kept.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.dropped = 0
+        self._started = time.monotonic()
+
+    def add(self, event: str, **fields: Any):
+        if len(self.entries) >= settings.GRADING_TRACE_MAX_ENTRIES:
+            self.dropped += 1
+            return
+        self.entries.append((time.monotonic() - self._started, event, fields))
+
+    def to_gzip(self) -> bytes:
+        """The trace as gzip-compressed JSON lines."""
+        lines = [
+            json.dumps({"t_ms": int(elapsed * 1000), "event": event, **fields}, default=_json_default)
+            for elapsed, event, fields in self.entries
+        ]
+        if self.dropped:
+            lines.append(json.dumps({"event": "trace_truncated", "dropped_entries": self.dropped}))
+        return gzip.compress('\n'.join(lines).encode(), compresslevel=6)
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return value[:settings.GRADING_TRACE_BODY_BYTES].decode('utf-8', errors='replace')
+    return str(value)
@@ -0,0 +1,70 @@
+from typing import Optional
+
+from django.conf import settings
+
+from projects.services.grading_http_client import host_key
+from utils.logging_utils import get_logger
+from utils.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+
+class HostCircuitBreaker:
+    """
+    Fails fast on a deployment host that keeps failing at the connection level (DNS,
+    refused connections, TLS errors, timeouts).
+
+    Consecutive failures are counted in Redis, so every worker grading against the same
+    host contributes. Once GRADING_BREAKER_FAILURE_THRESHOLD is reached the breaker opens
+    for GRADING_BREAKER_OPEN_SECONDS with a diagnosis, and every test that has not started
+    yet, in this run or a parallel one, is reported as not run instead of waiting for its
+    own timeout. Without Redis the breaker still works within a single run.
+    """
+
+    def __init__(self, url: str, failure_threshold: int = None, open_seconds: int = None):
+        self.host = host_key(url)
+        self.failure_threshold = failure_threshold or settings.GRADING_BREAKER_FAILURE_THRESHOLD
+        self.open_seconds = open_seconds or settings.GRADING_BREAKER_OPEN_SECONDS
+        self.consecutive_failures = 0
+        self.diagnosis = None
+        self._failures_key = f"grading:breaker-failures:{self.host}"
+        self._open_key = f"grading:breaker-open:{self.host}"
+
+    def open_diagnosis(self) -> Optional[str]:
+        """Why the host is considered down, or None while requests may still be sent."""
+        if self.diagnosis is None:
+            try:
+                self.diagnosis = get_redis().get(self._open_key)
+            except Exception as e:
+                logger.warning(f"Could not read the circuit breaker of {self.host}: {e}")
+        return self.diagnosis
+
+    def record_failure(self, error: str):
+        self.consecutive_failures += 1
+        failures = self.consecutive_failures
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            pipeline.incr(self._failures_key)
+            pipeline.expire(self._failures_key, self.open_seconds)
+            failures = max(pipeline.execute()[0], failures)
+        except Exception as e:
+            logger.warning(f"Could not record a connection failure of {self.host}: {e}")
+
+        if failures >= self.failure_threshold and self.diagnosis is None:
+            self.diagnosis = (
+                f"the deployment at {self.host} is unreachable after {failures} consecutive "
+                f"connection failures (last error: {error})"
+            )
+            logger.info(f"Circuit breaker opened for {self.host}.")
+            try:
+                get_redis().set(self._open_key, self.diagnosis, ex=self.open_seconds)
+            except Exception as e:
+                logger.warning(f"Could not open the circuit breaker of {self.host}: {e}")
+
+    def record_success(self):
+        """Resets the failure streak, including failures counted by other runs against the host."""
+        self.consecutive_failures = 0
+        try:
+            get_redis().delete(self._failures_key)
+        except Exception as e:
+            logger.warning(f"Could not reset the circuit breaker of {self.host}: {e}")
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from projects.models import Submission, PASSED
+from projects.services.test_plan_service import CompiledTestPlan
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class ReusableResults:
+    """Per-test results of earlier tasks, taken from a prior passing submission."""
+
+    def __init__(self, source: Submission, results_by_task: Dict[int, List[dict]], context: dict):
+        self.source = source
+        self.results_by_task = results_by_task
+        self.context = context
+
+    def entries_for(self, task_id: int) -> List[dict]:
+        """
+        The prior log entries of a task, marked as reused from the submission that ran them.
+        Entries the source had itself reused keep their original submission, whose recording
+        holds the exchange, and their feedback is prefixed only once.
+        """
+        entries = []
+        for entry in self.results_by_task[task_id]:
+            feedback, origin = entry['feedback'], entry.get('reused_from_submission')
+            if origin is None:
+                origin = self.source.id
+            else:
+                feedback = feedback.removeprefix(reused_feedback_prefix(origin))
+            entries.append({
+                **entry,
+                "reused_from_submission": origin,
+                "feedback": f"{reused_feedback_prefix(origin)}{feedback}",
+            })
+        return entries
+
+
+def reused_feedback_prefix(submission_id: int) -> str:
+    return f"Reused from submission {submission_id}: "
+
+
+class IncrementalGradingService:
+    """
+    Finds the results a submission can reuse instead of re-running, for projects with
+    `incremental_grading` enabled.
+
+    The source is the team's most recent passing submission of an earlier task of the
+    same project, to the same deployment URL, completed within GRADING_INCREMENTAL_TTL_MINUTES.
+    Tasks are reused from the first one onwards for as long as their prior results cover
+    exactly the test cases of the current plan; the rest are run again, starting from the
+    context the source submission ended with.
+    """
+
+    def __init__(self, submission: Submission, plan: CompiledTestPlan):
+        self.submission = submission
+        self.plan = plan
+
+    def find_reusable_results(self) -> Optional[ReusableResults]:
+        if not self.submission.task.project.incremental_grading:
+            return None
+
+        source = self._find_source_submission()
+        if source is None or source.test_context is None:
+            return None
+
+        prior_results = {}
+        for entry in source.get_results_log():
+            prior_results.setdefault(entry['task_id'], []).append(entry)
+
+        results_by_task = {}
+        for task, test_cases in self.plan.task_test_cases:
+            if task.order > source.task.order:
+                break
+            entries = prior_results.get(task.id, [])
+            if [entry['test_case_id'] for entry in entries] != [test_case.id for test_case in test_cases]:
+                break
+            if not all(entry['passed'] for entry in entries):
+                break
+            results_by_task[task.id] = entries
+
+        if not results_by_task:
+            return None
+
+        logger.info(
+            f"Submission {self.submission.id} reuses {len(results_by_task)} task(s) from submission {source.id}."
+        )
+        return ReusableResults(source, results_by_task, source.test_context)
+
+    def _find_source_submission(self) -> Optional[Submission]:
+        fresh_after = timezone.now() - timedelta(minutes=settings.GRADING_INCREMENTAL_TTL_MINUTES)
+        return (
+            Submission.objects
+            .filter(
+                team_id=self.submission.team_id,
+                project_id=self.submission.project_id,
+                status=PASSED,
+                deployment_url=self.submission.deployment_url,
+                completed_at__gte=fresh_after,
+                task__order__lt=self.submission.task.order,
+            )
+            .exclude(pk=self.submission.pk)
+            .select_related('task')
+            .order_by('-completed_at')
+            .first()
+        )
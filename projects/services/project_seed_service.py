@@ -2,6 +2,8 @@ from django.db import transaction, IntegrityError
 
 from projects.models import Project, Category, DifficultyLevel, Task, Prerequisite, TaskPrerequisite, Endpoint, \
     TestCase, TestType, ApiTestCase
+from projects.services.project_totals_service import ProjectTotalsService
+from projects.services.test_plan_service import TestPlanService
 from utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
@@ -59,6 +61,9 @@ class ProjectSeederService:
         endpoint_id_map = self._bulk_create_endpoints(task_map, tasks_data)
         self._bulk_create_test_cases(task_map, endpoint_id_map, tasks_data)
 
+        # bulk_create does not send signals, so drop any cached test plan explicitly.
+        TestPlanService.invalidate_on_commit(project.id)
+
         return project
 
     def _bulk_create_tasks(self, project: Project, tasks_data: list) -> dict:
@@ -171,6 +176,8 @@ class ProjectSeederService:
             return
 
         TestCase.objects.bulk_create(test_cases_to_create)
+        # bulk_create does not send signals either, so the project's point totals are refreshed here.
+        ProjectTotalsService.refresh(next(iter(task_map.values())).project_id)
 
         # Map created test cases to the api_details data to prepare for ApiTestCase creation
         created_test_cases = TestCase.objects.filter(task__in=task_map.values()).select_related('task')
@@ -193,6 +200,7 @@ class ProjectSeederService:
                 test_case=created_test_case,
                 endpoint=endpoint,
                 path_params=api_details.get('path_params', {}),
+                query_params=api_details.get('query_params'),
                 request_payload=api_details.get('request_payload'),
                 request_headers=api_details.get('request_headers'),
                 expected_status_code=api_details['expected_status_code'],
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+from projects.models import Project, Task
+
+
+class ProjectTotalsService:
+    """
+    Maintains the point totals and test case counts stored on a project and its tasks,
+    so grading and progress displays can read "X of Y points" without aggregating.
+    """
+
+    TASK_FIELDS = ['total_points', 'test_case_count', 'cumulative_points', 'cumulative_test_case_count']
+
+    @classmethod
+    def refresh(cls, project_id: int):
+        """Recomputes the totals of the project with one aggregate query and one bulk update."""
+        tasks = list(
+            Task.objects.filter(project_id=project_id).order_by('order').annotate(
+                points_sum=Coalesce(Sum('test_cases__points'), 0),
+                cases_count=Count('test_cases'),
+            )
+        )
+        cumulative_points = cumulative_count = 0
+        for task in tasks:
+            cumulative_points += task.points_sum
+            cumulative_count += task.cases_count
+            task.total_points = task.points_sum
+            task.test_case_count = task.cases_count
+            task.cumulative_points = cumulative_points
+            task.cumulative_test_case_count = cumulative_count
+
+        if tasks:
+            Task.objects.bulk_update(tasks, cls.TASK_FIELDS)
+        Project.objects.filter(pk=project_id).update(total_points=cumulative_points, test_case_count=cumulative_count)
+
+    @classmethod
+    def refresh_on_commit(cls, project_id: int):
+        transaction.on_commit(lambda: cls.refresh(project_id))
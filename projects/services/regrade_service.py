@@ -0,0 +1,106 @@
+from collections import defaultdict
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from projects.models import Regrade, Submission, TestCase, PASSED, FAILED
+from projects.services.batch_grading_service import BatchGradingService
+from projects.services.replay_submission_runner import MissingRecording, NeedsLiveRegrade, ReplaySubmissionTestRunnerService
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class RegradeService:
+    """
+    Re-evaluates completed submissions after test cases were edited. The affected
+    submissions are selected with one indexed query, split into chunks of
+    GRADING_REGRADE_CHUNK_SIZE and handed to the regrade queue one
+    GRADING_REGRADE_CHUNK_INTERVAL_SECONDS apart. Each chunk replays the recorded
+    exchanges, so no student deployment is contacted and live grading keeps its workers.
+    Submissions whose replay reaches a test case they never recorded a response for (a
+    test case added since) are left unchanged and counted as needing a live regrade.
+    """
+
+    @classmethod
+    def start_for_test_cases(cls, test_cases: Iterable[TestCase], reason: str = '') -> List[Regrade]:
+        """Starts one regrade per project of the given test cases, from the earliest changed task."""
+        min_order_by_project = defaultdict(lambda: None)
+        for test_case in test_cases:
+            project_id, order = test_case.task.project_id, test_case.task.order
+            current = min_order_by_project[project_id]
+            min_order_by_project[project_id] = order if current is None else min(current, order)
+        return [cls.start(project_id, order, reason) for project_id, order in min_order_by_project.items()]
+
+    @classmethod
+    def start(cls, project_id: int, min_task_order: int = 0, reason: str = '') -> Regrade:
+        submission_ids = cls.affected_submission_ids(project_id, min_task_order)
+        regrade = Regrade.objects.create(
+            project_id=project_id, min_task_order=min_task_order, reason=reason[:255], total=len(submission_ids),
+            finished_at=None if submission_ids else timezone.now(),
+        )
+        transaction.on_commit(lambda: cls._dispatch(regrade.id, submission_ids))
+        logger.info(f"Regrade {regrade.id} of project {project_id} queued for {len(submission_ids)} submissions.")
+        return regrade
+
+    @staticmethod
+    def affected_submission_ids(project_id: int, min_task_order: int) -> List[int]:
+        """The completed submissions whose runs include a task of `min_task_order` or later."""
+        return list(
+            Submission.objects.filter(project_id=project_id, status__in=[PASSED, FAILED], task__order__gte=min_task_order)
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    @staticmethod
+    def _dispatch(regrade_id: int, submission_ids: List[int]):
+        from projects.tasks import regrade_submissions_chunk
+
+        chunk_size = settings.GRADING_REGRADE_CHUNK_SIZE
+        for index, start in enumerate(range(0, len(submission_ids), chunk_size)):
+            regrade_submissions_chunk.apply_async(
+                (regrade_id, submission_ids[start:start + chunk_size]),
+                countdown=index * settings.GRADING_REGRADE_CHUNK_INTERVAL_SECONDS,
+            )
+
+    @classmethod
+    def regrade_chunk(cls, regrade_id: int, submission_ids: List[int]) -> str:
+        """Replays a chunk of submissions, writes the results back in bulk and advances the regrade's progress."""
+        runners, skipped, needs_live, failed = [], 0, 0, 0
+        for submission_id in submission_ids:
+            runner = ReplaySubmissionTestRunnerService(submission_id, persist=False)
+            try:
+                runner.run()
+                runners.append(runner)
+            except Submission.DoesNotExist:
+                skipped += 1
+            except MissingRecording as e:
+                logger.info(f"Regrade {regrade_id}: {e}")
+                skipped += 1
+            except NeedsLiveRegrade as e:
+                logger.info(f"Regrade {regrade_id} left submission {submission_id} unchanged: {e}")
+                needs_live += 1
+            except Exception as e:
+                logger.error(f"Regrade {regrade_id} could not replay submission {submission_id}: {e}", exc_info=True)
+                failed += 1
+
+        BatchGradingService.write_results(runners)
+        cls._record_progress(regrade_id, len(runners), skipped, needs_live, failed)
+        return (
+            f"Regraded {len(runners)} submissions, skipped {skipped}, "
+            f"{needs_live} need a live regrade, failed {failed}."
+        )
+
+    @staticmethod
+    def _record_progress(regrade_id: int, regraded: int, skipped: int, needs_live: int, failed: int):
+        regrades = Regrade.objects.filter(pk=regrade_id)
+        regrades.update(
+            regraded=F('regraded') + regraded, skipped=F('skipped') + skipped,
+            needs_live_regrade=F('needs_live_regrade') + needs_live, failed=F('failed') + failed,
+        )
+        regrades.filter(
+            finished_at__isnull=True,
+            total__lte=F('regraded') + F('skipped') + F('needs_live_regrade') + F('failed'),
+        ).update(finished_at=timezone.now())
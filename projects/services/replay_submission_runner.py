@@ -0,0 +1,123 @@
+from django.utils import timezone
+
+from projects.models import Submission, SubmissionTestResult, TeamProject, TestCase, PASSED
+from projects.services.exchange_recording import ExchangeRecording
+from projects.services.submission_events import SilentEventStream
+from projects.services.submissions_services import SubmissionTestRunnerService
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class MissingRecording(Exception):
+    """The submission has no recorded exchanges, so it can only be regraded against its deployment."""
+
+
+class NeedsLiveRegrade(Exception):
+    """The replay reached test cases without a recorded response, e.g. ones added since the run."""
+
+
+class ReplaySubmissionTestRunnerService(SubmissionTestRunnerService):
+    """
+    Regrades a submission against the responses recorded when it was graded, without any
+    network access. Requests are still rendered so template errors are reported as before,
+    but every response comes from the recording and all assertions are re-evaluated with
+    the current test case definitions. Results that incremental grading copied from an
+    earlier submission are replayed from that submission's recording.
+
+    Only the results change: the submission keeps its completion time and trace, its
+    team's project keeps its finish time, and no progress events reach the students. A
+    team that finished the project keeps it finished even if the replay now fails, since
+    its certificates may already be issued. A replay that reaches a test case without a
+    recorded response raises NeedsLiveRegrade instead of failing that test, so the
+    submission is left unchanged for a run against its deployment.
+    """
+
+    # A replay is cheap to repeat from the start.
+    CHECKPOINTS = False
+    # Nothing waits on the network, and only the test cases a sequential run reaches may need a recording.
+    DEPENDENCY_SCHEDULING = False
+
+    def __init__(self, submission_id: int, persist: bool = True):
+        super().__init__(submission_id, persist=persist)
+        self.replayed = ExchangeRecording()
+        self.events = SilentEventStream(submission_id)
+        # Names of the test cases the replay reached without a recorded response.
+        self.unrecorded_test_cases = []
+
+    def _setup(self):
+        super()._setup()
+        self.replayed = self._load_recordings()
+
+    def _find_reusable_results(self):
+        # Every test case is re-evaluated; nothing is copied from other submissions.
+        return None
+
+    def _load_recordings(self) -> ExchangeRecording:
+        source_ids = set(
+            SubmissionTestResult.objects.filter(submission_id=self.submission_id, reused_from_submission__isnull=False)
+            .values_list('reused_from_submission', flat=True)
+        )
+        exchanges = {}
+        for source in Submission.objects.filter(pk__in=source_ids):
+            if source.recording:
+                exchanges.update(self._read_recording(source).exchanges)
+        if self.submission.recording:
+            exchanges.update(self._read_recording(self.submission).exchanges)
+        if not exchanges:
+            raise MissingRecording(f"Submission {self.submission_id} has no recorded exchanges to replay.")
+        return ExchangeRecording(exchanges)
+
+    @staticmethod
+    def _read_recording(submission: Submission) -> ExchangeRecording:
+        with submission.recording.open('rb') as recording:
+            return ExchangeRecording.from_gzip(recording.read())
+
+    def _warm_up(self):
+        pass
+
+    def _execute_test_suite(self):
+        super()._execute_test_suite()
+        if self.unrecorded_test_cases:
+            raise NeedsLiveRegrade(
+                f"Submission {self.submission_id} has no recorded response for: {', '.join(self.unrecorded_test_cases)}."
+            )
+
+    def _store_recording(self):
+        # The recording being replayed is the evidence; it is never overwritten.
+        pass
+
+    def _store_trace(self):
+        # The trace describes the original run against the deployment.
+        pass
+
+    def _completion_time(self):
+        # The submission was graded when it ran; incremental grading and lane metrics rely on that time.
+        return self.submission.completed_at or timezone.now()
+
+    def _mark_project_as_finished(self):
+        """Marks the project finished, as of the original run, if the replay made the last task pass."""
+        if self.submission.status != PASSED:
+            return
+        project = self.submission.task.project
+        if project.tasks.order_by('-order').values_list('id', flat=True).first() != self.submission.task_id:
+            return
+        TeamProject.objects.filter(team_id=self.submission.team_id, project=project, is_finished=False).update(
+            is_finished=True, finished_at=self.submission.completed_at,
+        )
+
+    def _run_api_test(self, test_case: TestCase, base_url: str, context: dict, produced: dict = None) -> (bool, str, dict):
+        request_kwargs, error = self._build_request(test_case, base_url, context)
+        if error:
+            return False, error, context
+
+        exchange = self.replayed.get(test_case.id)
+        if exchange is None:
+            self.unrecorded_test_cases.append(test_case.name)
+            return False, self._not_run_feedback("no response was recorded for this test case"), context
+        self.test_metrics[test_case.id] = {"duration_ms": exchange.duration_ms, "status_code": exchange.status_code}
+        if exchange.error is not None:
+            return False, f"Failed to connect to API at {request_kwargs['url']}. Error: {exchange.error}", context
+
+        passed, feedback = self._evaluate_response(test_case, exchange.response(), context if produced is None else produced)
+        return passed, feedback, context
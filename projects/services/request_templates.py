@@ -0,0 +1,145 @@
+import re
+from typing import Any, Callable, Dict
+
+from projects.services.test_dependency_planner import CONTEXT_REFERENCE_PATTERN
+
+PATH_PARAMETER_PATTERN = re.compile(r'\{(\w+)\}')
+# A string that is exactly one reference renders to the context value itself, keeping its JSON type.
+WHOLE_REFERENCE_PATTERN = re.compile(r'^\{\{context\.(\w+)\}\}$')
+
+
+class TemplateError(Exception):
+    """A request template that cannot be rendered; the message is the test case feedback."""
+
+
+class MissingContextKey(TemplateError):
+    def __init__(self, key: str, location: str):
+        self.key = key
+        self.location = location
+        super().__init__(f"Test failed: Context variable '{key}' not found for {location}.")
+
+
+class PathTemplate:
+    """An endpoint path split once into literal segments and `{name}` parameters."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.segments = []
+        position = 0
+        for match in PATH_PARAMETER_PATTERN.finditer(path):
+            if match.start() > position:
+                self.segments.append((False, path[position:match.start()]))
+            self.segments.append((True, match.group(1)))
+            position = match.end()
+        if position < len(path):
+            self.segments.append((False, path[position:]))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Substitutes the given parameters; parameters without a value are left as written."""
+        return ''.join(
+            (str(values[text]) if text in values else f"{{{text}}}") if is_parameter else text
+            for is_parameter, text in self.segments
+        )
+
+
+def _lookup(context: dict, key: str, location: str):
+    try:
+        return context[key]
+    except KeyError:
+        raise MissingContextKey(key, location) from None
+
+
+def compile_value(value: Any, location: str) -> Callable[[dict], Any]:
+    """
+    Compiles a JSON value containing '{{context.x}}' references into a function of the
+    context. Subtrees without references are returned as they are, without copying.
+    """
+    return _compile(value, location, None)[0]
+
+
+def _compile(value: Any, location: str, field):
+    """Returns the render function of a value and whether it references the context."""
+    where = f"{location} at '{field}'" if field is not None else location
+    if isinstance(value, str):
+        return _compile_string(value, where)
+    if isinstance(value, dict):
+        items = [
+            (_compile(key, location, field), _compile(item, location, key if field is None else f"{field}.{key}"))
+            for key, item in value.items()
+        ]
+        if not any(key[1] or item[1] for key, item in items):
+            return (lambda context: value), False
+        return (lambda context: {key[0](context): item[0](context) for key, item in items}), True
+    if isinstance(value, list):
+        items = [
+            _compile(item, location, index if field is None else f"{field}.{index}")
+            for index, item in enumerate(value)
+        ]
+        if not any(item[1] for item in items):
+            return (lambda context: value), False
+        return (lambda context: [item[0](context) for item in items]), True
+    return (lambda context: value), False
+
+
+def _compile_string(value: str, location: str):
+    whole = WHOLE_REFERENCE_PATTERN.match(value)
+    if whole:
+        key = whole.group(1)
+        return (lambda context: _lookup(context, key, location)), True
+
+    segments = []
+    position = 0
+    for match in CONTEXT_REFERENCE_PATTERN.finditer(value):
+        if match.start() > position:
+            segments.append((False, value[position:match.start()]))
+        segments.append((True, match.group(1)))
+        position = match.end()
+    if not segments:
+        return (lambda context: value), False
+    if position < len(value):
+        segments.append((False, value[position:]))
+    return (lambda context: ''.join(
+        str(_lookup(context, text, location)) if is_reference else text for is_reference, text in segments
+    )), True
+
+
+class RequestTemplate:
+    """
+    The request of an API test case, parsed once: the endpoint path and its parameters,
+    query parameters, headers and JSON payload may all reference '{{context.x}}'.
+    Rendering is one pass over the compiled segments and raises MissingContextKey
+    naming the key and where it is used.
+    """
+
+    def __init__(self, api_details):
+        self.method = api_details.endpoint.method
+        self.path_template = PathTemplate(api_details.endpoint.path)
+        self.path_params = {}
+        self.invalid_reference = None
+        for key, value in (api_details.path_params or {}).items():
+            if isinstance(value, str) and '{{' in value and '}}' in value and not CONTEXT_REFERENCE_PATTERN.search(value):
+                self.invalid_reference = value
+            self.path_params[key] = compile_value(value, f"path parameter '{key}'")
+        self.query_params = compile_value(api_details.query_params, "query parameter") if api_details.query_params else None
+        self.headers = compile_value(api_details.request_headers, "request header") if api_details.request_headers else None
+        self.payload = compile_value(api_details.request_payload, "request payload")
+
+    def render(self, base_url: str, context: dict) -> Dict[str, Any]:
+        """Returns the keyword arguments of the HTTP request for the given context."""
+        if self.invalid_reference is not None:
+            raise TemplateError(f"Test failed: Invalid context variable format '{self.invalid_reference}'.")
+
+        path_values = {key: render(context) for key, render in self.path_params.items()}
+        request_kwargs = {
+            'method': self.method,
+            'url': f"{base_url}{self.path_template.render(path_values)}",
+            'headers': None,
+            'json': self.payload(context),
+        }
+        if self.headers is not None:
+            request_kwargs['headers'] = {
+                key: value if isinstance(value, str) else str(value) for key, value in self.headers(context).items()
+            }
+        if self.query_params is not None:
+            request_kwargs['params'] = self.query_params(context)
+        return request_kwargs
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import jsonschema
+from django.conf import settings
+
+from utils.logging_utils import get_logger
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+logger = get_logger(__name__)
+
+# Keywords the code-generated validators are used for; any other keyword keeps a schema on jsonschema.
+FAST_SCHEMA_KEYWORDS = {
+    'type', 'properties', 'required', 'additionalProperties', 'items', 'enum', 'const',
+    'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum', 'minLength', 'maxLength',
+    'minItems', 'maxItems', 'uniqueItems', 'title', 'description',
+}
+
+
+def schema_hash(schema: Any) -> str:
+    """A stable digest of a JSON schema, independent of key order."""
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def check_schema(schema: Any):
+    """Raises jsonschema.exceptions.SchemaError if the schema is not valid under its own metaschema."""
+    jsonschema.validators.validator_for(schema).check_schema(schema)
+
+
+def is_fast_schema(schema: Any) -> bool:
+    """Whether every keyword of the schema, at every level, is in FAST_SCHEMA_KEYWORDS."""
+    if isinstance(schema, bool):
+        return True
+    if not isinstance(schema, dict) or not set(schema) <= FAST_SCHEMA_KEYWORDS:
+        return False
+    subschemas = list((schema.get('properties') or {}).values())
+    for key in ('items', 'additionalProperties'):
+        if isinstance(schema.get(key), (dict, bool)):
+            subschemas.append(schema[key])
+    if isinstance(schema.get('items'), list):
+        return False
+    return all(is_fast_schema(subschema) for subschema in subschemas)
+
+
+class CompiledSchemaValidator:
+    """
+    A response schema checked once and compiled for reuse. Passing instances take the
+    code-generated validator when there is one; failures are always explained by
+    jsonschema, so feedback does not depend on which validator ran.
+    """
+
+    def __init__(self, schema: Any):
+        self.schema = schema
+        self.schema_error = None
+        self.validator = None
+        self.fast_validate = None
+        try:
+            check_schema(schema)
+        except jsonschema.exceptions.SchemaError as e:
+            self.schema_error = e.message
+            return
+
+        self.validator = jsonschema.validators.validator_for(schema)(schema)
+        if fastjsonschema is not None and settings.GRADING_FAST_SCHEMA_VALIDATION and is_fast_schema(schema):
+            try:
+                self.fast_validate = fastjsonschema.compile(schema)
+            except Exception as e:
+                logger.warning(f"Could not compile a fast validator, using jsonschema: {e}")
+
+    def validate(self, instance: Any) -> Optional[str]:
+        """Returns None when the instance matches the schema, else the feedback describing the first error."""
+        if self.schema_error is not None:
+            return f"The expected response schema of this test case is invalid: {self.schema_error}"
+        if self.fast_validate is not None:
+            try:
+                self.fast_validate(instance)
+                return None
+            except fastjsonschema.JsonSchemaException:
+                pass
+        error = jsonschema.exceptions.best_match(self.validator.iter_errors(instance))
+        if error is None:
+            return None
+        return f"Response JSON validation failed. Error in field '{'.'.join(str(part) for part in error.path)}': {error.message}"
+
+
+class SchemaValidatorRegistry:
+    """
+    Compiled response-schema validators of each worker process, keyed by ApiTestCase
+    primary key and schema hash: an edited schema gets a new entry and the old one ages
+    out of the LRU, so entries never need to be invalidated.
+    """
+
+    _validators = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, api_test_case_id: Optional[int], schema: Any) -> CompiledSchemaValidator:
+        key = (api_test_case_id, schema_hash(schema))
+        with cls._lock:
+            validator = cls._validators.get(key)
+            if validator is not None:
+                cls._validators.move_to_end(key)
+                return validator
+
+        validator = CompiledSchemaValidator(schema)
+        with cls._lock:
+            cls._validators[key] = validator
+            while len(cls._validators) > settings.GRADING_SCHEMA_VALIDATOR_CACHE_SIZE:
+                cls._validators.popitem(last=False)
+        return validator
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._validators = OrderedDict()
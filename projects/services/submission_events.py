@@ -0,0 +1,65 @@
+import json
+from typing import List, Optional
+
+from django.conf import settings
+
+from utils.logging_utils import get_logger
+from utils.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+STARTED = 'started'
+RESULT = 'result'
+FINISHED = 'finished'
+
+
+class SubmissionEventStream:
+    """
+    A Redis stream of the progress events of one submission: `started`, one `result`
+    per test case as it is logged, and `finished`. Streams are capped and expire after
+    GRADING_EVENTS_TTL_SECONDS, so they only serve clients watching a run live.
+    Publishing never interrupts grading: Redis errors are logged and ignored.
+    """
+
+    MAX_EVENTS = 1000
+
+    def __init__(self, submission_id: int):
+        self.submission_id = submission_id
+        self.key = f"grading:submission-events:{submission_id}"
+
+    def publish(self, event_type: str, data: dict):
+        try:
+            redis = get_redis()
+            pipeline = redis.pipeline(transaction=False)
+            pipeline.xadd(
+                self.key, {'type': event_type, 'data': json.dumps(data, default=str)},
+                maxlen=self.MAX_EVENTS, approximate=True,
+            )
+            pipeline.expire(self.key, settings.GRADING_EVENTS_TTL_SECONDS)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not publish '{event_type}' event of submission {self.submission_id}: {e}")
+
+    def read(self, last_event_id: str = '0', block_seconds: float = 0, count: int = 100) -> Optional[List[dict]]:
+        """
+        Returns the events after `last_event_id`, waiting up to `block_seconds` for new
+        ones when there are none yet, or None when Redis is unavailable.
+        """
+        block = int(block_seconds * 1000) if block_seconds else None
+        try:
+            response = get_redis().xread({self.key: last_event_id}, count=count, block=block)
+        except Exception as e:
+            logger.warning(f"Could not read the events of submission {self.submission_id}: {e}")
+            return None
+        events = []
+        for _, entries in response or []:
+            for event_id, fields in entries:
+                events.append({'id': event_id, 'type': fields['type'], 'data': json.loads(fields['data'])})
+        return events
+
+
+class SilentEventStream(SubmissionEventStream):
+    """A stream that publishes nothing, for runs no client should be told about (regrades)."""
+
+    def publish(self, event_type: str, data: dict):
+        pass
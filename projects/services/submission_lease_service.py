@@ -0,0 +1,99 @@
+import os
+import socket
+import time
+from typing import List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from projects.models import Submission, PENDING, RUNNING
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def current_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SubmissionLeaseService:
+    """
+    The claim protocol of grading workers. A worker grades a submission only after
+    moving it to running under its own name (`claimed_by`) and keeps the lease alive
+    with heartbeats; a submission whose heartbeat is older than GRADING_LEASE_SECONDS is
+    considered abandoned and may be claimed again. Claims lock rows with
+    `select_for_update(skip_locked=True)`, so two workers never claim the same submission.
+    """
+
+    def __init__(self, worker_id: str = None):
+        self.worker_id = worker_id or current_worker_id()
+        self._last_heartbeat = time.monotonic()
+
+    def claim(self, submission_ids: List[int]) -> List[int]:
+        """Claims the given submissions that are pending or abandoned; returns the ids claimed."""
+        return self._claim(Submission.objects.filter(id__in=submission_ids).filter(self._claimable()))
+
+    def claim_pending(self, limit: int) -> List[int]:
+        """
+        Claims up to `limit` pending submissions. With fair share enabled they are taken
+        round-robin across teams: the oldest submission of every team first, then every
+        team's second oldest and so on, so one team's burst cannot fill a whole batch.
+        """
+        if not settings.GRADING_FAIR_SHARE_ENABLED:
+            return self._claim(Submission.objects.filter(status=PENDING).order_by('created_at'), limit)
+
+        submission_ids = list(
+            Submission.objects.filter(status=PENDING)
+            .annotate(team_rank=Window(RowNumber(), partition_by=[F('team_id')], order_by=F('created_at').asc()))
+            .order_by('team_rank', 'created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        return self._claim(Submission.objects.filter(id__in=submission_ids, status=PENDING).order_by('created_at'))
+
+    def heartbeat(self, submission_ids: List[int]):
+        """Extends the leases this worker holds on the given submissions."""
+        self._last_heartbeat = time.monotonic()
+        Submission.objects.filter(id__in=submission_ids, status=RUNNING, claimed_by=self.worker_id).update(
+            heartbeat_at=timezone.now()
+        )
+
+    def heartbeat_if_due(self, submission_ids: List[int]):
+        if time.monotonic() - self._last_heartbeat >= settings.GRADING_HEARTBEAT_SECONDS:
+            self.heartbeat(submission_ids)
+
+    @staticmethod
+    def release_expired_leases() -> List[int]:
+        """
+        Moves the running submissions whose lease expired back to pending in one bulk
+        update and returns their ids, for the caller to queue them again.
+        """
+        with transaction.atomic():
+            submission_ids = list(
+                Submission.get_expired_leases(settings.GRADING_LEASE_SECONDS)
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)
+            )
+            if submission_ids:
+                Submission.objects.filter(id__in=submission_ids).update(
+                    status=PENDING, claimed_by='', claimed_at=None, heartbeat_at=None
+                )
+        return submission_ids
+
+    def _claim(self, queryset, limit: int = None) -> List[int]:
+        with transaction.atomic():
+            queryset = queryset.select_for_update(skip_locked=True).values_list('id', flat=True)
+            submission_ids = list(queryset[:limit] if limit else queryset)
+            if submission_ids:
+                now = timezone.now()
+                Submission.objects.filter(id__in=submission_ids).update(
+                    status=RUNNING, claimed_by=self.worker_id, claimed_at=now, heartbeat_at=now
+                )
+        self._last_heartbeat = time.monotonic()
+        return submission_ids
+
+    @staticmethod
+    def _claimable() -> Q:
+        return Q(status=PENDING) | Submission.expired_lease_filter(settings.GRADING_LEASE_SECONDS)
@@ -1,11 +1,28 @@
-import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, Any, List
 
-import jsonschema
 import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
 from django.utils import timezone
 
-from projects.models import Submission, PENDING, TestCase, TestType, Task, PASSED, TeamProject
+from projects.models import Submission, SubmissionTestResult, PENDING, RUNNING, TestCase, TestType, Task, PASSED, TeamProject
+from projects.services.grading_http_client import get_session_pool
+from projects.services.exchange_recording import ExchangeRecording
+from projects.services.fair_share_dispatcher import FairShareDispatcher
+from projects.services.grading_checkpoint import GradingCheckpoint
+from projects.services.grading_priority import GradingPriority
+from projects.services.grading_response import GradingResponse, ResponseByteBudget, truncate_text
+from projects.services.grading_trace import GradingTrace
+from projects.services.host_circuit_breaker import HostCircuitBreaker
+from projects.services import submission_events
+from projects.services.incremental_grading_service import IncrementalGradingService
+from projects.services.request_templates import TemplateError
+from projects.services.schema_validator_registry import CompiledSchemaValidator, SchemaValidatorRegistry
+from projects.services.test_dependency_planner import TestDependencyPlanner, PlannedTestCase
+from projects.services.test_plan_service import TestPlanService
 from projects.tasks import run_submission_tests
 from utils.logging_utils import get_logger
 
@@ -19,19 +36,46 @@ class SubmissionService:
     def create(self):
         """
         Creates a submission based on validated data and triggers the test runner.
+        If the team already has a pending or running submission of the same task to the
+        same deployment URL, that submission is returned instead (with `is_coalesced` set)
+        and no new run is queued.
         """
         team_project = self.validated_data['team_project']
         deployment_url = self.validated_data['deployment_url']
         deployment_url_provided = self.validated_data['deployment_url_provided']
 
-        submission = self._create_submission()
+        with transaction.atomic():
+            # Serializes concurrent submissions of the team so two clicks cannot both create a run.
+            TeamProject.objects.select_for_update().filter(pk=team_project.pk).first()
+            submission = self._find_in_flight_submission()
+            if submission is not None:
+                logger.info(f"Submission request coalesced into in-flight submission {submission.id}.")
+                submission.is_coalesced = True
+                return submission
+
+            submission = self._create_submission()
+            submission.is_coalesced = False
 
         if deployment_url_provided:
             self._update_team_project_deployment_url(team_project, deployment_url)
 
-        run_submission_tests.delay(submission.id)
+        if settings.GRADING_DISPATCH_MODE == 'batch':
+            from projects.services.batch_grading_service import BatchGradingService
+            BatchGradingService.schedule()
+        elif not (settings.GRADING_FAIR_SHARE_ENABLED and FairShareDispatcher().submit(submission.team_id, submission.id)):
+            options = GradingPriority.queue_options([submission.id]).get(submission.id, {})
+            run_submission_tests.apply_async((submission.id,), **options)
         return submission
 
+    def _find_in_flight_submission(self):
+        """The team's latest pending or running submission of the same task and deployment URL, if any."""
+        return Submission.objects.filter(
+            team=self.validated_data['team'],
+            task=self.validated_data['task'],
+            deployment_url=self.validated_data['deployment_url'],
+            status__in=[PENDING, RUNNING],
+        ).order_by('-created_at').first()
+
     def _create_submission(self):
         """
         Creates and returns a new Submission instance.
@@ -59,33 +103,74 @@ class SubmissionTestRunnerService:
     """
     Encapsulates the logic for running all tests for a given submission.
     """
-    def __init__(self, submission_id: int):
+    REQUEST_TIMEOUT_SECONDS = 10
+    RESULT_FIELDS = [
+        'test_context', 'passed_tests', 'passed_percentage', 'status', 'completed_at', 'trace_artifact',
+        'warmup_succeeded', 'warmup_seconds', 'warmup_attempts', 'recording',
+    ]
+    # Gateway errors free-tier hosts answer with while the deployment is still waking up.
+    WARMUP_RETRY_STATUS_CODES = {502, 503, 504}
+    # Whether the run saves a checkpoint after every test case and resumes from one on retry.
+    CHECKPOINTS = True
+    # Whether independent test cases may run concurrently when GRADING_DEPENDENCY_SCHEDULING is on.
+    DEPENDENCY_SCHEDULING = True
+
+    def __init__(self, submission_id: int, persist: bool = True, lease=None):
         self.submission_id = submission_id
+        # The SubmissionLeaseService holding the claim; heartbeats are sent through it during the run.
+        self.lease = lease
+        # When False, _finalize_submission only updates the instance so callers can bulk-update many at once.
+        self.persist = persist
         self.submission = None
         self.base_url = ""
         self.project_tasks = []
         self.full_results_log = []
+        # Duration and status code of the HTTP exchange of each test case, by test case id.
+        self.test_metrics = {}
+        self.response_bytes_read = 0
+        # What is left of GRADING_MAX_SUBMISSION_RESPONSE_BYTES, shared by the run's concurrent reads.
+        self.response_budget = ResponseByteBudget(settings.GRADING_MAX_SUBMISSION_RESPONSE_BYTES)
+        self.breaker = None
+        self.deadline = None
+        self.time_budget_seconds = None
+        self.slowest_response_seconds = None
         self.is_submission_failed = False
         self.test_context = {}
         self.total_points_earned = 0
         self.total_possible_points = 0
         self.failed_task_name = ""
-
-    def _validate_json_schema(self, instance: Dict[str, Any], schema: Dict[str, Any]) -> (bool, str):
+        self.plan = None
+        self.reusable_results = None
+        self.events = submission_events.SubmissionEventStream(submission_id)
+        # Requests, responses and context changes of the run; persisted only when it is worth reading.
+        self.trace = GradingTrace()
+        # Responses by test case, stored on the submission so it can be regraded without the deployment.
+        self.recording = ExchangeRecording()
+        self.checkpoint = GradingCheckpoint(submission_id)
+        # Outcomes of the test cases completed before a retry, by test case id; they are not run again.
+        self.checkpointed_outcomes = {}
+        self._started = time.monotonic()
+        # Until when the time spent by this attempt was added to the checkpoint.
+        self._spent_counted_until = self._started
+
+    def _validate_json_schema(self, instance: Dict[str, Any], schema: Dict[str, Any],
+                              validator: CompiledSchemaValidator = None) -> (bool, str):
         if not schema:
             return True, "No response schema was defined for this test case."
         try:
-            jsonschema.validate(instance=instance, schema=schema)
+            if validator is None:
+                validator = SchemaValidatorRegistry.get(None, schema)
+            error_message = validator.validate(instance)
+            if error_message is not None:
+                return False, error_message
             return True, "Response JSON matches the expected schema."
-        except jsonschema.exceptions.ValidationError as e:
-            error_message = f"Response JSON validation failed. Error in field '{'.'.join(e.path)}': {e.message}"
-            return False, error_message
         except Exception as e:
             return False, f"An unexpected error occurred during schema validation: {str(e)}"
 
     def run(self):
         """Main method to run the entire test suite for the submission."""
         self._setup()
+        self._warm_up()
         self._execute_test_suite()
         self._finalize_submission()
         self._mark_project_as_finished()
@@ -95,17 +180,137 @@ class SubmissionTestRunnerService:
         """Fetches submission and prepares for the test run."""
         self.submission = Submission.objects.select_related('task__project').get(pk=self.submission_id)
         self.base_url = self.submission.deployment_url.rstrip('/')
+        self.breaker = HostCircuitBreaker(self.base_url)
+        self.time_budget_seconds = (
+            self.submission.task.project.grading_time_budget_seconds or settings.GRADING_SUBMISSION_TIME_BUDGET_SECONDS
+        )
+        self.deadline = time.monotonic() + self.time_budget_seconds - self._spent_in_earlier_attempts()
         submitted_task = self.submission.task
-        self.project_tasks = submitted_task.project.tasks.filter(order__lte=submitted_task.order).order_by('order')
-        # log the project tasks being tested
-        logger.info(f"Running tests for project tasks: {[task.name for task in self.project_tasks]}")
-        self.total_possible_points = sum(
-            tc.points for task in self.project_tasks for tc in TestCase.objects.filter(task=task)
+        self.plan = TestPlanService.get_plan(submitted_task.project_id, submitted_task.order)
+        self.project_tasks = self.plan.tasks
+        self.trace.add("setup", base_url=self.base_url, tasks=[task.name for task in self.project_tasks])
+        self.total_possible_points = self.plan.total_points
+
+        self.reusable_results = self._find_reusable_results()
+        if self.reusable_results:
+            self.test_context = dict(self.reusable_results.context)
+        self._resume_from_checkpoint()
+
+        self.events.publish(submission_events.STARTED, {
+            "total_tests": self.plan.test_case_count, "total_points": self.total_possible_points,
+        })
+
+    def _spent_in_earlier_attempts(self) -> float:
+        """
+        How much of the time budget earlier attempts at this run used. Each attempt adds the
+        time it spent grading to the checkpoint, so a retry cannot get a fresh budget, while
+        the time the run waited for its retry is not counted.
+        """
+        if not self.CHECKPOINTS:
+            return 0
+        return self.checkpoint.spent_seconds()
+
+    def _resume_from_checkpoint(self):
+        """Restores the progress of an earlier attempt at this run, if it was made against the same plan."""
+        if not self.CHECKPOINTS:
+            return
+        state = self.checkpoint.load()
+        if not state:
+            return
+        if (state['plan_version'], state['task_order']) != (self.plan.version, self.plan.task_order):
+            # The test cases changed since the earlier attempt; its results no longer apply.
+            self.checkpoint.discard_progress()
+            return
+        # Reused results are part of the checkpoint; they are not looked up again.
+        self.reusable_results = None
+        self.full_results_log = state['results']
+        self.test_context = state['context']
+        self.total_points_earned = state['points']
+        self.response_bytes_read = state['response_bytes_read']
+        self.response_budget = ResponseByteBudget(settings.GRADING_MAX_SUBMISSION_RESPONSE_BYTES - self.response_bytes_read)
+        self.slowest_response_seconds = state['slowest_response_seconds']
+        self.recording = ExchangeRecording.from_dicts(state['recording'])
+        self.checkpointed_outcomes = {entry['test_case_id']: entry['passed'] for entry in self.full_results_log}
+        self.trace.add("resumed", position=state['position'])
+        logger.info(f"Submission {self.submission_id} resumes after test {state['position']} of its previous attempt.")
+
+    def _save_checkpoint(self, test_case: TestCase):
+        if not self.CHECKPOINTS:
+            return
+        exchange = self.recording.get(test_case.id)
+        self.checkpoint.save({
+            "plan_version": self.plan.version, "task_order": self.plan.task_order,
+            "position": len(self.full_results_log), "results": self.full_results_log,
+            "context": self.test_context, "points": self.total_points_earned,
+            "response_bytes_read": self.response_bytes_read,
+            "slowest_response_seconds": self.slowest_response_seconds,
+        }, exchange.as_dict() if exchange is not None else None, self._spent_since_last_count())
+
+    def _spent_since_last_count(self) -> float:
+        now = time.monotonic()
+        spent, self._spent_counted_until = now - self._spent_counted_until, now
+        return spent
+
+    def _find_reusable_results(self):
+        return IncrementalGradingService(self.submission, self.plan).find_reusable_results()
+
+    def _warm_up(self):
+        """
+        Probes the deployment's base URL until it answers, backing off exponentially after
+        timeouts and gateway errors, so a sleeping host is awake before the first graded
+        request. The outcome is recorded on the submission and the tests run either way.
+        """
+        window_end = self._warmup_window_end()
+        if window_end is None:
+            return
+        started = time.monotonic()
+        delay = settings.GRADING_WARMUP_INITIAL_BACKOFF_SECONDS
+        attempts, succeeded = 0, False
+        while time.monotonic() < window_end:
+            attempts += 1
+            try:
+                response = get_session_pool().session_for(self.base_url).get(
+                    f"{self.base_url}/", timeout=window_end - time.monotonic(), allow_redirects=False, stream=True
+                )
+                response.close()
+                succeeded = response.status_code not in self.WARMUP_RETRY_STATUS_CODES
+            except requests.exceptions.Timeout:
+                succeeded = False
+            except requests.exceptions.RequestException:
+                # Nothing is listening: a sleeping host still accepts the connection, so waiting will not help.
+                break
+            if succeeded or time.monotonic() + delay >= window_end:
+                break
+            if self.lease:
+                self.lease.heartbeat_if_due([self.submission_id])
+            time.sleep(delay)
+            delay *= 2
+        self._record_warmup(started, attempts, succeeded)
+
+    def _warmup_window_end(self):
+        """When the warm-up must give up, or None when there should be no warm-up at all."""
+        if not settings.GRADING_WARMUP_ENABLED or self.breaker.open_diagnosis():
+            return None
+        window_end = min(
+            time.monotonic() + settings.GRADING_WARMUP_MAX_WAIT_SECONDS,
+            self.deadline - settings.GRADING_MIN_REQUEST_TIMEOUT_SECONDS,
         )
+        return window_end if window_end > time.monotonic() else None
+
+    def _record_warmup(self, started: float, attempts: int, succeeded: bool):
+        self.submission.warmup_succeeded = succeeded
+        self.submission.warmup_seconds = round(time.monotonic() - started, 3)
+        self.submission.warmup_attempts = attempts
+        self.trace.add("warmup", succeeded=succeeded, attempts=attempts, seconds=self.submission.warmup_seconds)
 
     def _execute_test_suite(self):
         """Iterates through tasks and their test cases."""
-        for task in self.project_tasks:
+        self._log_reused_results()
+        if self._uses_dependency_scheduling():
+            self._execute_planned_suite()
+            return
+
+        for task in self._tasks_to_run():
             self._run_tests_for_task(task)
             if self.is_submission_failed:
                 self.failed_task_name = task.name
@@ -113,85 +318,289 @@ class SubmissionTestRunnerService:
 
     def _run_tests_for_task(self, task):
         """Runs all test cases for a single task."""
-        test_cases = TestCase.objects.filter(task=task).order_by('order').select_related('api_details__endpoint')
-        if not test_cases.exists():
+        test_cases = self._get_test_cases(task)
+        if not test_cases:
             return
 
         for i, test_case in enumerate(test_cases):
+            if test_case.id in self.checkpointed_outcomes:
+                if not self.checkpointed_outcomes[test_case.id]:
+                    self.is_submission_failed = True
+                continue
             passed, feedback = self._run_single_test_case(test_case)
-            self._log_result(task, test_case, passed, feedback)
+            if self.lease:
+                self.lease.heartbeat_if_due([self.submission_id])
+            proceed = self._record_test_outcome(task, test_cases, i, passed, feedback)
+            self._save_checkpoint(test_case)
+            if not proceed:
+                break
+
+    def _uses_dependency_scheduling(self) -> bool:
+        """Planned runs start from the first test; a run resumed from a checkpoint goes on in order."""
+        return self.DEPENDENCY_SCHEDULING and settings.GRADING_DEPENDENCY_SCHEDULING and not self.checkpointed_outcomes
+
+    def _execute_planned_suite(self):
+        """
+        Runs the test cases along their dependency graph on up to
+        GRADING_MAX_PARALLEL_TESTS_PER_SUBMISSION threads (greenlets on the gevent grading
+        worker), so independent branches overlap, then reports the results in canonical
+        order. Results only exist once every test ran, so no checkpoint is saved; the time
+        the attempt spent is still added to the run's total for a retry.
+        """
+        planned = self._plan_suite()
+        outcomes, done, running = {}, set(), {}
+        waiting = list(planned)
+        try:
+            with ThreadPoolExecutor(max_workers=settings.GRADING_MAX_PARALLEL_TESTS_PER_SUBMISSION) as executor:
+                while waiting or running:
+                    for node in [node for node in waiting if node.dependencies <= done]:
+                        waiting.remove(node)
+                        # A failure upstream already decided that this result would never be reported.
+                        if node.index >= self._cutoff:
+                            done.add(node.index)
+                            continue
+                        produced = {}
+                        future = executor.submit(
+                            self._run_single_test_case, node.test_case, self._planned_context(node, outcomes), produced,
+                        )
+                        running[future] = (node, produced)
+                    if not running:
+                        continue
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        node, produced = running.pop(future)
+                        passed, feedback = future.result()
+                        self._record_planned_outcome(node, outcomes, passed, feedback, produced)
+                        done.add(node.index)
+                    if self.lease:
+                        self.lease.heartbeat_if_due([self.submission_id])
+        finally:
+            if self.CHECKPOINTS:
+                self.checkpoint.add_spent(self._spent_since_last_count())
+
+        self._report_planned_outcomes(planned, outcomes)
+
+    @property
+    def task_test_cases(self):
+        """The tasks left to run with their test cases, from the compiled plan loaded in `_setup`."""
+        tasks_to_run = {task.id for task in self._tasks_to_run()}
+        return [(task, test_cases) for task, test_cases in self.plan.task_test_cases if task.id in tasks_to_run]
+
+    def _plan_suite(self) -> List[PlannedTestCase]:
+        """Builds the dependency graph of the test cases left to run; nothing is cut off yet."""
+        planned = TestDependencyPlanner(self.task_test_cases).build()
+        self._cutoff = len(planned)
+        self._next_task_start = {}
+        for node in planned:
+            self._next_task_start[node.index] = next(
+                (later.index for later in planned[node.index:] if later.task.id != node.task.id), len(planned)
+            )
+        return planned
 
-            if not passed:
-                self.is_submission_failed = True
-                if test_case.stop_on_failure:
-                    self._skip_remaining_tests_in_task(task, test_cases[i + 1:])
+    def _planned_context(self, node: PlannedTestCase, outcomes: dict) -> dict:
+        """
+        The context a planned test case is resolved against. Values reused from a prior
+        submission come first; outputs of this run's dependencies override them.
+        """
+        context = dict(self.test_context)
+        for index in sorted(node.dependencies):
+            if index in outcomes:
+                context.update(outcomes[index][2])
+        return context
+
+    def _record_planned_outcome(self, node: PlannedTestCase, outcomes: dict, passed: bool, feedback: str, produced: dict):
+        """Keeps the outcome for reporting and cuts off what a sequential run would not have reached."""
+        outcomes[node.index] = (passed, feedback, produced)
+        if not passed:
+            end = node.index + 1 if node.test_case.stop_on_failure else self._next_task_start[node.index]
+            self._cutoff = min(self._cutoff, end)
+
+    def _report_planned_outcomes(self, planned: List[PlannedTestCase], outcomes: dict):
+        """Replays the outcomes in canonical order through the same rules as a sequential run."""
+        index_of = {node.test_case.id: node.index for node in planned}
+        for task, test_cases in self.task_test_cases:
+            for i, test_case in enumerate(test_cases):
+                passed, feedback, produced = outcomes[index_of[test_case.id]]
+                self.test_context.update(produced)
+                if not self._record_test_outcome(task, test_cases, i, passed, feedback):
                     break
+            if self.is_submission_failed:
+                self.failed_task_name = task.name
+                break
+
+    def _tasks_to_run(self) -> List[Task]:
+        """The tasks of the plan whose results are not reused from a prior submission."""
+        if not self.reusable_results:
+            return self.project_tasks
+        return [task for task in self.project_tasks if task.id not in self.reusable_results.results_by_task]
+
+    def _log_reused_results(self):
+        """Logs the results reused from a prior passing submission, in task order."""
+        if not self.reusable_results:
+            return
+        for task in self.project_tasks:
+            if task.id in self.reusable_results.results_by_task:
+                for entry in self.reusable_results.entries_for(task.id):
+                    self.total_points_earned += entry['points_earned']
+                    self._append_result(entry)
+
+    def _get_test_cases(self, task) -> List[TestCase]:
+        """Returns the ordered test cases of a task from the compiled test plan."""
+        return self.plan.test_cases_for(task)
+
+    def _record_test_outcome(self, task, test_cases: List[TestCase], index: int, passed: bool, feedback: str) -> bool:
+        """
+        Logs the result of the test case at `index` and applies the failure rules.
+        Returns False when the remaining test cases of the task must not run.
+        """
+        test_case = test_cases[index]
+        self._log_result(task, test_case, passed, feedback)
+
+        if not passed:
+            self.is_submission_failed = True
+            if test_case.stop_on_failure:
+                self._skip_remaining_tests_in_task(task, test_cases[index + 1:])
+                return False
+        return True
 
-    def _run_single_test_case(self, test_case: TestCase) -> (bool, str):
-        """Executes one test case and returns the result."""
+    def _run_single_test_case(self, test_case: TestCase, context: dict = None, produced: dict = None) -> (bool, str):
+        """
+        Executes one test case and returns the result. The request is resolved against
+        `context`, the run's context by default; values saved from the response go to
+        `produced`, by default `context` itself.
+        """
+        if context is None:
+            context = self.test_context
         try:
             if test_case.test_type == TestType.API_REQUEST:
-                passed, feedback, self.test_context = self._run_api_test(test_case, self.base_url, self.test_context)
+                passed, feedback, _ = self._run_api_test(test_case, self.base_url, context, produced)
                 return passed, feedback
             return False, f"Test type '{test_case.test_type}' is not supported."
         except Exception as e:
             logger.error(f"Critical error on test case {test_case.id} for submission {self.submission_id}: {e}", exc_info=True)
             return False, f"A critical error occurred: {str(e)}"
 
-    def _run_api_test(self, test_case: TestCase, base_url: str, context: dict) -> (bool, str, dict):
+    def _run_api_test(self, test_case: TestCase, base_url: str, context: dict, produced: dict = None) -> (bool, str, dict):
         """
-        Private helper with updated logic to handle explicit path_params.
+        Builds the request for an API test case, sends it and evaluates the response.
         """
-        api_details = test_case.api_details
-        path = api_details.endpoint.path
-
-        logger.info(f"--- Running Test Case: {test_case.name} ---")
-        logger.info(f"Initial context: {context}")
-
-        # --- NEW: Smart Path Substitution Logic ---
-        path_params = api_details.path_params or {}
-        for key, value in path_params.items():
-            placeholder = f"{{{key}}}"
-
-            # Check if value is a context variable placeholder like '{{context.id}}'
-            if isinstance(value, str) and '{{' in value and '}}' in value:
-                match = re.search(r'\{\{context\.(\w+)\}\}', value)
-                if match:
-                    context_key = match.group(1)
-                    if context_key in context:
-                        path = path.replace(placeholder, str(context[context_key]))
-                    else:
-                        logger.error(f"Context variable '{{{{context.{context_key}}}}}' not found. Current context: {context}")
-                        return False, f"Test failed: Context variable '{context_key}' not found for path parameter.", context
-                else:
-                    return False, f"Test failed: Invalid context variable format '{value}'.", context
-            else:
-                # It's a literal value, just substitute it
-                path = path.replace(placeholder, str(value))
-
-        full_url = f"{base_url}{path}"
-        method = api_details.endpoint.method
-        logger.info("-----------------------------starting API test----------------------------------")
-        logger.info(f"Running API test for URL: {full_url}")
-        logger.info(f"Using method: {method}")
-        logger.info(f"Request Payload: {api_details.request_payload}")
-
+        timeout = self._request_timeout()
+        if timeout is None:
+            return False, self._budget_exhausted_feedback(), context
+        diagnosis = self.breaker.open_diagnosis()
+        if diagnosis:
+            return False, self._not_run_feedback(diagnosis), context
+
+        request_kwargs, error = self._build_request(test_case, base_url, context)
+        if error:
+            return False, error, context
+
+        started = time.monotonic()
         try:
-            response = requests.request(
-                method=method,
-                url=full_url,
-                headers=api_details.request_headers,
-                json=api_details.request_payload,
-                timeout=10,
-                allow_redirects=False
+            response = get_session_pool().session_for(request_kwargs['url']).request(
+                **request_kwargs,
+                timeout=timeout,
+                allow_redirects=False,
+                stream=True,
+            )
+            response = GradingResponse.read(
+                response, settings.GRADING_MAX_RESPONSE_BYTES, started + timeout, self.response_budget,
             )
-            actual_status_code = response.status_code
-            #    logs response details
-            logger.info(f"Received response with status code: {actual_status_code}")
-            logger.info(f"Response Payload: {response.text}")
-            logger.info("------------------------------- End of API test----------------------------------")
         except requests.exceptions.RequestException as e:
-            return False, f"Failed to connect to API at {full_url}. Error: {e}", context
+            self._record_exchange(test_case, started, error=e)
+            if self._is_host_failure(
+                isinstance(e, requests.exceptions.ConnectionError), isinstance(e, requests.exceptions.Timeout), timeout,
+            ):
+                self.breaker.record_failure(str(e))
+            return False, f"Failed to connect to API at {request_kwargs['url']}. Error: {e}", context
+        self._record_exchange(test_case, started, response)
+        self.breaker.record_success()
+
+        passed, feedback = self._evaluate_response(test_case, response, context if produced is None else produced)
+        return passed, feedback, context
+
+    @staticmethod
+    def _not_run_feedback(diagnosis: str) -> str:
+        return f"Not run: {diagnosis}."
+
+    def _budget_exhausted_feedback(self) -> str:
+        return self._not_run_feedback(
+            f"budget exhausted, the submission's time budget of {self.time_budget_seconds} seconds was used up"
+        )
+
+    def _request_timeout(self):
+        """
+        The timeout of the next request: REQUEST_TIMEOUT_SECONDS while the remaining budget
+        allows that much for every test left. Otherwise the remaining budget is shared among
+        them, though never below a multiple of the host's slowest response so far, and never
+        past the submission's deadline. Returns None when too little of the budget is left to
+        start another request.
+        """
+        remaining = self.deadline - time.monotonic()
+        if remaining < settings.GRADING_MIN_REQUEST_TIMEOUT_SECONDS:
+            return None
+        timeout = self.REQUEST_TIMEOUT_SECONDS
+        tests_left = max(self.plan.test_case_count - len(self.full_results_log), 1)
+        if remaining < timeout * tests_left:
+            share = max(remaining / tests_left, settings.GRADING_MIN_REQUEST_TIMEOUT_SECONDS)
+            if self.slowest_response_seconds is not None:
+                share = max(share, self.slowest_response_seconds * settings.GRADING_TIMEOUT_LATENCY_MULTIPLIER)
+            timeout = min(timeout, share)
+        return min(timeout, remaining)
+
+    def _is_host_failure(self, connection_failed: bool, timed_out: bool, timeout: float) -> bool:
+        """
+        Whether a failed request counts against the host's circuit breaker. A timeout cut
+        below REQUEST_TIMEOUT_SECONDS to fit the budget does not: the host may just be slow.
+        """
+        if timed_out:
+            return timeout >= self.REQUEST_TIMEOUT_SECONDS
+        return connection_failed
+
+    def _record_exchange(self, test_case: TestCase, started: float, response: GradingResponse = None, error: Exception = None):
+        duration = time.monotonic() - started
+        self.recording.record(test_case.id, int(duration * 1000), response, error)
+        self.trace.add(
+            "response", test_case=test_case.name, duration_ms=int(duration * 1000),
+            status_code=response.status_code if response is not None else None,
+            body=response.content if response is not None else None,
+            error=repr(error) if error is not None else None,
+        )
+        if response is not None:
+            self.response_bytes_read += len(response.content)
+            self.slowest_response_seconds = max(self.slowest_response_seconds or 0, duration)
+        self.test_metrics[test_case.id] = {
+            "duration_ms": int(duration * 1000),
+            "status_code": response.status_code if response is not None else None,
+        }
+
+    def _build_request(self, test_case: TestCase, base_url: str, context: dict) -> (Dict[str, Any], str):
+        """
+        Renders the compiled request template of an API test case against the test context.
+        Returns the keyword arguments of the HTTP request, or an error message if a
+        referenced context variable is missing.
+        """
+        try:
+            request_kwargs = self.plan.compiled_test_case(test_case).request_template.render(base_url, context)
+        except TemplateError as e:
+            self.trace.add("template_error", test_case=test_case.name, error=str(e), context=dict(context))
+            return None, str(e)
+
+        self.trace.add(
+            "request", test_case=test_case.name, method=request_kwargs['method'], url=request_kwargs['url'],
+            params=request_kwargs.get('params'), payload=request_kwargs['json'], context=dict(context),
+        )
+        return request_kwargs, None
+
+    def _evaluate_response(self, test_case: TestCase, response: GradingResponse, context: dict) -> (bool, str):
+        """
+        Checks a response against the expectations of an API test case and saves the
+        body of successful POST requests into the test context.
+        Bodies are quoted in feedback only as capped snippets.
+        """
+        api_details = test_case.api_details
+        method = api_details.endpoint.method
+        actual_status_code = response.status_code
 
         # If status code is not what we expect, we fail and include the response body in the feedback.
         if actual_status_code != api_details.expected_status_code:
@@ -200,9 +609,12 @@ class SubmissionTestRunnerService:
             else:
                 feedback = (
                     f"Status Code Mismatch. Expected {api_details.expected_status_code}, but got {actual_status_code}. "
-                    f"Response: {response.text}"
+                    f"Response: {response.snippet()}"
                 )
-            return False, feedback, context
+            return False, feedback
+
+        if response.truncated:
+            return False, f"{response.truncation_message} Received: {response.snippet()}"
 
         try:
             response_json = response.json() if response.content else None
@@ -210,27 +622,27 @@ class SubmissionTestRunnerService:
             # If JSON is expected but not received, we fail and include the raw text.
             feedback = (
                 "The API response was not valid JSON, although it was expected to be. "
-                f"Received: {response.text}"
+                f"Received: {response.snippet()}"
             )
-            return False, feedback, context
+            return False, feedback
 
         is_valid, schema_feedback = self._validate_json_schema(
             instance=response_json,
-            schema=api_details.expected_response_schema
+            schema=api_details.expected_response_schema,
+            validator=self.plan.compiled_test_case(test_case).schema_validator
         )
 
         if not is_valid:
             # Append the actual response to the schema feedback.
-            full_feedback = f"{schema_feedback} Received response: {response_json}"
-            return False, full_feedback, context
+            full_feedback = f"{schema_feedback} Received response: {truncate_text(str(response_json))}"
+            return False, full_feedback
 
         if method == 'POST' and actual_status_code == 201 and response_json:
-            logger.info(f"Saving to context from POST response: {response_json}")
             for key, value in response_json.items():
                 context[key] = value
-            logger.info(f"Updated context: {context}")
+            self.trace.add("context_updated", test_case=test_case.name, keys=list(response_json))
 
-        return True, "Test passed: Status code and response schema are correct.", context
+        return True, "Test passed: Status code and response schema are correct."
 
     def _log_result(self, task: 'Task', test_case: TestCase, passed: bool, feedback: str):
         """Appends a result to the log."""
@@ -238,31 +650,104 @@ class SubmissionTestRunnerService:
         if passed:
             self.total_points_earned += points_earned
 
-        self.full_results_log.append({
+        metrics = self.test_metrics.get(test_case.id, {})
+        self.trace.add("result", test_case=test_case.name, passed=passed, feedback=feedback)
+        self._append_result({
             "task_id": task.id, "task_name": task.name,
             "test_case_id": test_case.id, "name": test_case.name,
             "passed": passed, "points_earned": points_earned,
             "feedback": feedback,
+            "duration_ms": metrics.get("duration_ms"), "status_code": metrics.get("status_code"),
         })
 
     def _skip_remaining_tests_in_task(self, task: 'Task', skipped_tests: List[TestCase]):
         """Logs skipped test cases for a task."""
         for test_case in skipped_tests:
-            self.full_results_log.append({
+            self._append_result({
                 "task_id": task.id, "task_name": task.name,
                 "test_case_id": test_case.id, "name": test_case.name,
                 "passed": False, "points_earned": 0,
                 "feedback": "Skipped due to a critical failure in the same task.",
             })
 
+    def _append_result(self, entry: dict):
+        """Adds an entry to the execution log and streams it to clients watching the run."""
+        self.full_results_log.append(entry)
+        self.events.publish(submission_events.RESULT, entry)
+
     def _finalize_submission(self):
-        """Updates and saves the submission model."""
-        self.submission.execution_logs = self.full_results_log
+        """Updates and saves the submission model and its per-test results."""
+        self.submission.test_context = self.test_context
         self.submission.passed_tests = len([res for res in self.full_results_log if res['passed']])
         self.submission.passed_percentage = (self.total_points_earned / self.total_possible_points) * 100 if self.total_possible_points > 0 else 0
         self.submission.status = 'failed' if self.is_submission_failed else 'passed'
-        self.submission.completed_at = timezone.now()
-        self.submission.save()
+        self.submission.completed_at = self._completion_time()
+        self._store_trace()
+        self._store_recording()
+        logger.info(
+            f"Submission {self.submission_id} {self.submission.status}: "
+            f"{self.submission.passed_tests}/{len(self.full_results_log)} tests, "
+            f"{self.total_points_earned}/{self.total_possible_points} points "
+            f"in {time.monotonic() - self._started:.2f}s"
+        )
+        if self.persist:
+            with transaction.atomic():
+                self.submission.save()
+                self.store_test_results([self])
+                # Only once the results are stored: a failed write still resumes from the checkpoint on retry.
+                transaction.on_commit(self._clear_checkpoint)
+            self.publish_finished()
+        else:
+            self._clear_checkpoint()
+
+    def _clear_checkpoint(self):
+        if self.CHECKPOINTS:
+            self.checkpoint.clear()
+
+    def _completion_time(self):
+        return timezone.now()
+
+    def _store_trace(self):
+        """Attaches the debug trace to failed submissions, or to every submission of projects with debug_grading."""
+        if not (self.is_submission_failed or self.submission.task.project.debug_grading):
+            return
+        try:
+            self.submission.trace_artifact.save(
+                f"submission-{self.submission_id}.jsonl.gz", ContentFile(self.trace.to_gzip()), save=False
+            )
+        except Exception as e:
+            logger.warning(f"Could not store the grading trace of submission {self.submission_id}: {e}")
+
+    def _store_recording(self):
+        """Attaches the recorded exchanges, replayable by ReplaySubmissionTestRunnerService."""
+        if not (settings.GRADING_RECORD_EXCHANGES and self.recording):
+            return
+        try:
+            self.submission.recording.save(
+                f"submission-{self.submission_id}.json.gz", ContentFile(self.recording.to_gzip()), save=False
+            )
+        except Exception as e:
+            logger.warning(f"Could not store the exchange recording of submission {self.submission_id}: {e}")
+
+    def build_test_results(self) -> List[SubmissionTestResult]:
+        return [
+            SubmissionTestResult.from_log_entry(self.submission, order, entry)
+            for order, entry in enumerate(self.full_results_log)
+        ]
+
+    @staticmethod
+    def store_test_results(runners: List['SubmissionTestRunnerService']):
+        """Replaces the stored results of the runners' submissions with a single bulk insert."""
+        SubmissionTestResult.objects.filter(submission__in=[runner.submission for runner in runners]).delete()
+        SubmissionTestResult.objects.bulk_create([result for runner in runners for result in runner.build_test_results()])
+
+    def publish_finished(self):
+        """Tells clients watching the run that the final results are stored."""
+        self.events.publish(submission_events.FINISHED, {
+            "status": self.submission.status,
+            "passed_tests": self.submission.passed_tests,
+            "passed_percentage": self.submission.passed_percentage,
+        })
 
     def _get_status_message(self) -> str:
         """Generates a status message based on the submission results."""
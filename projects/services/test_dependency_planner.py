@@ -0,0 +1,146 @@
+import re
+from typing import Any, List, Optional, Set, Tuple
+
+from projects.models import TestCase, TestType
+
+CONTEXT_REFERENCE_PATTERN = re.compile(r'\{\{context\.(\w+)\}\}')
+
+
+def find_context_references(value: Any) -> Set[str]:
+    """Returns the context keys referenced as '{{context.x}}' anywhere inside a JSON value."""
+    if isinstance(value, str):
+        return set(CONTEXT_REFERENCE_PATTERN.findall(value))
+    if isinstance(value, dict):
+        value = list(value.keys()) + list(value.values())
+    if isinstance(value, (list, tuple)):
+        keys = set()
+        for item in value:
+            keys |= find_context_references(item)
+        return keys
+    return set()
+
+
+class PlannedTestCase:
+    """A test case of a submission run together with the test cases it must wait for."""
+
+    def __init__(self, index: int, task, test_case: TestCase):
+        self.index = index
+        self.task = task
+        self.test_case = test_case
+        self.consumes = set()
+        # None means the test case may write any key into the context.
+        self.produces = set()
+        self.is_producer = False
+        self.is_mutating = False
+        self.resource = None
+        self.dependencies = set()
+
+    def may_produce(self, key: str) -> bool:
+        return self.is_producer and (self.produces is None or key in self.produces)
+
+    def __repr__(self):
+        return f"<PlannedTestCase {self.index}: {self.test_case.name} after {sorted(self.dependencies)}>"
+
+
+class TestDependencyPlanner:
+    """
+    Builds the dependency graph (a DAG over canonical positions) of the test cases of a
+    submission so that independent branches can run concurrently.
+
+    A test case waits for:
+      * every earlier test case that may write a context key it reads
+        (a POST expecting 201, whose response body is merged into the context);
+      * the previous test case reading one of the same context keys, since both
+        address the same resource instance;
+      * on the same resource collection, the last earlier mutating test case, and for
+        a mutating test case also every read since then.
+
+    A test case is mutating when it is not a GET and expects a non-error status code;
+    negative-path tests are treated as reads. Results are reported in canonical order, so
+    a read may run past a failure that would have stopped a sequential run and is then
+    discarded. Writes are never sent that way: a mutating test case also waits for every
+    earlier test case whose failure would skip it (those of earlier tasks and the
+    stop_on_failure ones of its own task), and the runner does not start it once one failed.
+    """
+
+    def __init__(self, task_test_cases: List[Tuple[Any, List[TestCase]]]):
+        self.task_test_cases = task_test_cases
+
+    def build(self) -> List[PlannedTestCase]:
+        planned = []
+        for task, test_cases in self.task_test_cases:
+            for test_case in test_cases:
+                node = PlannedTestCase(len(planned), task, test_case)
+                self._describe(node)
+                planned.append(node)
+
+        self._add_edges(planned)
+        self._gate_mutations(planned)
+        return planned
+
+    def _describe(self, node: PlannedTestCase):
+        """Infers what a test case reads from and writes to the context and which resource it touches."""
+        test_case = node.test_case
+        if test_case.test_type != TestType.API_REQUEST:
+            return
+
+        api_details = test_case.api_details
+        method = api_details.endpoint.method
+        node.consumes = (
+            find_context_references(api_details.path_params)
+            | find_context_references(api_details.query_params)
+            | find_context_references(api_details.request_payload)
+            | find_context_references(api_details.request_headers)
+        )
+        node.is_producer = method == 'POST' and api_details.expected_status_code == 201
+        node.produces = self._produced_keys(api_details.expected_response_schema) if node.is_producer else set()
+        node.is_mutating = method != 'GET' and api_details.expected_status_code < 400
+        node.resource = self._resource_of(api_details.endpoint.path)
+
+    @staticmethod
+    def _produced_keys(schema: Optional[dict]) -> Optional[Set[str]]:
+        """The keys a producer can write are only known when its schema forbids extra properties."""
+        if isinstance(schema, dict) and schema.get('additionalProperties') is False:
+            return set((schema.get('properties') or {}).keys())
+        return None
+
+    @staticmethod
+    def _resource_of(path: str) -> str:
+        segments = [segment for segment in path.strip('/').split('/') if segment]
+        return segments[0] if segments else '/'
+
+    @staticmethod
+    def _add_edges(planned: List[PlannedTestCase]):
+        last_reader_of_key = {}
+        last_write_on_resource = {}
+        reads_since_write = {}
+
+        for node in planned:
+            for earlier in planned[:node.index]:
+                if any(earlier.may_produce(key) for key in node.consumes):
+                    node.dependencies.add(earlier.index)
+
+            for key in node.consumes:
+                if key in last_reader_of_key:
+                    node.dependencies.add(last_reader_of_key[key])
+                last_reader_of_key[key] = node.index
+
+            if node.resource is None:
+                continue
+            if node.resource in last_write_on_resource:
+                node.dependencies.add(last_write_on_resource[node.resource])
+            if node.is_mutating:
+                node.dependencies.update(reads_since_write.get(node.resource, []))
+                last_write_on_resource[node.resource] = node.index
+                reads_since_write[node.resource] = []
+            else:
+                reads_since_write.setdefault(node.resource, []).append(node.index)
+
+    @staticmethod
+    def _gate_mutations(planned: List[PlannedTestCase]):
+        for node in planned:
+            if not node.is_mutating:
+                continue
+            for earlier in planned[:node.index]:
+                if earlier.task.id != node.task.id or earlier.test_case.stop_on_failure:
+                    node.dependencies.add(earlier.index)
@@ -0,0 +1,213 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from projects.models import ApiTestCase, Endpoint, Task, TestCase, TestType
+from projects.services.request_templates import RequestTemplate
+from projects.services.schema_validator_registry import SchemaValidatorRegistry
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+class CompiledTestCase:
+    """A test case with everything the runner needs resolved ahead of time."""
+
+    def __init__(self, task: Task, test_case: TestCase):
+        self.task = task
+        self.test_case = test_case
+        self.path_template = None
+        self.request_template = None
+        self.schema_validator = None
+
+        if test_case.test_type == TestType.API_REQUEST:
+            api_details = test_case.api_details
+            self.request_template = RequestTemplate(api_details)
+            self.path_template = self.request_template.path_template
+            schema = api_details.expected_response_schema
+            if isinstance(schema, dict) and schema:
+                self.schema_validator = SchemaValidatorRegistry.get(api_details.pk, schema)
+
+
+class CompiledTestPlan:
+    """
+    The ordered test cases of every task of a project up to a given task order,
+    with resolved endpoints, pre-split path templates, schema validators and total points.
+    """
+
+    def __init__(self, project_id: int, task_order: int, version: Optional[str], task_test_cases: List[Tuple[Task, List[TestCase]]]):
+        self.project_id = project_id
+        self.task_order = task_order
+        self.version = version
+        self.task_test_cases = task_test_cases
+        self.tasks = [task for task, _ in task_test_cases]
+        self.total_points = sum(test_case.points for _, test_cases in task_test_cases for test_case in test_cases)
+        self.test_case_count = sum(len(test_cases) for _, test_cases in task_test_cases)
+        self.compiled = {
+            test_case.id: CompiledTestCase(task, test_case)
+            for task, test_cases in task_test_cases for test_case in test_cases
+        }
+        self._test_cases_by_task = {task.id: test_cases for task, test_cases in task_test_cases}
+
+    def test_cases_for(self, task: Task) -> List[TestCase]:
+        return self._test_cases_by_task.get(task.id, [])
+
+    def compiled_test_case(self, test_case: TestCase) -> Optional[CompiledTestCase]:
+        return self.compiled.get(test_case.id)
+
+
+class TestPlanService:
+    """
+    Builds compiled test plans and caches them in two tiers: an in-process LRU and the
+    shared Django cache (Redis). Entries are keyed by a per-project version token that is
+    replaced by a new random one whenever the project's tasks, endpoints or test cases
+    change, so stale plans are never served and never need to be deleted one by one.
+    Tokens never repeat, even after the version key is evicted. When the version cannot
+    be read, both tiers are skipped and the plan is loaded from the database.
+    The shared tier holds the field values of the rows, not pickled model instances.
+    """
+
+    _local_plans = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_plan(cls, project_id: int, task_order: int) -> CompiledTestPlan:
+        version = cls._get_version(project_id)
+        if version is None:
+            return CompiledTestPlan(project_id, task_order, None, cls._load_task_test_cases(project_id, task_order))
+        local_key = (project_id, task_order, version)
+
+        with cls._lock:
+            plan = cls._local_plans.get(local_key)
+            if plan is not None:
+                cls._local_plans.move_to_end(local_key)
+                return plan
+
+        task_test_cases = cls._get_shared(project_id, task_order, version)
+        if task_test_cases is None:
+            task_test_cases = cls._load_task_test_cases(project_id, task_order)
+            cls._set_shared(project_id, task_order, version, task_test_cases)
+
+        plan = CompiledTestPlan(project_id, task_order, version, task_test_cases)
+        with cls._lock:
+            cls._local_plans[local_key] = plan
+            cls._local_plans.move_to_end(local_key)
+            while len(cls._local_plans) > settings.GRADING_PLAN_CACHE_SIZE:
+                cls._local_plans.popitem(last=False)
+        return plan
+
+    @classmethod
+    def invalidate(cls, project_id: int):
+        """Makes every cached plan of the project stale, in this process and in all others."""
+        with cls._lock:
+            for key in [key for key in cls._local_plans if key[0] == project_id]:
+                del cls._local_plans[key]
+        try:
+            cache.set(cls._version_key(project_id), uuid.uuid4().hex, timeout=None)
+        except Exception as e:
+            logger.warning(f"Could not bump the test plan version of project {project_id}: {e}")
+
+    @classmethod
+    def invalidate_on_commit(cls, project_id: int):
+        transaction.on_commit(lambda: cls.invalidate(project_id))
+
+    @staticmethod
+    def _load_task_test_cases(project_id: int, task_order: int) -> List[Tuple[Task, List[TestCase]]]:
+        """Loads the tasks with their test cases, API details and endpoints in one prefetching query."""
+        tasks = Task.objects.filter(project_id=project_id, order__lte=task_order).order_by('order').prefetch_related(
+            Prefetch(
+                'test_cases',
+                queryset=TestCase.objects.order_by('order').select_related('api_details__endpoint'),
+            )
+        )
+        return [(task, list(task.test_cases.all())) for task in tasks]
+
+    @staticmethod
+    def _version_key(project_id: int) -> str:
+        return f"grading:test-plan-version:{project_id}"
+
+    @staticmethod
+    def _plan_key(project_id: int, task_order: int, version: int) -> str:
+        return f"grading:test-plan:{project_id}:{task_order}:{version}"
+
+    @classmethod
+    def _get_version(cls, project_id: int) -> Optional[str]:
+        """The project's current version token, starting a new one if there is none, or None without the cache."""
+        key = cls._version_key(project_id)
+        try:
+            version = cache.get(key)
+            if version is None:
+                # Whichever process adds the token first wins; the others read it back.
+                cache.add(key, uuid.uuid4().hex, timeout=None)
+                version = cache.get(key)
+            return version
+        except Exception as e:
+            logger.warning(f"Could not read the test plan version of project {project_id}: {e}")
+            return None
+
+    @classmethod
+    def _get_shared(cls, project_id: int, task_order: int, version: str):
+        try:
+            data = cache.get(cls._plan_key(project_id, task_order, version))
+        except Exception as e:
+            logger.warning(f"Could not read the shared test plan of project {project_id}: {e}")
+            return None
+        return cls._from_primitives(data) if data is not None else None
+
+    @classmethod
+    def _set_shared(cls, project_id: int, task_order: int, version: str, task_test_cases):
+        try:
+            cache.set(
+                cls._plan_key(project_id, task_order, version), cls._to_primitives(task_test_cases),
+                timeout=settings.GRADING_PLAN_CACHE_TIMEOUT,
+            )
+        except Exception as e:
+            logger.warning(f"Could not store the shared test plan of project {project_id}: {e}")
+
+    @staticmethod
+    def _field_values(instance) -> dict:
+        return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+    @staticmethod
+    def _from_field_values(model, values: dict):
+        return model.from_db('default', list(values), list(values.values()))
+
+    @classmethod
+    def _to_primitives(cls, task_test_cases: List[Tuple[Task, List[TestCase]]]) -> List[dict]:
+        data = []
+        for task, test_cases in task_test_cases:
+            entries = []
+            for test_case in test_cases:
+                try:
+                    api_details = test_case.api_details
+                except ApiTestCase.DoesNotExist:
+                    api_details = None
+                entries.append({
+                    "test_case": cls._field_values(test_case),
+                    "api_details": cls._field_values(api_details) if api_details else None,
+                    "endpoint": cls._field_values(api_details.endpoint) if api_details else None,
+                })
+            data.append({"task": cls._field_values(task), "test_cases": entries})
+        return data
+
+    @classmethod
+    def _from_primitives(cls, data: List[dict]) -> List[Tuple[Task, List[TestCase]]]:
+        """Rebuilds the rows loaded by _load_task_test_cases, with their related objects cached."""
+        task_test_cases = []
+        for item in data:
+            task = cls._from_field_values(Task, item['task'])
+            test_cases = []
+            for entry in item['test_cases']:
+                test_case = cls._from_field_values(TestCase, entry['test_case'])
+                if entry['api_details'] is not None:
+                    api_details = cls._from_field_values(ApiTestCase, entry['api_details'])
+                    api_details.endpoint = cls._from_field_values(Endpoint, entry['endpoint'])
+                    test_case.api_details = api_details
+                test_cases.append(test_case)
+            task_test_cases.append((task, test_cases))
+        return task_test_cases
@@ -0,0 +1,47 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from projects.models import ApiTestCase, Endpoint, Task, TestCase
+from projects.services.project_totals_service import ProjectTotalsService
+from projects.services.test_plan_service import TestPlanService
+
+
+def _project_id_of(instance):
+    """Returns the project a grading-related object belongs to, or None if it is already gone."""
+    try:
+        if isinstance(instance, Task):
+            return instance.project_id
+        if isinstance(instance, (TestCase, Endpoint)):
+            return instance.task.project_id
+        if isinstance(instance, ApiTestCase):
+            return instance.test_case.task.project_id
+    except ObjectDoesNotExist:
+        return None
+    return None
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TestCase)
+@receiver(post_save, sender=ApiTestCase)
+@receiver(post_save, sender=Endpoint)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=TestCase)
+@receiver(post_delete, sender=ApiTestCase)
+@receiver(post_delete, sender=Endpoint)
+def invalidate_test_plans(sender, instance, **kwargs):
+    """Drops the compiled test plans of a project whenever its grading definition changes."""
+    project_id = _project_id_of(instance)
+    if project_id is not None:
+        TestPlanService.invalidate_on_commit(project_id)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TestCase)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=TestCase)
+def refresh_project_totals(sender, instance, **kwargs):
+    """Keeps the point totals and test counts of a project in step with its test cases and task order."""
+    project_id = _project_id_of(instance)
+    if project_id is not None:
+        ProjectTotalsService.refresh_on_commit(project_id)
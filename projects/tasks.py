@@ -1,7 +1,8 @@
 # projects/tasks.py
 
 from celery import shared_task
-from projects.models.submission import Submission, FAILED
+from django.conf import settings
+from projects.models.submission import Submission, FAILED, PENDING, RUNNING
 from utils.logging_utils import get_logger
 import json
 from django.core.exceptions import ObjectDoesNotExist
@@ -15,7 +16,7 @@ from projects.services.project_generator import AIPoweredProjectGenerator
 logger = get_logger(__name__)
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=300)
+@shared_task(bind=True, max_retries=3, default_retry_delay=300, acks_late=True)
 def generate_project_draft_task(self, draft_id: int):
     """
     Celery task to generate or refine a project draft.
@@ -44,36 +45,133 @@ def generate_project_draft_task(self, draft_id: int):
         raise self.retry(exc=e)
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+@shared_task(bind=True, max_retries=3, default_retry_delay=60, acks_late=True, reject_on_worker_lost=True)
 def run_submission_tests(self, submission_id: int):
     """
     Celery task to run tests for a submission.
     It uses SubmissionTestRunner to encapsulate the logic.
     """
+    from projects.services.submission_lease_service import SubmissionLeaseService
     from projects.services.submissions_services import SubmissionTestRunnerService
+    lease = SubmissionLeaseService()
+    if not lease.claim([submission_id]):
+        logger.info(f"Submission {submission_id} is graded, claimed by another worker or missing; skipping.")
+        # A submission another worker holds keeps its team's slot until that worker is done.
+        if not Submission.objects.filter(id=submission_id, status__in=[PENDING, RUNNING]).exists():
+            _release_fair_share_slot(submission_id)
+        return f"Submission {submission_id} was not claimed."
+    final_attempt = True
     try:
-        runner = SubmissionTestRunnerService(submission_id)
+        runner = SubmissionTestRunnerService(submission_id, lease=lease)
         return runner.run()
     except Submission.DoesNotExist:
         logger.warning(f"Submission with id {submission_id} does not exist.")
     except Exception as e:
         logger.error(f"An unexpected error occurred for submission_id {submission_id}: {e}")
-        try:
-            submission = Submission.objects.get(id=submission_id)
-            submission.status = FAILED
-            submission.fail_message = "Internal Server Error"
-            submission.save()
-        except Submission.DoesNotExist:
-            logger.warning(f"Submission with id {submission_id} does not exist for error update.")
+        # Give the submission back so the retry can claim it; only the last attempt fails it.
+        final_attempt = self.request.retries >= self.max_retries
+        if final_attempt:
+            Submission.objects.filter(id=submission_id).update(status=FAILED, fail_message="Internal Server Error")
+        else:
+            Submission.objects.filter(id=submission_id).update(status=PENDING)
         raise self.retry(exc=e)
+    finally:
+        # A retried run keeps its team's slot until it is finally done.
+        if final_attempt:
+            _release_fair_share_slot(submission_id)
+
+
+def _release_fair_share_slot(submission_id: int):
+    if settings.GRADING_FAIR_SHARE_ENABLED:
+        from projects.services.fair_share_dispatcher import FairShareDispatcher
+        FairShareDispatcher().release(submission_id)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def run_submission_tests_async(submission_ids: list):
+    """
+    Celery task to run the tests of many submissions concurrently on one event loop.
+    Suited for grading bursts where most of the time is spent waiting on student APIs.
+    """
+    from projects.services.async_submission_runner import AsyncGradingEngine
+    from projects.services.submission_lease_service import SubmissionLeaseService
+    lease = SubmissionLeaseService()
+    return AsyncGradingEngine(lease=lease).run(lease.claim(submission_ids))
+
+
+@shared_task
+def run_pending_submissions_batch(batch_size: int = None):
+    """
+    Celery task that claims a batch of pending submissions and grades them together.
+    Used instead of one run_submission_tests per submission when GRADING_DISPATCH_MODE is 'batch'.
+    """
+    from projects.services.batch_grading_service import BatchGradingService
+    return BatchGradingService(batch_size).run()
 
 
 @shared_task
 def requeue_stuck_submissions():
     """
-    Finds submissions that have been in the pending state for too long and re-queues them.
+    Re-queues the running submissions whose worker lease expired, i.e. whose worker died
+    or hung, and the pending submissions older than GRADING_PENDING_REQUEUE_SECONDS whose
+    queue message was lost. Submissions that are still queued or being graded are left alone.
+    """
+    from projects.services.grading_priority import GradingPriority
+    from projects.services.submission_lease_service import SubmissionLeaseService
+    expired_ids = SubmissionLeaseService.release_expired_leases()
+    if settings.GRADING_DISPATCH_MODE == 'batch':
+        # Batches claim every pending submission, so there are no queue messages to lose.
+        if expired_ids:
+            logger.info(f"Re-queueing submissions with expired leases: {expired_ids}")
+            run_pending_submissions_batch.delay()
+        return
+
+    lost_ids = _find_lost_pending_submissions(exclude=expired_ids)
+    if expired_ids:
+        logger.info(f"Re-queueing submissions with expired leases: {expired_ids}")
+    if lost_ids:
+        logger.info(f"Re-queueing pending submissions whose queue message was lost: {lost_ids}")
+    for submission_id, options in GradingPriority.queue_options(expired_ids + lost_ids).items():
+        run_submission_tests.apply_async((submission_id,), **options)
+
+
+def _find_lost_pending_submissions(exclude: list) -> list:
+    """The stale pending submissions that no queue holds anymore."""
+    stale = Submission.get_stale_pending(settings.GRADING_PENDING_REQUEUE_SECONDS).exclude(id__in=exclude)
+    stale = list(stale.order_by('created_at').values_list('id', 'team_id'))
+    if not settings.GRADING_FAIR_SHARE_ENABLED:
+        return [submission_id for submission_id, _ in stale]
+    from projects.services.fair_share_dispatcher import FairShareDispatcher
+    dispatcher = FairShareDispatcher()
+    return [submission_id for submission_id, team_id in stale if not dispatcher.holds(team_id, submission_id)]
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def regrade_submissions_chunk(regrade_id: int, submission_ids: list):
+    """
+    Celery task that regrades a chunk of a Regrade by replaying the submissions' recorded exchanges.
+    Runs on its own regrade queue so regrades never hold grading workers nor the
+    maintenance worker that dispatches the fair-share queue.
+    """
+    from projects.services.regrade_service import RegradeService
+    return RegradeService.regrade_chunk(regrade_id, submission_ids)
+
+
+@shared_task
+def dispatch_fair_share_queue():
+    """
+    Celery beat task that releases waiting submissions to the grading queue in case a
+    finished run could not (its release failed, or its slot went stale).
+    """
+    from projects.services.fair_share_dispatcher import FairShareDispatcher
+    return len(FairShareDispatcher().dispatch())
+
+
+@shared_task
+def reprioritize_grading_runs():
+    """
+    Celery beat task that queues the submissions still waiting for a grading run again
+    at the priority they have aged to.
     """
-    stuck_submissions = Submission.get_stuck_submissions()
-    for submission in stuck_submissions:
-        logger.info(f"Re-queueing submission {submission.id} which is stuck in pending state.")
-        run_submission_tests.delay(submission.id)
+    from projects.services.grading_priority import GradingPriority
+    return len(GradingPriority.reprioritize_waiting())
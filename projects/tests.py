@@ -1,4 +1,13 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+import time
+from unittest import mock
+
+import httpx
+import requests
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.db.utils import IntegrityError
 from projects.models.projects import Project, TeamProject
 from projects.models.categories_difficulties import Category, DifficultyLevel
@@ -498,8 +507,8 @@ class SubmissionModelTest(TestCase):
         self.assertIn('passed', str(submission))
         self.assertIn('http://example.com', str(submission))
 
-    def test_get_stuck_submissions(self):
-        """Test get_stuck_submissions returns submissions pending for too long."""
+    def test_get_stale_pending(self):
+        """Test get_stale_pending returns submissions pending for too long."""
         old_submission = Submission.objects.create(
             project=self.project,
             task=self.task,
@@ -511,8 +520,8 @@ class SubmissionModelTest(TestCase):
             passed_percentage=0,
             created_at=timezone.now() - timezone.timedelta(minutes=10),
         )
-        stuck = Submission.get_stuck_submissions(timeout_minutes=5)
-        self.assertIn(old_submission, stuck)
+        stale = Submission.get_stale_pending(5 * 60)
+        self.assertIn(old_submission, stale)
 
     def test_cascade_delete_user(self):
         """Test that deleting a user cascades and deletes related submissions."""
@@ -1048,3 +1057,1185 @@ class SubmissionViewSetAPITest(APITestCase):
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_duplicate_submission_is_coalesced(self):
+        """Test that resubmitting while a run of the same task and URL is pending reuses that submission."""
+        from projects.services.submissions_services import SubmissionService
+
+        self.submission.deployment_url = 'http://team.example.com'
+        self.submission.save()
+        team_project = TeamProject.objects.create(
+            team=self.team, project=self.project, deployment_url='http://team.example.com',
+        )
+        validated_data = {
+            'project': self.project, 'task': self.task, 'team': self.team,
+            'deployment_url': 'http://team.example.com', 'deployment_url_provided': False,
+            'team_project': team_project,
+        }
+        with mock.patch('projects.services.submissions_services.run_submission_tests') as run_submission_tests:
+            submission = SubmissionService(self.user, validated_data).create()
+
+        self.assertEqual(submission.id, self.submission.id)
+        self.assertTrue(submission.is_coalesced)
+        run_submission_tests.delay.assert_not_called()
+        self.assertEqual(Submission.objects.filter(team=self.team, task=self.task).count(), 1)
+
+    def test_submission_details_hide_grading_internals(self):
+        """Test that worker leases, stored artifacts and the raw test context are not exposed."""
+        url = reverse(
+            'task-submissions-detail',
+            kwargs={'project_id': self.project.id, 'task_id': self.task.id, 'pk': self.submission.id},
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.submission.id)
+        for field in ('claimed_by', 'claimed_at', 'heartbeat_at', 'recording', 'trace_artifact', 'test_context'):
+            self.assertNotIn(field, response.data)
+
+    def test_submission_events_long_poll(self):
+        """Test long-polling the progress events of a running submission."""
+        url = reverse(
+            'task-submissions-events',
+            kwargs={'project_id': self.project.id, 'task_id': self.task.id, 'pk': self.submission.id},
+        )
+        events = [
+            {'id': '1-0', 'type': 'result', 'data': {'test_case_id': 1, 'passed': True}},
+            {'id': '2-0', 'type': 'finished', 'data': {'status': PASSED}},
+        ]
+        with mock.patch('projects.views.submission.SubmissionEventStream.read', return_value=events) as read:
+            response = self.client.get(url, {'last_event_id': '0-0', 'wait': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        read.assert_called_once_with('0-0', block_seconds=5.0)
+        self.assertEqual(response.data['status'], PASSED)
+        self.assertEqual(response.data['last_event_id'], '2-0')
+
+    def test_submission_events_release_the_database_connection(self):
+        """Test that the database connection is closed before the view waits for events."""
+        url = reverse(
+            'task-submissions-events',
+            kwargs={'project_id': self.project.id, 'task_id': self.task.id, 'pk': self.submission.id},
+        )
+        with mock.patch('projects.views.submission.connection') as db_connection, \
+                mock.patch('projects.views.submission.SubmissionEventStream.read') as read:
+            db_connection.in_atomic_block = False
+            read.side_effect = lambda *args, **kwargs: [
+                {'id': '1-0', 'type': 'result', 'data': {'closed_first': db_connection.close.called}},
+            ]
+            response = self.client.get(url, {'wait': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        db_connection.close.assert_called_once()
+        self.assertTrue(response.data['events'][0]['data']['closed_first'])
+
+    def test_submission_events_stream_of_finished_submission(self):
+        """Test that an event-stream client of a finished submission without stored events gets its results."""
+        Submission.objects.filter(pk=self.submission.pk).update(status=PASSED, passed_tests=3, passed_percentage=87.5)
+        url = reverse(
+            'task-submissions-events',
+            kwargs={'project_id': self.project.id, 'task_id': self.task.id, 'pk': self.submission.id},
+        )
+        with mock.patch('projects.views.submission.SubmissionEventStream.read', return_value=[]):
+            response = self.client.get(url, HTTP_ACCEPT='text/event-stream')
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        finished = next(block for block in body.split('\n\n') if 'event: finished' in block)
+        data = json.loads(finished.split('data: ', 1)[1])
+        self.assertEqual((data['status'], data['passed_tests']), (PASSED, 3))
+        self.assertEqual(float(data['passed_percentage']), 87.5)
+
+
+class AsyncSubmissionTestRunnerTest(TransactionTestCase):
+    """Test cases for the async submission runner, using a mocked transport instead of a student deployment."""
+
+    def setUp(self):
+        """Set up a project with a create and a read test case, plus a pending submission."""
+        self.user = User.objects.create_user(
+            email='omar_async@gmail.com',
+            first_name='Omar',
+            last_name='Khaled',
+            password='test123',
+        )
+        self.category = Category.objects.create(name='Async')
+        self.difficulty = DifficultyLevel.objects.create(name='Asyncy')
+        self.project = Project.objects.create(
+            name='Async Project',
+            description='Async project desc',
+            slug='async-project',
+            category=self.category,
+            difficulty_level=self.difficulty,
+        )
+        self.task = Task.objects.create(
+            project=self.project, name='CRUD', slug='crud', description='CRUD task', order=0,
+        )
+        create_endpoint = Endpoint.objects.create(task=self.task, method=MethodType.POST, path='/items')
+        read_endpoint = Endpoint.objects.create(task=self.task, method=MethodType.GET, path='/items/{id}')
+        create_case = ProjectTestCase.objects.create(task=self.task, name='Create', points=5, order=0)
+        ApiTestCase.objects.create(
+            test_case=create_case, endpoint=create_endpoint,
+            request_payload={'name': 'item'}, expected_status_code=201,
+            expected_response_schema={'type': 'object', 'required': ['id']},
+        )
+        read_case = ProjectTestCase.objects.create(task=self.task, name='Read', points=5, order=1)
+        ApiTestCase.objects.create(
+            test_case=read_case, endpoint=read_endpoint,
+            path_params={'id': '{{context.id}}'}, expected_status_code=200,
+        )
+        self.team = Team.objects.create(name='Team Async', owner=self.user)
+        self.submission = Submission.objects.create(
+            project=self.project, task=self.task, user=self.user, team=self.team,
+            deployment_url='http://student.example.com', status=PENDING,
+        )
+
+    def _run(self, handler):
+        from projects.services.async_submission_runner import AsyncSubmissionTestRunnerService
+        from projects.services.grading_http_client import AsyncHostClientPool
+
+        async def run():
+            async with AsyncHostClientPool(transport=httpx.MockTransport(handler)) as client_pool:
+                return await AsyncSubmissionTestRunnerService(self.submission.id, client_pool).run_async()
+
+        asyncio.run(run())
+        self.submission.refresh_from_db()
+
+    def test_context_is_propagated_between_test_cases(self):
+        """Test that the id returned by the create call is used in the read call path."""
+        def handler(request):
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            if request.url.path == '/items/42':
+                return httpx.Response(200, json={'id': 42})
+            return httpx.Response(404)
+
+        self._run(handler)
+        self.assertEqual(self.submission.status, PASSED)
+        self.assertEqual(self.submission.passed_tests, 2)
+        self.assertEqual([log['passed'] for log in self.submission.get_results_log()], [True, True])
+        self.assertEqual(
+            list(self.submission.test_results.values_list('status_code', flat=True)), [201, 200]
+        )
+
+    @override_settings(GRADING_DEPENDENCY_SCHEDULING=True)
+    def test_planned_run_starts_from_reused_context(self):
+        """Test that with incremental grading, a later task's planned tests resolve the reused context."""
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append((request.method, request.url.path))
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            if request.url.path == '/items/42':
+                return httpx.Response(200, json={'id': 42})
+            return httpx.Response(404)
+
+        self._run(handler)
+        self.assertEqual(self.submission.status, PASSED)
+
+        Project.objects.filter(pk=self.project.pk).update(incremental_grading=True)
+        next_task = Task.objects.create(
+            project=self.project, name='Details', slug='details', description='Details task', order=1,
+        )
+        details_endpoint = Endpoint.objects.create(task=next_task, method=MethodType.GET, path='/items/{id}')
+        details_case = ProjectTestCase.objects.create(task=next_task, name='Details', points=5, order=0)
+        ApiTestCase.objects.create(
+            test_case=details_case, endpoint=details_endpoint,
+            path_params={'id': '{{context.id}}'}, expected_status_code=200,
+        )
+        self.submission = Submission.objects.create(
+            project=self.project, task=next_task, user=self.user, team=self.team,
+            deployment_url='http://student.example.com', status=PENDING,
+        )
+        requests_seen.clear()
+
+        self._run(handler)
+        self.assertEqual(requests_seen, [('GET', '/items/42')])
+        self.assertEqual(self.submission.status, PASSED)
+        self.assertEqual(self.submission.passed_tests, 3)
+
+    def test_connection_error_fails_submission(self):
+        """Test that a transport error is reported as a failed test instead of crashing the run."""
+        def handler(request):
+            raise httpx.ConnectError('connection refused', request=request)
+
+        self._run(handler)
+        self.assertEqual(self.submission.status, FAILED)
+        self.assertIn('Failed to connect', self.submission.get_results_log()[0]['feedback'])
+
+    @override_settings(GRADING_SUBMISSION_TIME_BUDGET_SECONDS=0)
+    def test_exhausted_budget_skips_remaining_tests(self):
+        """Test that test cases which cannot start within the time budget are recorded as not run."""
+        handler = mock.Mock(return_value=httpx.Response(201, json={'id': 42}))
+
+        self._run(handler)
+        handler.assert_not_called()
+        self.assertEqual(self.submission.status, FAILED)
+        self.assertTrue(all(
+            log['feedback'].startswith('Not run: budget exhausted') for log in self.submission.get_results_log()
+        ))
+
+    @override_settings(GRADING_MAX_RESPONSE_BYTES=64)
+    def test_oversized_response_is_truncated(self):
+        """Test that a body over the byte cap fails the test case with a capped snippet."""
+        def handler(request):
+            return httpx.Response(201, json={'id': 42, 'items': ['x' * 100] * 1000})
+
+        self._run(handler)
+        feedback = self.submission.get_results_log()[0]['feedback']
+        self.assertEqual(self.submission.status, FAILED)
+        self.assertIn('Response truncated', feedback)
+        self.assertLess(len(feedback), 1000)
+
+    def test_replay_regrades_from_recorded_responses(self):
+        """Test that a recorded run is re-evaluated against edited test cases without any request."""
+        from projects.services.replay_submission_runner import ReplaySubmissionTestRunnerService
+
+        def handler(request):
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            return httpx.Response(200, json={'id': 42})
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self._run(handler)
+            self.assertEqual(self.submission.status, PASSED)
+            self.assertTrue(self.submission.recording)
+            completed_at = self.submission.completed_at
+
+            read_details = ApiTestCase.objects.get(test_case__name='Read')
+            read_details.expected_status_code = 204
+            read_details.save()
+            with mock.patch('projects.services.submissions_services.get_session_pool') as get_session_pool, \
+                    mock.patch('projects.services.submission_events.get_redis') as get_redis:
+                ReplaySubmissionTestRunnerService(self.submission.id).run()
+            get_session_pool.assert_not_called()
+            get_redis.assert_not_called()
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, FAILED)
+        self.assertEqual(self.submission.completed_at, completed_at)
+        self.assertFalse(self.submission.trace_artifact)
+        self.assertEqual([log['passed'] for log in self.submission.get_results_log()], [True, False])
+
+    def test_regrade_replays_affected_submissions_in_chunks(self):
+        """
+        Test that a regrade selects the affected submissions, dispatches them and tracks progress,
+        and that a team which finished the project keeps it finished when its replay now fails.
+        """
+        from projects.models import Regrade
+        from projects.services.regrade_service import RegradeService
+        from projects.services.test_plan_service import TestPlanService
+
+        def handler(request):
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            return httpx.Response(200, json={'id': 42})
+
+        team_project = TeamProject.objects.create(team=self.team, project=self.project)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self._run(handler)
+            team_project.refresh_from_db()
+            self.assertTrue(team_project.is_finished)
+            ApiTestCase.objects.filter(test_case__name='Read').update(expected_status_code=204)
+            TestPlanService.invalidate(self.project.id)
+
+            with mock.patch('projects.tasks.regrade_submissions_chunk.apply_async') as apply_async:
+                [regrade] = RegradeService.start_for_test_cases(ProjectTestCase.objects.filter(name='Read'))
+            self.assertEqual(regrade.total, 1)
+            apply_async.assert_called_once()
+            RegradeService.regrade_chunk(*apply_async.call_args.args[0])
+
+        regrade = Regrade.objects.get(pk=regrade.pk)
+        self.assertEqual((regrade.regraded, regrade.skipped, regrade.needs_live_regrade, regrade.failed), (1, 0, 0, 0))
+        self.assertIsNotNone(regrade.finished_at)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, FAILED)
+        finished_at = team_project.finished_at
+        team_project.refresh_from_db()
+        self.assertEqual((team_project.is_finished, team_project.finished_at), (True, finished_at))
+
+    def test_regrade_leaves_submissions_without_a_recorded_response_unchanged(self):
+        """Test that a test case added after the run does not fail the submission, which needs a live regrade."""
+        from projects.models import Regrade
+        from projects.services.regrade_service import RegradeService
+
+        def handler(request):
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            return httpx.Response(200, json={'id': 42})
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self._run(handler)
+            self.assertEqual(self.submission.status, PASSED)
+            list_endpoint = Endpoint.objects.create(task=self.task, method=MethodType.GET, path='/items')
+            list_case = ProjectTestCase.objects.create(task=self.task, name='List', points=5, order=2)
+            ApiTestCase.objects.create(test_case=list_case, endpoint=list_endpoint, expected_status_code=200)
+
+            with mock.patch('projects.tasks.regrade_submissions_chunk.apply_async') as apply_async:
+                [regrade] = RegradeService.start_for_test_cases([list_case])
+            RegradeService.regrade_chunk(*apply_async.call_args.args[0])
+
+        regrade = Regrade.objects.get(pk=regrade.pk)
+        self.assertEqual((regrade.regraded, regrade.skipped, regrade.needs_live_regrade, regrade.failed), (0, 0, 1, 0))
+        self.assertIsNotNone(regrade.finished_at)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, PASSED)
+        self.assertEqual([log['name'] for log in self.submission.get_results_log()], ['Create', 'Read'])
+
+    def test_retry_resumes_from_checkpoint(self):
+        """
+        Test that a retried sync run skips the test cases its checkpoint completed and keeps their
+        context, and that the checkpoint outlives a failed final write.
+        """
+        from projects.services.grading_checkpoint import GradingCheckpoint
+        from projects.services.submissions_services import SubmissionTestRunnerService
+        from projects.services.test_plan_service import TestPlanService
+
+        plan = TestPlanService.get_plan(self.project.id, self.task.order)
+        create_case = ProjectTestCase.objects.get(name='Create')
+        state = {
+            "plan_version": plan.version, "task_order": plan.task_order, "position": 1,
+            "results": [{
+                "task_id": self.task.id, "task_name": self.task.name, "test_case_id": create_case.id,
+                "name": create_case.name, "passed": True, "points_earned": 5, "feedback": "Test passed.",
+                "duration_ms": 12, "status_code": 201,
+            }],
+            "context": {'id': 42}, "points": 5, "response_bytes_read": 9, "slowest_response_seconds": 0.012,
+            "recording": [],
+        }
+        session = mock.Mock()
+        session.get.return_value = mock.Mock(status_code=200)
+        session.request.side_effect = lambda **kwargs: mock.Mock(
+            status_code=200, encoding='utf-8', raw=mock.Mock(read1=mock.Mock(side_effect=[b'{"id": 42}', b''])),
+        )
+        with mock.patch.object(GradingCheckpoint, 'load', return_value=state), \
+                mock.patch.object(GradingCheckpoint, 'save'), mock.patch.object(GradingCheckpoint, 'clear') as clear, \
+                mock.patch('projects.services.submissions_services.get_session_pool') as get_session_pool:
+            get_session_pool.return_value.session_for.return_value = session
+            with mock.patch.object(SubmissionTestRunnerService, 'store_test_results', side_effect=IntegrityError):
+                with self.assertRaises(IntegrityError):
+                    SubmissionTestRunnerService(self.submission.id).run()
+            clear.assert_not_called()
+            session.request.reset_mock()
+            SubmissionTestRunnerService(self.submission.id).run()
+            clear.assert_called_once()
+
+        session.request.assert_called_once()
+        self.assertTrue(session.request.call_args.kwargs['url'].endswith('/items/42'))
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, PASSED)
+        self.assertEqual([log['name'] for log in self.submission.get_results_log()], ['Create', 'Read'])
+
+    @override_settings(
+        GRADING_SUBMISSION_TIME_BUDGET_SECONDS=120, GRADING_WARMUP_ENABLED=False, GRADING_DEPENDENCY_SCHEDULING=False,
+    )
+    def test_retry_after_a_long_delay_keeps_the_unspent_budget(self):
+        """
+        Test that a retry starting later than the time budget still runs its remaining tests:
+        only the time attempts spent grading counts against the budget.
+        """
+        from projects.services.grading_checkpoint import GradingCheckpoint
+        from projects.services.submissions_services import SubmissionTestRunnerService
+
+        stored = {'state': None, 'spent': 0}
+
+        def save(checkpoint, state, exchange=None, spent_seconds=0):
+            stored['state'] = dict(json.loads(json.dumps(state, default=str)), recording=[])
+            stored['spent'] += spent_seconds
+
+        session = mock.Mock()
+        session.request.side_effect = lambda **kwargs: mock.Mock(
+            status_code=201 if kwargs['method'] == 'POST' else 200, encoding='utf-8',
+            raw=mock.Mock(read1=mock.Mock(side_effect=[b'{"id": 42}', b''])),
+        )
+        lease = mock.Mock()
+        lease.heartbeat_if_due.side_effect = [None, ConnectionError('worker lost')]
+        real_time, delay = time.time, 10 * 60
+        with mock.patch.object(GradingCheckpoint, 'save', autospec=True, side_effect=save), \
+                mock.patch.object(GradingCheckpoint, 'load', side_effect=lambda: stored['state']), \
+                mock.patch.object(GradingCheckpoint, 'spent_seconds', side_effect=lambda: stored['spent']), \
+                mock.patch.object(GradingCheckpoint, 'clear'), \
+                mock.patch('projects.services.submissions_services.get_session_pool') as get_session_pool:
+            get_session_pool.return_value.session_for.return_value = session
+            with self.assertRaises(ConnectionError):
+                SubmissionTestRunnerService(self.submission.id, lease=lease).run()
+            self.assertEqual(stored['state']['position'], 1)
+            self.assertLess(stored['spent'], 120)
+
+            with mock.patch('time.time', side_effect=lambda: real_time() + delay):
+                SubmissionTestRunnerService(self.submission.id).run()
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, PASSED)
+        self.assertEqual(
+            [log['feedback'] for log in self.submission.get_results_log()],
+            ['Test passed: Status code and response schema are correct.'] * 2,
+        )
+
+    @override_settings(GRADING_DEPENDENCY_SCHEDULING=True, GRADING_WARMUP_ENABLED=False)
+    def test_planned_sync_run_overlaps_reads_and_holds_back_writes(self):
+        """
+        Test that the default runner sends independent reads concurrently, and never sends a
+        write that a sequential run would have skipped after an earlier task failed.
+        """
+        import threading
+        from projects.services.submissions_services import SubmissionTestRunnerService
+
+        next_task = Task.objects.create(
+            project=self.project, name='More', slug='more', description='More task', order=1,
+        )
+        list_endpoint = Endpoint.objects.create(task=next_task, method=MethodType.GET, path='/items')
+        create_endpoint = Endpoint.objects.create(task=next_task, method=MethodType.POST, path='/items')
+        list_case = ProjectTestCase.objects.create(task=next_task, name='List', points=5, order=0)
+        ApiTestCase.objects.create(test_case=list_case, endpoint=list_endpoint, expected_status_code=200)
+        create_again_case = ProjectTestCase.objects.create(task=next_task, name='Create again', points=5, order=1)
+        ApiTestCase.objects.create(
+            test_case=create_again_case, endpoint=create_endpoint,
+            request_payload={'name': 'other'}, expected_status_code=201,
+        )
+        Submission.objects.filter(pk=self.submission.pk).update(task=next_task)
+
+        # Read and List both wait for Create only; they pass the barrier only if sent together.
+        barrier = threading.Barrier(2, timeout=5)
+        sent = []
+
+        def request(**kwargs):
+            sent.append((kwargs['method'], kwargs['url']))
+            if kwargs['method'] == 'POST':
+                return mock.Mock(status_code=201, encoding='utf-8', raw=mock.Mock(read1=mock.Mock(side_effect=[b'{"id": 42}', b''])))
+            barrier.wait()
+            status_code = 404 if kwargs['url'].endswith('/items/42') else 200
+            return mock.Mock(status_code=status_code, encoding='utf-8', raw=mock.Mock(read1=mock.Mock(side_effect=[b'[]', b''])))
+
+        session = mock.Mock()
+        session.request.side_effect = request
+        with mock.patch('projects.services.submissions_services.get_session_pool') as get_session_pool:
+            get_session_pool.return_value.session_for.return_value = session
+            SubmissionTestRunnerService(self.submission.id).run()
+
+        self.assertFalse(barrier.broken)
+        self.assertEqual([method for method, _ in sent].count('POST'), 1)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, FAILED)
+        self.assertEqual([log['name'] for log in self.submission.get_results_log()], ['Create', 'Read'])
+
+    @override_settings(GRADING_WARMUP_INITIAL_BACKOFF_SECONDS=0.01)
+    def test_warm_up_waits_for_sleeping_deployment(self):
+        """Test that gateway errors from a waking host are retried before the suite starts."""
+        probe_statuses = [503, 503, 404]
+
+        def handler(request):
+            if request.url.path == '/':
+                return httpx.Response(probe_statuses.pop(0))
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            return httpx.Response(200, json={'id': 42})
+
+        self._run(handler)
+        self.assertEqual(self.submission.status, PASSED)
+        self.assertTrue(self.submission.warmup_succeeded)
+        self.assertEqual(self.submission.warmup_attempts, 3)
+
+    def test_trace_is_stored_only_for_failed_submissions(self):
+        """Test that the debug trace is attached to a failed run and not to a passing one."""
+        def handler(request):
+            if request.method == 'POST':
+                return httpx.Response(201, json={'id': 42})
+            return httpx.Response(404, text='missing item')
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self._run(handler)
+            self.assertEqual(self.submission.status, FAILED)
+            with self.submission.trace_artifact.open('rb') as artifact:
+                events = [json.loads(line) for line in gzip.decompress(artifact.read()).splitlines()]
+            self.assertLessEqual({'request', 'response', 'result'}, {event['event'] for event in events})
+            self.assertIn('missing item', [event.get('body') for event in events])
+
+            Submission.objects.filter(pk=self.submission.pk).update(trace_artifact=None, status=PENDING)
+            self._run(lambda request: httpx.Response(201 if request.method == 'POST' else 200, json={'id': 42}))
+            self.assertEqual(self.submission.status, PASSED)
+            self.assertFalse(self.submission.trace_artifact)
+
+
+class TestDependencyPlannerTest(SimpleTestCase):
+    """Test cases for the dependency planner, built on unsaved model instances shaped like taskmaster_project_seed.json."""
+
+    def _test_case(self, order, method, path, expected_status_code, path_params=None, schema=None, task=None,
+                   stop_on_failure=False):
+        task = task or Task(id=1, name='CRUD', order=0)
+        test_case = ProjectTestCase(
+            id=order + 1, task=task, name=f'Test {order}', order=order, stop_on_failure=stop_on_failure,
+        )
+        ApiTestCase(
+            test_case=test_case,
+            endpoint=Endpoint(method=method, path=path),
+            path_params=path_params,
+            expected_status_code=expected_status_code,
+            expected_response_schema=schema,
+        )
+        return test_case
+
+    def _plan(self, test_cases):
+        from projects.services.test_dependency_planner import TestDependencyPlanner
+        return TestDependencyPlanner([(test_cases[0].task, test_cases)]).build()
+
+    def test_taskmaster_dependencies(self):
+        """Test that reads of the created task wait for the create call and negative tests run alongside."""
+        ref = {'id': '{{context.id}}'}
+        plan = self._plan([
+            self._test_case(0, 'GET', '/tasks', 200),
+            self._test_case(1, 'POST', '/tasks', 201),
+            self._test_case(2, 'POST', '/tasks', 400),
+            self._test_case(3, 'GET', '/tasks/{id}', 200, ref),
+            self._test_case(4, 'GET', '/tasks/{id}', 404, {'id': 99999}),
+            self._test_case(5, 'PUT', '/tasks/{id}', 200, ref),
+            self._test_case(6, 'DELETE', '/tasks/{id}', 204, ref),
+            self._test_case(7, 'GET', '/tasks/{id}', 404, ref),
+        ])
+        self.assertEqual(plan[1].dependencies, {0})
+        self.assertEqual(plan[2].dependencies, {1})
+        self.assertEqual(plan[3].dependencies, {1})
+        self.assertEqual(plan[4].dependencies, {1})
+        self.assertEqual(plan[5].dependencies, {1, 2, 3, 4})
+        self.assertEqual(plan[7].dependencies, {1, 6})
+
+    def test_closed_schema_limits_produced_keys(self):
+        """Test that a producer whose schema forbids extra properties only feeds the keys it declares."""
+        closed_schema = {'type': 'object', 'properties': {'token': {}}, 'additionalProperties': False}
+        plan = self._plan([
+            self._test_case(0, 'POST', '/auth', 201, schema=closed_schema),
+            self._test_case(1, 'POST', '/links', 201),
+            self._test_case(2, 'GET', '/links/{code}', 200, {'code': '{{context.code}}'}),
+        ])
+        self.assertEqual(plan[2].dependencies, {1})
+
+    def test_writes_wait_for_the_failures_that_would_skip_them(self):
+        """
+        Test that a write waits for every test of earlier tasks and for the stop_on_failure
+        tests before it in its task, while reads do not.
+        """
+        from projects.services.test_dependency_planner import TestDependencyPlanner
+
+        users, tasks = Task(id=1, name='Users', order=0), Task(id=2, name='Tasks', order=1)
+        first_task = [
+            self._test_case(0, 'GET', '/users', 200, task=users),
+            self._test_case(1, 'GET', '/profile', 200, task=users),
+        ]
+        second_task = [
+            self._test_case(2, 'GET', '/health', 200, task=tasks, stop_on_failure=True),
+            self._test_case(3, 'GET', '/tasks', 200, task=tasks),
+            self._test_case(4, 'POST', '/tasks', 201, task=tasks),
+        ]
+        plan = TestDependencyPlanner([(users, first_task), (tasks, second_task)]).build()
+        self.assertEqual(plan[2].dependencies, set())
+        self.assertEqual(plan[3].dependencies, set())
+        self.assertEqual(plan[4].dependencies, {0, 1, 2, 3})
+
+
+class TestPlanServiceTest(TestCase):
+    """Test cases for compiled test plans: loading, totals, path templates and invalidation."""
+
+    def setUp(self):
+        """Set up a project with two tasks and three API test cases."""
+        self.category = Category.objects.create(name='Plans')
+        self.difficulty = DifficultyLevel.objects.create(name='Planny')
+        self.project = Project.objects.create(
+            name='Plan Project',
+            description='Plan project desc',
+            slug='plan-project',
+            category=self.category,
+            difficulty_level=self.difficulty,
+        )
+        for order in range(2):
+            task = Task.objects.create(
+                project=self.project, name=f'Task {order}', slug=f'plan-task-{order}', description='Task', order=order,
+            )
+            endpoint = Endpoint.objects.create(task=task, method=MethodType.GET, path='/items/{id}/details')
+            for test_order in range(order + 1):
+                test_case = ProjectTestCase.objects.create(
+                    task=task, name=f'Test {order}.{test_order}', points=5, order=test_order,
+                )
+                ApiTestCase.objects.create(
+                    test_case=test_case, endpoint=endpoint, path_params={'id': 1},
+                    expected_status_code=200, expected_response_schema={'type': 'object'},
+                )
+
+    def test_plan_is_loaded_with_prefetching(self):
+        """Test that a plan is built from one task query and one test case query."""
+        from projects.services.test_plan_service import TestPlanService
+
+        with self.assertNumQueries(2):
+            task_test_cases = TestPlanService._load_task_test_cases(self.project.id, 1)
+            [test_case.api_details.endpoint.path for _, test_cases in task_test_cases for test_case in test_cases]
+
+    def test_project_totals_are_denormalized(self):
+        """Test that point totals and test counts are stored per task (cumulatively) and per project."""
+        from projects.services.project_totals_service import ProjectTotalsService
+
+        ProjectTotalsService.refresh(self.project.id)
+        tasks = list(Task.objects.filter(project=self.project).order_by('order'))
+        self.assertEqual([(task.total_points, task.cumulative_points) for task in tasks], [(5, 5), (10, 15)])
+        self.assertEqual(tasks[1].cumulative_test_case_count, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProjectTestCase.objects.create(task=tasks[0], name='Test 0.1', points=7, order=1)
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.total_points, self.project.test_case_count), (22, 4))
+
+    def test_plan_totals_and_compiled_test_cases(self):
+        """Test that totals cover every task up to the requested order and test cases are precompiled."""
+        from projects.services.test_plan_service import TestPlanService
+
+        TestPlanService.invalidate(self.project.id)
+        plan = TestPlanService.get_plan(self.project.id, 1)
+        self.assertEqual(plan.total_points, 15)
+        self.assertEqual(plan.test_case_count, 3)
+        compiled = plan.compiled_test_case(plan.task_test_cases[0][1][0])
+        self.assertEqual(compiled.path_template.render({'id': 7}), '/items/7/details')
+        self.assertIsNotNone(compiled.schema_validator)
+
+    def test_shared_plan_is_cached_as_field_values(self):
+        """Test that the shared tier stores primitive rows and a new version token never matches an old entry."""
+        from projects.services.test_plan_service import CompiledTestPlan, TestPlanService
+
+        task_test_cases = TestPlanService._load_task_test_cases(self.project.id, 1)
+        data = TestPlanService._to_primitives(task_test_cases)
+        self.assertIsInstance(data[0]['task'], dict)
+        with self.assertNumQueries(0):
+            rebuilt = TestPlanService._from_primitives(data)
+            plan = CompiledTestPlan(self.project.id, 1, 'token', rebuilt)
+            endpoint_paths = [case.api_details.endpoint.path for _, cases in rebuilt for case in cases]
+        self.assertEqual(plan.total_points, 15)
+        self.assertEqual(endpoint_paths, ['/items/{id}/details'] * 3)
+
+        version = TestPlanService._get_version(self.project.id)
+        TestPlanService.invalidate(self.project.id)
+        self.assertNotEqual(TestPlanService._get_version(self.project.id), version)
+
+    def test_path_template_keeps_unknown_parameters(self):
+        """Test that parameters without a value are left untouched, as str.replace used to do."""
+        from projects.services.request_templates import PathTemplate
+
+        self.assertEqual(PathTemplate('/{a}/x/{b}').render({'a': 1}), '/1/x/{b}')
+
+
+class RequestTemplateTest(SimpleTestCase):
+    """Test cases for the precompiled request templates of API test cases."""
+
+    def _template(self, **api_details):
+        from projects.services.request_templates import RequestTemplate
+
+        defaults = {
+            'endpoint': mock.Mock(method='POST', path='/users/{id}/items'),
+            'path_params': {'id': '{{context.user_id}}'}, 'query_params': None,
+            'request_headers': None, 'request_payload': None,
+        }
+        return RequestTemplate(mock.Mock(**{**defaults, **api_details}))
+
+    def test_renders_path_query_headers_and_payload(self):
+        """Test that references are substituted everywhere, keeping JSON types for whole references."""
+        template = self._template(
+            query_params={'owner': '{{context.user_id}}'},
+            request_headers={'Authorization': 'Bearer {{context.token}}'},
+            request_payload={'owner': '{{context.user_id}}', 'tags': ['new', '{{context.tag}}'], 'count': 1},
+        )
+        request_kwargs = template.render('http://api', {'user_id': 7, 'token': 'abc', 'tag': 'x'})
+        self.assertEqual(request_kwargs['url'], 'http://api/users/7/items')
+        self.assertEqual(request_kwargs['params'], {'owner': 7})
+        self.assertEqual(request_kwargs['headers'], {'Authorization': 'Bearer abc'})
+        self.assertEqual(request_kwargs['json'], {'owner': 7, 'tags': ['new', 'x'], 'count': 1})
+
+    def test_static_payload_is_not_copied(self):
+        """Test that a payload without references is sent as stored."""
+        payload = {'name': 'item'}
+        request_kwargs = self._template(path_params={'id': 1}, request_payload=payload).render('', {})
+        self.assertIs(request_kwargs['json'], payload)
+
+    def test_missing_key_names_its_location(self):
+        """Test that a missing context key reports the key and where it is referenced."""
+        from projects.services.request_templates import MissingContextKey
+
+        template = self._template(request_payload={'items': [{'owner': '{{context.owner}}'}]})
+        with self.assertRaisesMessage(MissingContextKey, "'owner' not found for request payload at 'items.0.owner'"):
+            template.render('', {'user_id': 7})
+
+
+class SchemaValidatorRegistryTest(SimpleTestCase):
+    """Test cases for the cached, precompiled response-schema validators."""
+
+    SCHEMA = {'type': 'object', 'required': ['id'], 'properties': {'id': {'type': 'integer'}}}
+
+    def setUp(self):
+        from projects.services.schema_validator_registry import SchemaValidatorRegistry
+        self.registry = SchemaValidatorRegistry
+        self.registry.clear()
+
+    def test_validators_are_cached_by_test_case_and_schema(self):
+        """Test that a validator is compiled once per schema and a changed schema gets a new one."""
+        validator = self.registry.get(1, self.SCHEMA)
+        self.assertIs(self.registry.get(1, dict(reversed(list(self.SCHEMA.items())))), validator)
+        self.assertIsNot(self.registry.get(1, {**self.SCHEMA, 'required': []}), validator)
+
+    def test_validation_feedback(self):
+        """Test that passing instances return no feedback and failures name the field."""
+        validator = self.registry.get(1, self.SCHEMA)
+        self.assertIsNone(validator.validate({'id': 1}))
+        self.assertIn("Error in field 'id'", validator.validate({'id': 'one'}))
+
+    def test_invalid_schema_is_reported_instead_of_raising(self):
+        """Test that a schema which is not valid itself fails the test case with a clear message."""
+        validator = self.registry.get(2, {'type': 'no-such-type'})
+        self.assertIn('expected response schema of this test case is invalid', validator.validate({}))
+
+    def test_seed_serializer_rejects_invalid_schema(self):
+        """Test that invalid schemas are caught when a project is seeded."""
+        from projects.serializers import ApiTestCaseSeedSerializer
+
+        serializer = ApiTestCaseSeedSerializer(data={
+            'endpoint_id': 'list', 'expected_status_code': 200, 'expected_response_schema': {'type': 'no-such-type'},
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('expected_response_schema', serializer.errors)
+
+
+class GradingResponseTest(SimpleTestCase):
+    """Test cases for reading student API response bodies."""
+
+    def test_slow_body_stops_at_the_deadline(self):
+        """Test that a body trickling in past the request's deadline fails with a read timeout."""
+        from projects.services.grading_response import GradingResponse
+
+        response = mock.Mock(status_code=200, encoding='utf-8', raw=mock.Mock(read1=mock.Mock(return_value=b'x')))
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            GradingResponse.read(response, limit=1024, deadline=time.monotonic() - 1)
+        response.close.assert_called_once()
+
+    def test_concurrent_reads_share_the_submission_budget(self):
+        """Test that bodies read at the same time draw from one budget and are cut off where it runs out."""
+        from projects.services.grading_response import GradingResponse, ResponseByteBudget
+
+        def body(*chunks):
+            return mock.Mock(status_code=200, encoding='utf-8', raw=mock.Mock(read1=mock.Mock(side_effect=list(chunks))))
+
+        budget = ResponseByteBudget(10)
+        interleaved = []
+
+        def first_chunks(*args, **kwargs):
+            chunk = [b'x' * 6, b'x' * 6, b''][len(interleaved)]
+            if len(interleaved) == 1:
+                interleaved.append(GradingResponse.read(body(b'y' * 6, b''), limit=1024, budget=budget))
+            interleaved.append(chunk)
+            return chunk
+
+        first = mock.Mock(status_code=200, encoding='utf-8', raw=mock.Mock(read1=mock.Mock(side_effect=first_chunks)))
+        first_response = GradingResponse.read(first, limit=1024, budget=budget)
+        second_response = interleaved[1]
+
+        self.assertEqual(first_response.content, b'x' * 6)
+        self.assertTrue(first_response.truncated)
+        self.assertEqual(second_response.content, b'y' * 4)
+        self.assertTrue(second_response.truncated)
+        self.assertEqual(budget.remaining, 0)
+
+
+class RequestTimeoutTest(SimpleTestCase):
+    """Test cases for the timeouts of graded requests within a submission's time budget."""
+
+    def _runner(self, remaining_seconds, test_case_count, slowest_response_seconds=None):
+        from projects.services.submissions_services import SubmissionTestRunnerService
+
+        runner = SubmissionTestRunnerService(1)
+        runner.deadline = time.monotonic() + remaining_seconds
+        runner.plan = mock.Mock(test_case_count=test_case_count)
+        runner.slowest_response_seconds = slowest_response_seconds
+        return runner
+
+    def test_fast_host_keeps_the_full_timeout_while_the_budget_allows(self):
+        """Test that one fast response does not shrink the timeout of the heavier requests after it."""
+        runner = self._runner(remaining_seconds=110, test_case_count=10, slowest_response_seconds=0.05)
+        self.assertEqual(runner._request_timeout(), runner.REQUEST_TIMEOUT_SECONDS)
+
+    def test_short_budget_is_shared_among_the_remaining_tests(self):
+        """Test that the timeout shrinks to the budget's share per test, but not below the host's latency."""
+        self.assertAlmostEqual(self._runner(60, 20, 0.05)._request_timeout(), 3, delta=0.01)
+        self.assertAlmostEqual(self._runner(60, 20, 1.5)._request_timeout(), 6)
+        self.assertIsNone(self._runner(1, 20)._request_timeout())
+
+    def test_shortened_timeouts_do_not_count_against_the_host(self):
+        """Test that only timeouts of the full length are circuit breaker failures."""
+        runner = self._runner(60, 20)
+        self.assertFalse(runner._is_host_failure(False, True, 3))
+        self.assertTrue(runner._is_host_failure(False, True, runner.REQUEST_TIMEOUT_SECONDS))
+        self.assertTrue(runner._is_host_failure(True, False, 3))
+
+
+class HostSessionPoolTest(SimpleTestCase):
+    """Test cases for the per-host keep-alive session pool used by the sync runner."""
+
+    def setUp(self):
+        from projects.services.grading_http_client import HostSessionPool
+        self.pool = HostSessionPool(pool_size_per_host=2, idle_timeout=30, max_hosts=2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_sessions_are_shared_per_host(self):
+        """Test that URLs of the same host reuse one session and other hosts get their own."""
+        first = self.pool.session_for('https://team-a.example.com/tasks')
+        self.assertIs(self.pool.session_for('https://TEAM-A.example.com/tasks/1'), first)
+        self.assertIsNot(self.pool.session_for('https://team-b.example.com/tasks'), first)
+
+    def test_least_recently_used_host_is_dropped(self):
+        """Test that the pool never holds more hosts than max_hosts."""
+        first = self.pool.session_for('http://a.example.com')
+        self.pool.session_for('http://b.example.com')
+        self.pool.session_for('http://c.example.com')
+        self.assertIsNot(self.pool.session_for('http://a.example.com'), first)
+
+    def test_reset_after_fork_forgets_sessions(self):
+        """Test that a forked child starts with a fresh pool."""
+        first = self.pool.session_for('http://a.example.com')
+        self.pool.reset_after_fork()
+        self.assertIsNot(self.pool.session_for('http://a.example.com'), first)
+
+
+class HostCircuitBreakerTest(SimpleTestCase):
+    """Test cases for the per-host circuit breaker."""
+
+    @mock.patch('projects.services.host_circuit_breaker.get_redis', side_effect=ConnectionError('redis is down'))
+    def test_opens_after_consecutive_failures_without_redis(self, get_redis):
+        """Test that the breaker opens within a run after the threshold even when Redis is unavailable."""
+        from projects.services.host_circuit_breaker import HostCircuitBreaker
+
+        breaker = HostCircuitBreaker('http://dead.example.com/api', failure_threshold=2, open_seconds=30)
+        breaker.record_failure('connection refused')
+        breaker.record_success()
+        breaker.record_failure('connection refused')
+        self.assertIsNone(breaker.open_diagnosis())
+
+        breaker.record_failure('connection refused')
+        self.assertIn('http://dead.example.com is unreachable', breaker.open_diagnosis())
+
+
+    @mock.patch('projects.services.host_circuit_breaker.get_redis')
+    def test_success_resets_failures_counted_by_other_runs(self, get_redis):
+        """Test that a response clears the shared streak even when this run saw no failure itself."""
+        from projects.services.host_circuit_breaker import HostCircuitBreaker
+
+        HostCircuitBreaker('http://flaky.example.com').record_success()
+        get_redis.return_value.delete.assert_called_once_with('grading:breaker-failures:http://flaky.example.com')
+
+
+class IncrementalGradingServiceTest(TestCase):
+    """Test cases for reusing the results of earlier tasks from a prior passing submission."""
+
+    def setUp(self):
+        """Set up a two-task project with incremental grading and a passing submission of the first task."""
+        self.user = User.objects.create_user(
+            email='omar_incremental@gmail.com',
+            first_name='Omar',
+            last_name='Khaled',
+            password='test123',
+        )
+        self.category = Category.objects.create(name='Incremental')
+        self.difficulty = DifficultyLevel.objects.create(name='Incrementy')
+        self.project = Project.objects.create(
+            name='Incremental Project',
+            description='Incremental project desc',
+            slug='incremental-project',
+            category=self.category,
+            difficulty_level=self.difficulty,
+            incremental_grading=True,
+        )
+        self.tasks = []
+        for order in range(2):
+            task = Task.objects.create(
+                project=self.project, name=f'Task {order}', slug=f'incremental-task-{order}', description='Task', order=order,
+            )
+            endpoint = Endpoint.objects.create(task=task, method=MethodType.GET, path='/items')
+            test_case = ProjectTestCase.objects.create(task=task, name=f'Test {order}', points=5, order=0)
+            ApiTestCase.objects.create(test_case=test_case, endpoint=endpoint, expected_status_code=200)
+            self.tasks.append((task, test_case))
+        self.team = Team.objects.create(name='Team Incremental', owner=self.user)
+        first_task, first_test_case = self.tasks[0]
+        self.prior = Submission.objects.create(
+            project=self.project, task=first_task, user=self.user, team=self.team,
+            deployment_url='http://student.example.com', status=PASSED, completed_at=timezone.now(),
+            test_context={'id': 3},
+            execution_logs=[{
+                "task_id": first_task.id, "task_name": first_task.name,
+                "test_case_id": first_test_case.id, "name": first_test_case.name,
+                "passed": True, "points_earned": 5, "feedback": "Test passed.",
+            }],
+        )
+
+    def _find(self, deployment_url='http://student.example.com'):
+        from projects.services.incremental_grading_service import IncrementalGradingService
+        from projects.services.test_plan_service import TestPlanService
+
+        submission = Submission.objects.create(
+            project=self.project, task=self.tasks[1][0], user=self.user, team=self.team,
+            deployment_url=deployment_url, status=PENDING,
+        )
+        submission = Submission.objects.select_related('task__project').get(pk=submission.pk)
+        plan = TestPlanService.get_plan(self.project.id, 1)
+        return IncrementalGradingService(submission, plan).find_reusable_results()
+
+    def test_reuses_prior_task_results_and_context(self):
+        """Test that the first task is reused, marked, and the prior context is carried over."""
+        reusable = self._find()
+        self.assertEqual(list(reusable.results_by_task), [self.tasks[0][0].id])
+        self.assertEqual(reusable.context, {'id': 3})
+        entry = reusable.entries_for(self.tasks[0][0].id)[0]
+        self.assertEqual(entry['reused_from_submission'], self.prior.id)
+
+    def test_results_reused_twice_keep_their_origin(self):
+        """Test that reusing a reused result points at the submission that ran it, with one feedback prefix."""
+        first_task, first_test_case = self.tasks[0]
+        original = Submission.objects.create(
+            project=self.project, task=first_task, user=self.user, team=self.team,
+            deployment_url='http://student.example.com', status=PASSED,
+            completed_at=self.prior.completed_at - dt.timedelta(minutes=1),
+        )
+        Submission.objects.filter(pk=self.prior.pk).update(execution_logs=[{
+            "task_id": first_task.id, "task_name": first_task.name,
+            "test_case_id": first_test_case.id, "name": first_test_case.name,
+            "passed": True, "points_earned": 5, "reused_from_submission": original.id,
+            "feedback": f"Reused from submission {original.id}: Test passed.",
+        }])
+
+        entry = self._find().entries_for(first_task.id)[0]
+        self.assertEqual(entry['reused_from_submission'], original.id)
+        self.assertEqual(entry['feedback'], f"Reused from submission {original.id}: Test passed.")
+
+    def test_other_deployment_url_is_not_reused(self):
+        """Test that results are only reused against the same deployment URL."""
+        self.assertIsNone(self._find(deployment_url='http://other.example.com'))
+
+    def test_stale_results_are_not_reused(self):
+        """Test that results older than the TTL are run again."""
+        Submission.objects.filter(pk=self.prior.pk).update(completed_at=timezone.now() - dt.timedelta(days=1))
+        self.assertIsNone(self._find())
+
+
+class BatchGradingServiceTest(TestCase):
+    """Test cases for claiming pending submissions in batches."""
+
+    def setUp(self):
+        """Set up three pending submissions and one already graded."""
+        self.user = User.objects.create_user(
+            email='omar_batch@gmail.com',
+            first_name='Omar',
+            last_name='Khaled',
+            password='test123',
+        )
+        self.category = Category.objects.create(name='Batch')
+        self.difficulty = DifficultyLevel.objects.create(name='Batchy')
+        self.project = Project.objects.create(
+            name='Batch Project',
+            description='Batch project desc',
+            slug='batch-project',
+            category=self.category,
+            difficulty_level=self.difficulty,
+        )
+        self.task = Task.objects.create(
+            project=self.project, name='Batch Task', slug='batch-task', description='Task', order=0,
+        )
+        self.team = Team.objects.create(name='Team Batch', owner=self.user)
+        self.pending = [
+            Submission.objects.create(project=self.project, task=self.task, user=self.user, team=self.team, status=PENDING)
+            for _ in range(3)
+        ]
+        self.graded = Submission.objects.create(
+            project=self.project, task=self.task, user=self.user, team=self.team, status=PASSED,
+        )
+
+    def test_claims_oldest_pending_submissions_up_to_batch_size(self):
+        """Test that a claim moves at most batch_size pending submissions to running."""
+        from projects.services.batch_grading_service import BatchGradingService
+        from projects.models.submission import RUNNING
+
+        claimed = BatchGradingService(batch_size=2).claim_pending_submissions()
+        self.assertEqual(claimed, [self.pending[0].id, self.pending[1].id])
+        self.assertEqual(Submission.objects.filter(status=RUNNING).count(), 2)
+        self.assertEqual(BatchGradingService(batch_size=2).claim_pending_submissions(), [self.pending[2].id])
+
+    def test_claims_round_robin_across_teams(self):
+        """Test that a team's burst of submissions does not crowd out another team's later one."""
+        from projects.services.batch_grading_service import BatchGradingService
+
+        other_team = Team.objects.create(name='Team Batch Other', owner=self.user)
+        other = Submission.objects.create(
+            project=self.project, task=self.task, user=self.user, team=other_team, status=PENDING,
+        )
+        claimed = BatchGradingService(batch_size=2).claim_pending_submissions()
+        self.assertEqual(sorted(claimed), sorted([self.pending[0].id, other.id]))
+
+    @mock.patch('projects.services.batch_grading_service.run_pending_submissions_batch')
+    @mock.patch('projects.services.batch_grading_service.get_redis')
+    def test_burst_of_submissions_queues_one_batch(self, get_redis, run_pending_submissions_batch):
+        """Test that only the first of a burst of submissions queues a batch, until that batch starts."""
+        from projects.services.batch_grading_service import BatchGradingService, SCHEDULED_KEY
+
+        flags = set()
+        get_redis.return_value.set.side_effect = lambda key, value, nx, ex: None if key in flags else flags.add(key) or True
+        get_redis.return_value.delete.side_effect = flags.discard
+
+        for _ in range(3):
+            BatchGradingService.schedule()
+        self.assertEqual(run_pending_submissions_batch.delay.call_count, 1)
+
+        with mock.patch('projects.services.batch_grading_service.AsyncGradingEngine') as engine:
+            engine.return_value.completed_runners = []
+            BatchGradingService().run()
+        self.assertNotIn(SCHEDULED_KEY, flags)
+        BatchGradingService.schedule()
+        self.assertEqual(run_pending_submissions_batch.delay.call_count, 2)
+
+    @override_settings(
+        GRADING_DISPATCH_MODE='single', GRADING_FAIR_SHARE_ENABLED=False,
+        GRADING_PRIORITY_ENABLED=False, GRADING_PENDING_REQUEUE_SECONDS=60,
+    )
+    def test_sweeper_requeues_lost_pending_submissions(self):
+        """Test that a pending submission older than the threshold is dispatched again."""
+        from projects.tasks import requeue_stuck_submissions
+
+        Submission.objects.filter(id=self.pending[0].id).update(created_at=timezone.now() - dt.timedelta(minutes=5))
+        with mock.patch('projects.tasks.run_submission_tests.apply_async') as apply_async:
+            requeue_stuck_submissions()
+        apply_async.assert_called_once_with((self.pending[0].id,))
+
+    def test_unclaimed_run_releases_fair_share_slot_only_when_done(self):
+        """Test that a duplicate run of a submission another worker holds keeps that submission's slot."""
+        from projects.services.submission_lease_service import SubmissionLeaseService
+        from projects.tasks import run_submission_tests
+
+        running = self.pending[0]
+        SubmissionLeaseService('worker-a').claim([running.id])
+        with mock.patch('projects.tasks._release_fair_share_slot') as release:
+            run_submission_tests.apply(args=(running.id,))
+            release.assert_not_called()
+            run_submission_tests.apply(args=(self.graded.id,))
+            release.assert_called_once_with(self.graded.id)
+
+    @override_settings(GRADING_LEASE_SECONDS=60)
+    def test_only_expired_leases_are_released(self):
+        """Test that the sweeper gives back only submissions whose heartbeat stopped, and claims are exclusive."""
+        from projects.services.submission_lease_service import SubmissionLeaseService
+        from projects.models.submission import RUNNING
+
+        abandoned, alive = self.pending[0], self.pending[1]
+        self.assertEqual(SubmissionLeaseService('worker-a').claim([abandoned.id, alive.id]), [abandoned.id, alive.id])
+        self.assertEqual(SubmissionLeaseService('worker-b').claim([alive.id]), [])
+
+        Submission.objects.filter(id=abandoned.id).update(heartbeat_at=timezone.now() - dt.timedelta(seconds=61))
+        self.assertEqual(SubmissionLeaseService.release_expired_leases(), [abandoned.id])
+        self.assertEqual(Submission.objects.get(id=abandoned.id).status, PENDING)
+        self.assertEqual(Submission.objects.get(id=alive.id).status, RUNNING)
+
+
+@override_settings(
+    GRADING_FAIR_SHARE_ENABLED=True, GRADING_FAIR_SHARE_MAX_IN_FLIGHT=2, GRADING_FAIR_SHARE_MAX_RUNNING_PER_TEAM=2,
+    GRADING_PRIORITY_ENABLED=True, GRADING_PRIORITY_PREMIUM=1, GRADING_PRIORITY_STANDARD=6,
+    GRADING_PRIORITY_MAX_TASK_BOOST=2, GRADING_PRIORITY_AGING_SECONDS=60,
+)
+class FairShareDispatcherTest(TestCase):
+    """Test cases for the fair-share queues, run against the Redis of the test environment."""
+
+    KEY_PREFIX = 'test:grading:fair:'
+
+    def setUp(self):
+        """Set up a standard team, a premium team and a standard team whose submission waited for ten minutes."""
+        from utils.redis_client import get_redis
+
+        try:
+            get_redis().ping()
+        except Exception:
+            self.skipTest("Redis is not available.")
+        self.addCleanup(self._delete_keys)
+        patcher = mock.patch('projects.services.fair_share_dispatcher.KEY_PREFIX', self.KEY_PREFIX)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create(email='omar_fair@gmail.com', first_name='Omar', last_name='Khaled', password='test123')
+        premium_user = User.objects.create(
+            email='omar_fair_premium@gmail.com', first_name='Omar', last_name='Khaled', password='test123', is_premium=True,
+        )
+        self.project = Project.objects.create(
+            name='Fair Project', description='Fair project desc', slug='fair-project',
+            category=Category.objects.create(name='Fair'), difficulty_level=DifficultyLevel.objects.create(name='Fairy'),
+        )
+        self.task = Task.objects.create(project=self.project, name='Fair Task', slug='fair-task', description='Task', order=0)
+        self.standard = [self._submission(Team.objects.create(name='Team Fair', owner=self.user)) for _ in range(3)]
+        self.premium = self._submission(Team.objects.create(name='Team Fair Premium', owner=premium_user), premium_user)
+        self.aged = self._submission(Team.objects.create(name='Team Fair Aged', owner=self.user))
+        Submission.objects.filter(pk=self.aged.pk).update(created_at=timezone.now() - dt.timedelta(minutes=10))
+
+    def _submission(self, team, user=None):
+        return Submission.objects.create(project=self.project, task=self.task, user=user or self.user, team=team, status=PENDING)
+
+    def _delete_keys(self):
+        from utils.redis_client import get_redis
+
+        redis = get_redis()
+        keys = list(redis.scan_iter(f"{self.KEY_PREFIX}*"))
+        if keys:
+            redis.delete(*keys)
+
+    def test_backlog_over_the_in_flight_cap_is_released_by_aged_priority(self):
+        """Test that once the cap is reached, aged and premium submissions are released before the standard backlog."""
+        from projects.services.fair_share_dispatcher import FairShareDispatcher
+        from projects.services.grading_priority import GradingPriority
+
+        dispatcher = FairShareDispatcher()
+        with mock.patch('projects.tasks.run_submission_tests.apply_async') as apply_async, \
+                mock.patch.object(GradingPriority, '_remember_waiting'):
+            for submission in self.standard + [self.premium, self.aged]:
+                self.assertTrue(dispatcher.submit(submission.team_id, submission.id))
+            self.assertEqual(dispatcher.position(self.standard[2].team_id, self.standard[2].id), 2)
+            for submission in self.standard[:2] + [self.aged]:
+                dispatcher.release(submission.id)
+
+        dispatched = [call.args[0][0] for call in apply_async.call_args_list]
+        self.assertEqual(dispatched, [
+            self.standard[0].id, self.standard[1].id, self.aged.id, self.premium.id, self.standard[2].id,
+        ])
+        self.assertFalse(dispatcher.holds(self.aged.team_id, self.aged.id))
+
+
+@override_settings(
+    GRADING_PRIORITY_PREMIUM=1, GRADING_PRIORITY_STANDARD=6,
+    GRADING_PRIORITY_MAX_TASK_BOOST=2, GRADING_PRIORITY_AGING_SECONDS=60,
+)
+class GradingPriorityTest(SimpleTestCase):
+    """Test cases for the priority of grading runs."""
+
+    def test_premium_and_later_tasks_go_first(self):
+        """Test that premium runs and runs of later tasks get a higher (lower numbered) priority."""
+        from projects.services.grading_priority import GradingPriority
+
+        self.assertEqual(GradingPriority.compute(True, 0, 0), 1)
+        self.assertEqual(GradingPriority.compute(False, 0, 0), 6)
+        self.assertEqual(GradingPriority.compute(False, 1, 0), 5)
+        self.assertEqual(GradingPriority.compute(False, 7, 0), 4)
+        self.assertEqual(GradingPriority.compute(True, 7, 0), 0)
+
+    def test_waiting_runs_age_into_the_premium_lane(self):
+        """Test that a standard run gains a step per aging interval until it reaches the top."""
+        from projects.services.grading_priority import GradingPriority
+
+        self.assertEqual(GradingPriority.compute(False, 0, 59), 6)
+        self.assertEqual(GradingPriority.compute(False, 0, 5 * 60), 1)
+        self.assertEqual(GradingPriority.compute(False, 0, 60 * 60), 0)
+
+    @mock.patch('projects.services.grading_priority.get_redis')
+    def test_waiting_runs_are_queued_again_at_their_aged_priority(self, get_redis):
+        """Test that runs are queued again only once they aged into the premium lane, and finished runs are forgotten."""
+        from projects.services.grading_priority import GradingPriority, WAITING_KEY
+
+        get_redis.return_value.hgetall.return_value = {'1': '6', '2': '1', '3': '6', '4': '6'}
+        pipeline = get_redis.return_value.pipeline.return_value
+        with mock.patch.object(GradingPriority, '_compute_for', return_value=({1: 1, 2: 1, 4: 3}, {})), \
+                mock.patch('projects.tasks.run_submission_tests.apply_async') as apply_async:
+            self.assertEqual(GradingPriority.reprioritize_waiting(), [1])
+
+        apply_async.assert_called_once_with((1,), priority=1)
+        pipeline.hdel.assert_called_once_with(WAITING_KEY, 3)
+        pipeline.hset.assert_called_once_with(WAITING_KEY, mapping={1: 1})
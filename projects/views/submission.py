@@ -1,9 +1,21 @@
+import json
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from projects.models.submission import Submission
+from projects.models.submission import Submission, PENDING, RUNNING
+from projects.services import submission_events
+from projects.services.submission_events import SubmissionEventStream
+from utils.renderers import EventStreamRenderer
 from projects.serializers import SubmissionDetailsSerializer, ListProjectSubmissionsSerializer, \
     CreateSubmissionSerializer
 
@@ -44,6 +56,105 @@ class SubmissionViewSet(ModelViewSet):
             'task_id': task_id
         })
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        submission = serializer.save()
+
+        if submission.is_coalesced:
+            message = "An identical submission is already being processed. Follow that submission instead."
+        else:
+            message = "Task submission received and is being processed."
+        return Response({
+            "message": message,
+            "submission_id": submission.id,
+            "is_coalesced": submission.is_coalesced,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def events(self, request, *args, **kwargs):
+        """
+        Per-test results of a submission as they are produced.
+        Clients accepting text/event-stream get the events pushed until the run finishes;
+        JSON clients long-poll with `last_event_id` and an optional `wait` in seconds.
+        """
+        submission = self.get_object()
+        stream = SubmissionEventStream(submission.id)
+        last_event_id = request.query_params.get('last_event_id') or request.headers.get('Last-Event-ID') or '0'
+        is_running = submission.status in (PENDING, RUNNING)
+        release_database_connection()
+
+        if request.accepted_renderer.format == EventStreamRenderer.format:
+            response = StreamingHttpResponse(
+                stream_events(stream, submission, last_event_id, is_running), content_type=EventStreamRenderer.media_type
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        try:
+            wait = float(request.query_params.get('wait', settings.GRADING_EVENTS_MAX_WAIT_SECONDS))
+        except ValueError:
+            raise ValidationError({"wait": "Must be a number of seconds."})
+        wait = min(max(wait, 0), settings.GRADING_EVENTS_MAX_WAIT_SECONDS) if is_running else 0
+
+        events = stream.read(last_event_id, block_seconds=wait) or []
+        submission_status = submission.status
+        for event in events:
+            if event['type'] == submission_events.FINISHED:
+                submission_status = event['data']['status']
+
+        return Response({
+            "status": submission_status,
+            "events": events,
+            "last_event_id": events[-1]['id'] if events else last_event_id,
+        }, status=status.HTTP_200_OK)
+
+
+def release_database_connection():
+    """
+    Closes the request's database connection before it waits on Redis, so watchers blocked
+    for up to GRADING_EVENTS_STREAM_SECONDS do not hold Postgres connections. Django opens
+    a new one if the request needs the database again. Inside a transaction it is kept.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def format_server_sent_event(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def stream_events(stream: SubmissionEventStream, submission: Submission, last_event_id: str, is_running: bool):
+    """
+    Yields the submission's events as server-sent events until the `finished` event or
+    GRADING_EVENTS_STREAM_SECONDS; the `retry` field tells clients to reconnect soon after,
+    sending Last-Event-ID to resume. A comment line is sent whenever nothing happened for a
+    while to keep proxies from closing the connection.
+    """
+    deadline = time.monotonic() + settings.GRADING_EVENTS_STREAM_SECONDS
+    yield f"retry: {settings.GRADING_EVENTS_RETRY_MILLISECONDS}\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        block_seconds = max(min(remaining, settings.GRADING_EVENTS_MAX_WAIT_SECONDS), 0.001) if is_running else 0
+        events = stream.read(last_event_id, block_seconds=block_seconds)
+        if events is None:
+            return
+        for event in events:
+            yield format_server_sent_event(event)
+            last_event_id = event['id']
+            if event['type'] == submission_events.FINISHED:
+                return
 
-        return Response({"message": "Task submission received and is being processed."}, status=status.HTTP_202_ACCEPTED)
+        if not is_running and not events:
+            # The run ended before the stream was opened (or its stream expired).
+            yield format_server_sent_event({
+                'id': last_event_id, 'type': submission_events.FINISHED,
+                'data': {
+                    'status': submission.status,
+                    'passed_tests': submission.passed_tests,
+                    'passed_percentage': submission.passed_percentage,
+                },
+            })
+            return
+        if remaining <= 0:
+            return
+        if not events:
+            yield ": keep-alive\n\n"